@@ -5,8 +5,12 @@ import signal
 import sys
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 import argparse
+from clock import SystemClock
+from zero_cross import ZeroCrossTracker
+from event_log import ZERO_CROSS_LOSS, ZERO_CROSS_RESTORED
+from alarm_utils import alarm_time_for_date
 
 """
 Raspberry Pi Sunrise Alarm Controller
@@ -23,9 +27,20 @@ GATE_PIN = 18          # Output to MOSFET gate
 # Constants for 60Hz AC power
 AC_HALF_CYCLE_US = 8333  # Microseconds for 60Hz (1/60/2 seconds)
 
+# Crossing prediction, the loop sunrise_alarm's dimmer uses too: it measures
+# the real mains period (50Hz or 60Hz, including drift) and the gate is
+# timed from the estimated true crossing, so an edge that is detected late
+# (polling jitter, a busy CPU) does not lengthen the pulse
+tracker = ZeroCrossTracker(AC_HALF_CYCLE_US)
+
 # Dimming parameters
 MAX_DIM_LEVEL = 1000     # Maximum dimming level (allows for fine control)
-current_dim_level = 0    # Start with lights off
+current_dim_level = 0    # Start with lights off; change it with set_dim_level()
+
+# Set on every set_dim_level() and by stop_gate(), to wake a dimmer_thread
+# that holds the gate static at 0% or 100%
+level_changed = threading.Event()
+gate_idle = False
 
 # Configuration
 CONFIG_FILE = 'alarm_config.json'
@@ -40,13 +55,17 @@ DEFAULT_CONFIG = {
 running = True
 alarm_active = False
 
-def precise_delay(delay_us):
-    """
-    More precise delay function for microsecond timing
-    """
-    start_time = time.time()
-    while (time.time() - start_time) < (delay_us / 1000000.0):
-        pass
+# Loop iterations per thread, for alarm_runtime.py bench
+wakeups = {'gate': 0, 'main': 0, 'schedule': 0}
+schedule_timer = None  # Pending check_schedule timer
+
+# Optional event_log.EventLog; set by alarm_runtime.py
+event_log = None
+ZERO_CROSS_TIMEOUT_US = 100000  # No crossing for this long counts as lost
+
+# Time source for scheduling and fades (clock.VirtualClock in simulations);
+# the gate timing in dimmer_thread always uses the real clock
+clock = SystemClock()
 
 def load_config():
     """
@@ -69,22 +88,49 @@ def save_config(config):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f)
 
-def get_next_alarm_time():
+def get_next_alarm_time(now=None):
     """
     Calculate the next alarm time based on the configuration
     """
     config = load_config()
-    alarm_hour, alarm_minute = map(int, config['alarm_time'].split(':'))
-    
-    now = datetime.now()
-    alarm_time = now.replace(hour=alarm_hour, minute=alarm_minute, second=0, microsecond=0)
+    now = now or clock.now()
+    alarm_time = alarm_time_for_date(config, now.date())
     
     # If the alarm time has already passed today, schedule for tomorrow
     if alarm_time <= now:
-        alarm_time += timedelta(days=1)
+        alarm_time = alarm_time_for_date(config, now.date() + timedelta(days=1))
     
     return alarm_time
 
+def wait_until_us(deadline_us):
+    """
+    Busy-wait until the perf counter reaches deadline_us
+    """
+    while time.perf_counter_ns() // 1000 < deadline_us:
+        pass
+
+def mains_locked():
+    """
+    True once the crossing prediction has held for zero_cross.LOCK_EDGES edges
+    """
+    return tracker.locked
+
+def set_dim_level(level):
+    """
+    Publish a new dim level to the gate loop and wake it if it is idle
+    """
+    global current_dim_level
+    current_dim_level = level
+    level_changed.set()
+
+def stop_gate():
+    """
+    Make dimmer_thread exit, also while it is idle
+    """
+    global running
+    running = False
+    level_changed.set()
+
 def setup_gpio():
     """
     Initialize GPIO for dimmer control
@@ -98,11 +144,35 @@ def dimmer_thread():
     """
     Main dimmer control thread that handles the trailing edge dimming
     """
-    global running, current_dim_level
+    global gate_idle
     
     last_pin_state = GPIO.LOW
+    last_crossing_us = None
+    zero_cross_lost = False
     
     while running:
+        wakeups['gate'] += 1
+        
+        # Fully off or fully on needs no phase cutting: hold the gate and
+        # sleep until the level changes instead of polling (or busy-waiting
+        # through whole half-cycles at 100%)
+        level = current_dim_level
+        if level == 0 or level == MAX_DIM_LEVEL:
+            level_changed.clear()
+            # Re-check after clearing so a change made in between still wakes us
+            if current_dim_level == level and running:
+                GPIO.output(GATE_PIN, GPIO.HIGH if level else GPIO.LOW)
+                gate_idle = True
+                level_changed.wait()
+                gate_idle = False
+                GPIO.output(GATE_PIN, GPIO.LOW)
+                # Crossings were not watched while idle: re-acquire the phase
+                # and do not count the pause as a zero-crossing loss
+                tracker.resume()
+                last_crossing_us = None
+                last_pin_state = GPIO.input(ZERO_CROSS_PIN)
+                continue
+        
         # Poll for zero crossing (rising edge)
         current_pin_state = GPIO.input(ZERO_CROSS_PIN)
         
@@ -114,17 +184,33 @@ def dimmer_thread():
             # 1. Turn ON at zero crossing
             GPIO.output(GATE_PIN, GPIO.HIGH)
             
+            # Track the mains period and predict the true crossing
+            last_crossing_us = time.perf_counter_ns() // 1000
+            if zero_cross_lost:
+                zero_cross_lost = False
+                tracker.resume()  # Re-acquire the phase
+                if event_log:
+                    event_log.record(ZERO_CROSS_RESTORED)
+            crossing_us = tracker.update(last_crossing_us)
+            
             # 2. Calculate delay before turning OFF
             # The delay is proportional to the dim level
             # Higher dim_level = longer delay = brighter light
-            delay_time = int((AC_HALF_CYCLE_US * current_dim_level) / MAX_DIM_LEVEL)
+            delay_time = (tracker.period_us * current_dim_level) // MAX_DIM_LEVEL
             
-            # 3. Wait for the calculated time
-            precise_delay(delay_time)
+            # 3. Wait until that long after the estimated crossing
+            wait_until_us(crossing_us + delay_time)
             
             # 4. Turn OFF after delay (trailing edge)
             GPIO.output(GATE_PIN, GPIO.LOW)
         
+        elif (last_crossing_us is not None and not zero_cross_lost and
+                time.perf_counter_ns() // 1000 - last_crossing_us > ZERO_CROSS_TIMEOUT_US):
+            # Only an in-memory append, never disk I/O, in this loop
+            zero_cross_lost = True
+            if event_log:
+                event_log.record(ZERO_CROSS_LOSS, level=current_dim_level)
+        
         # Update last pin state
         last_pin_state = current_pin_state
         
@@ -135,7 +221,7 @@ def start_sunrise():
     """
     Begin the sunrise effect by gradually increasing brightness
     """
-    global alarm_active, current_dim_level
+    global alarm_active
     
     config = load_config()
     fade_duration = config['fade_duration']
@@ -148,9 +234,9 @@ def start_sunrise():
         print("Alarm is disabled, not starting sunrise")
         return
     
-    print(f"Starting sunrise at {datetime.now()}")
+    print(f"Starting sunrise at {clock.now()}")
     alarm_active = True
-    current_dim_level = 0
+    set_dim_level(0)
     
     # Calculate total steps and time between steps
     total_steps = 100  # Divide the fade into 100 steps for smooth transition
@@ -166,24 +252,22 @@ def fade_in(step_time, dim_increment, total_steps, max_dim_level):
     """
     Gradually increase brightness over time to simulate sunrise
     """
-    global current_dim_level, alarm_active
-    
     for step in range(total_steps):
         if not running or not alarm_active:
             break
         
-        current_dim_level = min(int(step * dim_increment), max_dim_level)
+        set_dim_level(min(int(step * dim_increment), max_dim_level))
         
         # Only print in interactive mode
         if not daemon_mode:
             brightness_pct = (current_dim_level / MAX_DIM_LEVEL) * 100
             print(f"Brightness: {brightness_pct:.1f}% (level {current_dim_level}/{MAX_DIM_LEVEL})")
             
-        time.sleep(step_time)
+        clock.sleep(step_time)
     
     # Keep at full brightness for 30 minutes after fade completes
     if running and alarm_active:
-        time.sleep(30 * 60)  # 30 minutes
+        clock.sleep(30 * 60)  # 30 minutes
     
     # Turn off light if still on
     if alarm_active:
@@ -193,9 +277,9 @@ def turn_off_light():
     """
     Turn off the light and reset alarm state
     """
-    global alarm_active, current_dim_level
+    global alarm_active
     
-    current_dim_level = 0
+    set_dim_level(0)
     alarm_active = False
     
     if not daemon_mode:
@@ -205,54 +289,58 @@ def manual_brightness(level_percent):
     """
     Manually set brightness level (0-100%)
     """
-    global current_dim_level, alarm_active
+    global alarm_active
     
     # Cancel any active alarm
     alarm_active = False
     
     # Convert percentage to dim level
     level_percent = max(0, min(100, level_percent))
-    current_dim_level = int((level_percent / 100) * MAX_DIM_LEVEL)
+    set_dim_level(int((level_percent / 100) * MAX_DIM_LEVEL))
     
     if not daemon_mode:
         print(f"Brightness manually set to {level_percent}% (level {current_dim_level}/{MAX_DIM_LEVEL})")
 
+def sunrise_due(now=None):
+    """
+    True if now falls inside the fade window before the next alarm
+    """
+    config = load_config()
+    if not config.get('enabled', True):
+        return False
+    
+    now = now or clock.now()
+    next_alarm = get_next_alarm_time(now)
+    start_time = next_alarm - timedelta(minutes=config['fade_duration'])
+    return start_time <= now < next_alarm
+
 def check_schedule():
     """
     Periodically check if we need to schedule a new alarm
     (runs every minute)
     """
-    if not running:
-        return
+    global schedule_timer
     
-    # Check if alarm should be running right now
-    config = load_config()
-    if not config.get('enabled', True):
+    if not running:
         return
-    
-    next_alarm = get_next_alarm_time()
-    now = datetime.now()
+    wakeups['schedule'] += 1
     
     # If it's within the fade duration window, start sunrise
-    fade_duration = config['fade_duration']
-    start_time = next_alarm - timedelta(minutes=fade_duration)
-    
-    if start_time <= now < next_alarm and not alarm_active:
+    if sunrise_due() and not alarm_active:
         start_sunrise()
     
     # Schedule next check
-    threading.Timer(60, check_schedule).start()
+    schedule_timer = threading.Timer(60, check_schedule)
+    schedule_timer.start()
 
 def signal_handler(sig, frame):
     """
     Handle Ctrl+C and termination signals gracefully
     """
-    global running
-    
     if not daemon_mode:
         print("\nStopping sunrise alarm...")
         
-    running = False
+    stop_gate()
     time.sleep(0.2)
     turn_off_light()
     GPIO.output(GATE_PIN, GPIO.LOW)
@@ -273,6 +361,7 @@ def print_status():
     print(f"Max brightness: {config.get('max_brightness', 100)}%")
     print(f"Current brightness: {brightness_percent:.1f}%")
     print(f"Current dim level: {current_dim_level}/{MAX_DIM_LEVEL}")
+    print(f"Mains frequency: {tracker.frequency_hz:.2f} Hz")
     print(f"Alarm active: {alarm_active}")
     print(f"Next alarm: {next_alarm}")
 
@@ -294,6 +383,7 @@ def run_daemon():
     
     # Keep running until terminated
     while running:
+        wakeups['main'] += 1
         time.sleep(1)
 
 def interactive_mode():
@@ -0,0 +1,221 @@
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta
+
+from alarm_utils import alarm_time_for_date
+
+"""
+Plan compiler for the sunrise alarm.
+
+Turns the alarm configuration into a compact, versioned binary timeline
+covering the next N days, so the controller (alarm_runtime.py) can
+memory-map it and look up brightness without parsing config while a
+sunrise is running.
+
+Segment starts are offsets from a wall-clock epoch rather than from the
+monotonic clock: the file outlives the process that wrote it, and a
+monotonic clock restarts at boot and has no fixed relation to the local
+alarm times the plan is compiled from.
+
+File layout (little endian):
+    header   magic 'LPLN', uint16 version, uint16 max level,
+             float64 epoch (wall-clock seconds), uint32 segment count
+    segment  float64 start offset from epoch (s), float32 duration (s),
+             uint16 start level, uint16 target level, uint8 curve, 3 pad bytes
+Segments are sorted by start offset and do not overlap.
+"""
+
+PLAN_FILE = 'alarm_plan.bin'
+PLAN_MAGIC = b'LPLN'
+PLAN_VERSION = 1
+PLAN_DAYS = 7
+
+HEADER = struct.Struct('<4sHHdI')
+SEGMENT = struct.Struct('<dfHHB3x')
+
+CURVE_STEP = 0
+CURVE_LINEAR = 1
+CURVE_EASE_IN = 2  # Quadratic: slow start, matches how the eye perceives low light
+CURVES = {'step': CURVE_STEP, 'linear': CURVE_LINEAR, 'ease-in': CURVE_EASE_IN}
+
+# Light stays at full brightness this long after the alarm time
+HOLD_SECONDS = 30 * 60
+
+class PlanError(Exception):
+    """Raised for a missing, truncated or incompatible plan file"""
+
+# --- compiling -----------------------------------------------------------
+
+def alarm_segments(alarm_time, fade_minutes, max_level, curve=CURVE_LINEAR, hold_seconds=HOLD_SECONDS):
+    """
+    Segments for one alarm: ramp up, hold, then off
+
+    alarm_time is a wall-clock epoch timestamp.
+    """
+    fade_seconds = fade_minutes * 60
+    start = alarm_time - fade_seconds
+    return [
+        (start, fade_seconds, 0, max_level, curve),
+        (alarm_time, hold_seconds, max_level, max_level, CURVE_STEP),
+        (alarm_time + hold_seconds, 0, 0, 0, CURVE_STEP),
+    ]
+
+def alarms_from_config(config, max_dim_level, days=PLAN_DAYS, now=None, timestamp=None):
+    """
+    Daily alarms from alarm_config.json as (epoch, fade minutes, level, curve)
+
+    now is a naive local datetime; timestamp converts local alarm times to
+    epochs (default datetime.timestamp, VirtualClock.timestamp in simulations).
+    """
+    if not config.get('enabled', True):
+        return []
+
+    now = now or datetime.now()
+    timestamp = timestamp or datetime.timestamp
+    max_level = int((config.get('max_brightness', 100) / 100) * max_dim_level)
+    curve = CURVES.get(config.get('brightness_settings', {}).get('curve', 'linear'), CURVE_LINEAR)
+
+    alarms = []
+    for day in range(days + 1):
+        alarm = alarm_time_for_date(config, now.date() + timedelta(days=day))
+        alarms.append((timestamp(alarm), config['fade_duration'], max_level, curve))
+    return alarms
+
+def compile_plan(alarms, max_dim_level, path=PLAN_FILE, now=None):
+    """
+    Write the binary plan for the given alarms and return the segment count.
+
+    now is the epoch the plan starts from (default: the current time).
+    Alarms whose hold has already ended are skipped; a later alarm that
+    overlaps an earlier one cuts the earlier one short.
+    """
+    epoch = time.time() if now is None else now
+    segments = []
+    for alarm_time, fade_minutes, max_level, curve in sorted(alarms):
+        alarm = alarm_segments(alarm_time, fade_minutes, max_level, curve)
+        if alarm[-1][0] < epoch:
+            continue
+
+        start = alarm[0][0]
+        while segments and segments[-1][0] >= start:
+            segments.pop()
+        if segments and segments[-1][0] + segments[-1][1] > start:
+            previous = segments[-1]
+            segments[-1] = (previous[0], start - previous[0]) + previous[2:]
+        segments.extend(alarm)
+
+    data = bytearray(HEADER.pack(PLAN_MAGIC, PLAN_VERSION, max_dim_level, epoch, len(segments)))
+    for start, duration, start_level, target_level, curve in segments:
+        data += SEGMENT.pack(start - epoch, duration, start_level, target_level, curve)
+
+    # Replace atomically so a mapped reader never sees a half-written file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(segments)
+
+# --- reading -------------------------------------------------------------
+
+class AlarmPlan:
+    """
+    Memory-mapped, read-only view of a compiled plan.
+
+    Lookups binary-search the mapped segments and unpack only the fields
+    they need, so the cost per call is a few struct reads.
+    """
+    def __init__(self, path=PLAN_FILE):
+        try:
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise PlanError(f'Cannot map {path}: {e}')
+
+        if len(self._map) < HEADER.size:
+            raise PlanError(f'{path} is truncated')
+        magic, version, self.max_level, self.epoch, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != PLAN_MAGIC or version != PLAN_VERSION:
+            raise PlanError(f'{path} is not a version {PLAN_VERSION} plan')
+        if len(self._map) < HEADER.size + self.count * SEGMENT.size:
+            raise PlanError(f'{path} is truncated')
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self.count
+
+    def segment(self, index):
+        """(start epoch, duration, start level, target level, curve) of one segment"""
+        offset, duration, start_level, target_level, curve = SEGMENT.unpack_from(
+            self._map, HEADER.size + index * SEGMENT.size)
+        return self.epoch + offset, duration, start_level, target_level, curve
+
+    def _start(self, index):
+        return self.epoch + struct.unpack_from('<d', self._map, HEADER.size + index * SEGMENT.size)[0]
+
+    def find(self, t):
+        """Index of the last segment starting at or before t, or -1"""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._start(mid) <= t:
+                low = mid + 1
+            else:
+                high = mid
+        return low - 1
+
+    def level_at(self, t):
+        """Planned dim level at wall-clock time t"""
+        index = self.find(t)
+        if index < 0:
+            return 0
+        start, duration, start_level, target_level, curve = self.segment(index)
+        if curve == CURVE_STEP or duration <= 0 or t >= start + duration:
+            return target_level
+
+        progress = (t - start) / duration
+        if curve == CURVE_EASE_IN:
+            progress *= progress
+        return int(start_level + (target_level - start_level) * progress)
+
+    def active_until(self, t):
+        """End of the segment running at t, or None if nothing is running"""
+        index = self.find(t)
+        if index < 0:
+            return None
+        start, duration = self.segment(index)[:2]
+        return start + duration if t < start + duration else None
+
+    def alarm_end(self, t):
+        """
+        End of the whole alarm (ramp, hold and off) running at t, or None
+        if nothing is running
+        """
+        index = self.find(t)
+        if index < 0:
+            return None
+        start, duration = self.segment(index)[:2]
+        end = start + duration
+        if t >= end:
+            return None
+        # Follow the contiguous segments up to the alarm's zero-length off step
+        while duration > 0 and index + 1 < self.count:
+            index += 1
+            start, duration = self.segment(index)[:2]
+            if start > end:
+                break
+            end = start + duration
+        return end
+
+    def next_start(self, t):
+        """Start of the first segment after t, or None"""
+        index = self.find(t) + 1
+        return self._start(index) if index < self.count else None
+
+    @property
+    def horizon(self):
+        """Start of the last planned segment"""
+        return self._start(self.count - 1) if self.count else self.epoch
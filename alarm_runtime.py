@@ -0,0 +1,570 @@
+import asyncio
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import selectors
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import alarm_controller as controller
+from alarm_utils import load_config, save_config, get_next_alarm_time, validate_config
+from alarm_plan import AlarmPlan, PlanError, alarms_from_config, compile_plan, PLAN_FILE
+from clock import SystemClock, VirtualClock
+import event_log
+from mqtt_bridge import MQTTBridge
+
+"""
+Asyncio runtime for the sunrise alarm controller.
+
+Scheduling, fades, IPC and status are coroutines on a single event loop.
+The timing-critical gate loop (alarm_controller.dimmer_thread) is the only
+other thread and runs in its own single-worker executor, so nothing else
+ever touches the gate timing.
+
+IPC is newline-delimited JSON over a local TCP socket, e.g.
+    {"cmd": "set", "level": 40}
+    {"cmd": "status"}
+When the runtime listens beyond localhost (fleet mode, see fleet.py), set
+LUMENATOR_CONTROL_TOKEN and every message must carry it as "token"; it
+refuses to listen on a non-loopback address without one.
+
+Wall-clock time comes from an injected clock. With a clock.VirtualClock,
+run() uses a VirtualTimeEventLoop, so every asyncio sleep and timeout
+advances the virtual clock instead of blocking (see simulate.py).
+"""
+
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = 5055
+
+# Longest the scheduler sleeps before re-reading the wall clock, so that
+# NTP corrections or suspend/resume never delay an alarm by more than this
+MAX_SCHEDULE_SLEEP = 300
+
+# Fade parameters (same shape as alarm_controller.start_sunrise)
+FADE_STEPS = 100
+HOLD_SECONDS = 30 * 60
+
+# Recompile the plan when it covers less than this much of the future
+PLAN_REFRESH_SECONDS = 24 * 3600
+
+# Seconds between batched writes of the event log
+EVENT_FLUSH_INTERVAL = 30
+
+# Alarm settings the 'config' command may change, with their types
+CONFIG_FIELDS = {'alarm_time': str, 'fade_duration': int, 'enabled': bool, 'max_brightness': int,
+                 'alarm_mode': str, 'solar_event': str, 'solar_offset': int,
+                 'latitude': float, 'longitude': float}
+
+
+def is_loopback(host):
+    """True if host only accepts local connections (not '0.0.0.0', '' or a LAN address)"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class CountingSelector(selectors.DefaultSelector):
+    """
+    Selector that counts how often the event loop wakes up
+    """
+    def __init__(self):
+        super().__init__()
+        self.wakeups = 0
+
+    def select(self, timeout=None):
+        self.wakeups += 1
+        return super().select(timeout)
+
+
+class VirtualTimeSelector(CountingSelector):
+    """
+    Selector that advances a VirtualClock to the next timer instead of blocking
+    """
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            raise RuntimeError('Nothing scheduled on the loop: virtual time cannot advance')
+        self.clock.sleep(timeout)
+        return super().select(0)
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose time() follows the virtual clock, so call_later, sleep
+    and wait_for timeouts run in simulated time
+    """
+    def __init__(self, selector):
+        super().__init__(selector)
+        self.clock = selector.clock
+        # Count from the start: at epoch magnitudes a due timer plus the
+        # loop's nanosecond clock resolution rounds back to the timer
+        # itself, and it would never fire
+        self.origin = self.clock.time()
+
+    def time(self):
+        return self.clock.time() - self.origin
+
+
+class ControllerRuntime:
+    """
+    Owns the controller state; every method except the gate loop runs on the event loop
+    """
+    def __init__(self, host=CONTROL_HOST, port=CONTROL_PORT, gate=True, verbose=False, token=None,
+                 mqtt=None, clock=None):
+        if not token and not is_loopback(host):
+            raise ValueError(f'Listening on {host!r} needs a token (--token or LUMENATOR_CONTROL_TOKEN)')
+        self.host = host
+        self.port = port
+        self.token = token
+        # Optional dict of MQTTBridge arguments (host, port, prefix, ...)
+        self.mqtt = mqtt
+        self.bridge = None
+        self.gate = gate
+        self.verbose = verbose
+        # Wall-clock time source (clock.VirtualClock in simulations)
+        self.clock = clock or SystemClock()
+
+        self.alarm_active = False
+        self.fade_task = None
+        self.reload_event = None
+        self.stop_event = None
+        self.server = None
+        self.gate_executor = None
+        self.loop = None
+
+        # Compiled timeline of upcoming sunrises (see alarm_plan.py)
+        self.plan = None
+        # A manual change suppresses the planned sunrise running until then
+        self.override_until = 0.0
+
+        self.events = event_log.EventLog(clock=self.clock)
+        controller.event_log = self.events
+
+    # --- brightness ------------------------------------------------------
+
+    def set_level(self, level):
+        """
+        Publish a new dim level to the gate loop (single writer)
+        """
+        level = max(0, min(controller.MAX_DIM_LEVEL, int(level)))
+        if level != controller.current_dim_level:
+            self.events.record(event_log.BRIGHTNESS, level=level)
+        controller.set_dim_level(level)
+        if self.bridge:
+            self.bridge.notify()
+        if self.verbose:
+            brightness_pct = (controller.current_dim_level / controller.MAX_DIM_LEVEL) * 100
+            print(f"Brightness: {brightness_pct:.1f}% (level {controller.current_dim_level}/{controller.MAX_DIM_LEVEL})")
+
+    def cancel_fade(self):
+        if self.fade_task and not self.fade_task.done():
+            self.fade_task.cancel()
+        self.fade_task = None
+        self.alarm_active = False
+
+    def start_sunrise(self):
+        """
+        Begin the sunrise effect as a fade task on the event loop
+        """
+        config = load_config()
+        if not config.get('enabled', True):
+            print("Alarm is disabled, not starting sunrise")
+            return False
+
+        max_level = int((config['max_brightness'] / 100) * controller.MAX_DIM_LEVEL)
+        self.cancel_fade()
+        self.alarm_active = True
+        self.fade_task = asyncio.get_running_loop().create_task(
+            self.fade_in(config['fade_duration'] * 60, max_level))
+        return True
+
+    async def fade_in(self, fade_seconds, max_level):
+        """
+        Gradually increase brightness, hold, then switch off
+        """
+        print(f"Starting sunrise at {self.clock.now()}")
+        self.events.record(event_log.ALARM_START, source='manual', target=max_level)
+        try:
+            step_time = fade_seconds / FADE_STEPS
+            dim_increment = max_level / FADE_STEPS
+            for step in range(FADE_STEPS):
+                self.set_level(min(int(step * dim_increment), max_level))
+                await asyncio.sleep(step_time)
+            self.set_level(max_level)
+
+            # Keep at full brightness for 30 minutes after fade completes
+            await asyncio.sleep(HOLD_SECONDS)
+            self.set_level(0)
+        finally:
+            self.events.record(event_log.ALARM_END, source='manual')
+            # A newer fade may already have replaced this one
+            if self.fade_task is asyncio.current_task():
+                self.fade_task = None
+                self.alarm_active = False
+
+    async def run_plan(self):
+        """
+        Follow the compiled plan while a planned sunrise is active.
+
+        Only reads the memory-mapped plan: no config parsing during a sunrise.
+        """
+        print(f"Starting planned sunrise at {self.clock.now()}")
+        self.events.record(event_log.ALARM_START, source='plan')
+        try:
+            while True:
+                now = self.clock.time()
+                until = self.plan.active_until(now)
+                if until is None:
+                    break
+                self.set_level(self.plan.level_at(now))
+
+                _, duration, start_level, target_level, _ = self.plan.segment(self.plan.find(now))
+                step_time = duration / FADE_STEPS if start_level != target_level else until - now
+                await asyncio.sleep(max(0.0, min(step_time, until - now)))
+            self.set_level(self.plan.level_at(self.clock.time()))
+        finally:
+            self.events.record(event_log.ALARM_END, source='plan')
+            if self.fade_task is asyncio.current_task():
+                self.fade_task = None
+                self.alarm_active = False
+
+    def override_plan(self):
+        """Keep a manual change from being undone by the running planned sunrise"""
+        if self.plan is not None:
+            # Until the end of the whole alarm, not just the current segment,
+            # or the hold would start and jump back to full brightness
+            self.override_until = self.plan.alarm_end(self.clock.time()) or 0.0
+
+    def turn_off_light(self):
+        self.cancel_fade()
+        self.override_plan()
+        self.events.record(event_log.MANUAL_OVERRIDE, brightness=0)
+        self.set_level(0)
+
+    def manual_brightness(self, level_percent):
+        self.cancel_fade()
+        self.override_plan()
+        level_percent = max(0, min(100, level_percent))
+        self.events.record(event_log.MANUAL_OVERRIDE, brightness=level_percent)
+        self.set_level((level_percent / 100) * controller.MAX_DIM_LEVEL)
+
+    # --- scheduling ------------------------------------------------------
+
+    def load_plan(self):
+        """
+        Compile the configuration into a plan file and map it.
+
+        A configuration that cannot be scheduled (e.g. a hand-edited solar
+        alarm without a location, or numpy missing) keeps the previous plan;
+        schedule_loop tries again on its next wakeup.
+        """
+        try:
+            config = load_config()
+            validate_config(config)
+            alarms = alarms_from_config(config, controller.MAX_DIM_LEVEL,
+                                        now=self.clock.now(), timestamp=self.clock.timestamp)
+            compile_plan(alarms, controller.MAX_DIM_LEVEL, PLAN_FILE, now=self.clock.time())
+            plan = AlarmPlan(PLAN_FILE)
+        except (PlanError, OSError, ImportError, KeyError, TypeError, ValueError) as e:
+            print(f"Error loading alarm plan: {e}")
+            return
+        if self.plan is not None:
+            self.plan.close()
+        self.plan = plan
+
+    async def schedule_loop(self):
+        """
+        Sleep until the next planned segment instead of polling every minute
+        """
+        while not self.stop_event.is_set():
+            now = self.clock.time()
+            if self.reload_event.is_set() or self.plan is None or \
+                    self.plan.horizon < now + PLAN_REFRESH_SECONDS:
+                if self.reload_event.is_set():
+                    self.events.record(event_log.CONFIG_RELOAD)
+                self.reload_event.clear()
+                self.load_plan()
+
+            timeout = MAX_SCHEDULE_SLEEP
+            if self.plan is not None:
+                if (self.plan.active_until(now) is not None and not self.alarm_active
+                        and now >= self.override_until):
+                    self.cancel_fade()
+                    self.alarm_active = True
+                    self.fade_task = asyncio.get_running_loop().create_task(self.run_plan())
+
+                next_start = self.plan.next_start(now)
+                if next_start is not None:
+                    timeout = next_start - now
+
+            try:
+                await asyncio.wait_for(self.reload_event.wait(),
+                                       timeout=max(0.0, min(timeout, MAX_SCHEDULE_SLEEP)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def flush_loop(self):
+        """
+        Write buffered events to disk in batches, off the event loop thread
+        """
+        while True:
+            await asyncio.sleep(EVENT_FLUSH_INTERVAL)
+            await asyncio.to_thread(self.events.flush)
+
+    # --- status and IPC --------------------------------------------------
+
+    def status(self):
+        config = load_config()
+        return {
+            'alarm_time': config['alarm_time'],
+            'fade_duration': config['fade_duration'],
+            'enabled': config.get('enabled', True),
+            'max_brightness': config.get('max_brightness', 100),
+            'brightness': (controller.current_dim_level / controller.MAX_DIM_LEVEL) * 100,
+            'dim_level': controller.current_dim_level,
+            'mains_hz': round(controller.tracker.frequency_hz, 2),
+            'mains_locked': controller.mains_locked(),
+            'gate_idle': controller.gate_idle,  # Crossings are not tracked while idle
+            'alarm_active': self.alarm_active,
+            'next_alarm': get_next_alarm_time(self.clock.now()).isoformat(),
+            'mqtt': self.bridge.metrics() if self.bridge else None,
+        }
+
+    def update_config(self, changes):
+        """
+        Validate and save alarm settings, then reload them like SIGHUP
+        """
+        config = load_config()
+        for key, value in changes.items():
+            if key not in CONFIG_FIELDS:
+                raise ValueError(f'Unknown setting: {key}')
+            config[key] = CONFIG_FIELDS[key](value)
+        validate_config(config)
+        save_config(config)
+        self.reload_event.set()
+        return config
+
+    def handle_command(self, message):
+        """
+        Execute one IPC command and return the response dict
+        """
+        if self.token and not hmac.compare_digest(str(message.get('token', '')), self.token):
+            return {'ok': False, 'error': 'Invalid token'}
+
+        cmd = message.get('cmd')
+
+        if cmd == 'status':
+            return {'ok': True, 'status': self.status()}
+        elif cmd == 'on':
+            return {'ok': self.start_sunrise()}
+        elif cmd == 'off':
+            self.turn_off_light()
+            return {'ok': True}
+        elif cmd == 'set':
+            self.manual_brightness(float(message.get('level', 0)))
+            return {'ok': True, 'brightness': (controller.current_dim_level / controller.MAX_DIM_LEVEL) * 100}
+        elif cmd == 'reload':
+            self.reload_event.set()
+            return {'ok': True}
+        elif cmd == 'config':
+            return {'ok': True, 'config': self.update_config(message.get('config', {}))}
+        elif cmd == 'ping':
+            return {'ok': True}
+        elif cmd == 'events':
+            return {'ok': True, 'events': self.events.query(
+                since=message.get('since'), until=message.get('until'),
+                event_type=message.get('type'), limit=int(message.get('limit', 500)))}
+
+        return {'ok': False, 'error': f'Unknown command: {cmd}'}
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if message.get('cmd') == 'events':
+                        # May read and parse the rotated log files; keep that
+                        # (and the log's flush lock) off the event loop
+                        response = await asyncio.to_thread(self.handle_command, message)
+                    else:
+                        response = self.handle_command(message)
+                except (ValueError, TypeError, KeyError) as e:
+                    message = {}
+                    response = {'ok': False, 'error': str(e)}
+                if 'id' in message:
+                    response['id'] = message['id']
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # --- lifecycle -------------------------------------------------------
+
+    async def run(self):
+        loop = self.loop = asyncio.get_running_loop()
+        self.reload_event = asyncio.Event()
+        self.stop_event = asyncio.Event()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop_event.set)
+        loop.add_signal_handler(signal.SIGHUP, self.reload_event.set)
+
+        gate_future = None
+        if self.gate:
+            controller.setup_gpio()
+            controller.running = True
+            self.gate_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gate')
+            gate_future = loop.run_in_executor(self.gate_executor, controller.dimmer_thread)
+
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        scheduler = loop.create_task(self.schedule_loop())
+        flusher = loop.create_task(self.flush_loop())
+        tasks = [scheduler, flusher]
+        if self.mqtt:
+            self.bridge = MQTTBridge(self, **self.mqtt)
+            self.bridge.start(loop)
+            tasks.append(loop.create_task(self.bridge.publish_loop()))
+
+        try:
+            await self.stop_event.wait()
+        finally:
+            fade_task = self.fade_task
+            for task in tasks:
+                task.cancel()
+            self.cancel_fade()
+            await asyncio.gather(*tasks, *([fade_task] if fade_task else []),
+                                 return_exceptions=True)
+            if self.bridge:
+                self.bridge.stop()
+            self.server.close()
+            await self.server.wait_closed()
+
+            self.set_level(0)
+            self.events.flush()
+            if gate_future:
+                controller.stop_gate()
+                await gate_future
+                self.gate_executor.shutdown()
+                controller.GPIO.output(controller.GATE_PIN, controller.GPIO.LOW)
+                controller.GPIO.cleanup()
+
+
+def run(runtime):
+    """
+    Run the runtime on an event loop whose wakeups are counted, in
+    virtual time when the runtime has a VirtualClock
+    """
+    if isinstance(runtime.clock, VirtualClock):
+        selector = VirtualTimeSelector(runtime.clock)
+        loop = VirtualTimeEventLoop(selector)
+    else:
+        selector = CountingSelector()
+        loop = asyncio.SelectorEventLoop(selector)
+    try:
+        loop.run_until_complete(runtime.run())
+    finally:
+        loop.close()
+    return selector.wakeups
+
+
+def bench(seconds):
+    """
+    Measure threads and wakeups/s of the asyncio runtime and of the legacy
+    daemon (alarm_controller.py daemon), both idle at 0% with the gate
+    loop running, each for the given number of seconds.
+    """
+    samples = []
+
+    def sample_threads():
+        samples.append(threading.active_count() - 1)  # exclude the sampling thread
+
+    # asyncio runtime
+    runtime = ControllerRuntime(port=0)
+
+    def stop_runtime():
+        time.sleep(seconds)
+        sample_threads()
+        runtime.loop.call_soon_threadsafe(runtime.stop_event.set)
+
+    gate_before = controller.wakeups['gate']
+    threading.Thread(target=stop_runtime, daemon=True).start()
+    start = time.monotonic()
+    loop_wakeups = run(runtime)
+    elapsed = time.monotonic() - start
+    gate_wakeups = controller.wakeups['gate'] - gate_before
+    print(f"asyncio runtime: {samples[-1]} thread(s) incl. gate, "
+          f"{loop_wakeups / elapsed:.3f} event loop wakeups/s, "
+          f"{gate_wakeups / elapsed:.0f} gate loop wakeups/s over {elapsed:.1f}s")
+
+    # Legacy daemon: main thread, check_schedule timer thread and gate thread
+    def stop_daemon():
+        time.sleep(seconds)
+        sample_threads()
+        controller.stop_gate()
+        if controller.schedule_timer:
+            controller.schedule_timer.cancel()
+
+    before = dict(controller.wakeups)
+    controller.setup_gpio()
+    controller.running = True
+    threading.Thread(target=stop_daemon, daemon=True).start()
+    start = time.monotonic()
+    controller.run_daemon()
+    elapsed = time.monotonic() - start
+    counts = {key: controller.wakeups[key] - before[key] for key in before}
+    print(f"legacy daemon:   {samples[-1]} thread(s) incl. gate (+1 per sunrise), "
+          f"{(counts['main'] + counts['schedule']) / elapsed:.3f} main/timer wakeups/s, "
+          f"{counts['gate'] / elapsed:.0f} gate loop wakeups/s over {elapsed:.1f}s")
+    controller.GPIO.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Asyncio runtime for the sunrise alarm controller')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'bench'])
+    parser.add_argument('--host', default=CONTROL_HOST, help='IPC listen address')
+    parser.add_argument('--port', type=int, default=CONTROL_PORT, help='IPC listen port')
+    parser.add_argument('--seconds', type=int, default=30, help='Benchmark duration')
+    parser.add_argument('--verbose', action='store_true', help='Print brightness changes')
+    parser.add_argument('--token', default=os.getenv('LUMENATOR_CONTROL_TOKEN'),
+                        help='Shared secret required on every IPC message')
+    parser.add_argument('--mqtt-host', default=os.getenv('LUMENATOR_MQTT_HOST'),
+                        help='MQTT broker to bridge state and commands to (see mqtt_bridge.py)')
+    parser.add_argument('--mqtt-port', type=int, default=int(os.getenv('LUMENATOR_MQTT_PORT', 1883)))
+    parser.add_argument('--mqtt-prefix', default=os.getenv('LUMENATOR_MQTT_PREFIX', 'lumenator'))
+
+    args = parser.parse_args()
+
+    # alarm_controller only defines this when run as a script
+    controller.daemon_mode = not args.verbose
+
+    if args.command == 'bench':
+        bench(args.seconds)
+    else:
+        mqtt = None
+        if args.mqtt_host:
+            mqtt = {'host': args.mqtt_host, 'port': args.mqtt_port, 'prefix': args.mqtt_prefix,
+                    'username': os.getenv('LUMENATOR_MQTT_USERNAME'),
+                    'password': os.getenv('LUMENATOR_MQTT_PASSWORD')}
+        try:
+            runtime = ControllerRuntime(args.host, args.port, verbose=args.verbose, token=args.token, mqtt=mqtt)
+        except ValueError as e:
+            parser.error(str(e))
+        run(runtime)
@@ -1,6 +1,6 @@
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time
 
 """
 Shared utility functions for the sunrise alarm system.
@@ -15,6 +15,10 @@ DEFAULT_CONFIG = {
     'max_brightness': 100  # Maximum brightness percentage
 }
 
+ALARM_MODES = ('fixed', 'solar')
+SOLAR_EVENTS = ('sunrise', 'dawn')  # solar.EVENTS, without importing numpy
+MAX_SOLAR_OFFSET = 12 * 60  # Minutes either side of the solar event
+
 def load_config():
     """
     Load alarm configuration from file
@@ -36,18 +40,72 @@ def save_config(config):
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f)
 
-def get_next_alarm_time():
+def validate_config(config):
     """
-    Calculate the next alarm time based on the configuration
+    Raise ValueError for settings the controller cannot schedule.
+
+    A solar alarm needs a latitude and longitude in range and a known
+    solar_event, like the settings form requires before it saves one.
+    """
+    try:
+        hour, minute = map(int, config['alarm_time'].split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid alarm time: {config['alarm_time']}")
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid alarm time: {config['alarm_time']}")
+    if not (0 <= config['max_brightness'] <= 100) or config['fade_duration'] <= 0:
+        raise ValueError('Out of range fade_duration or max_brightness')
+
+    mode = config.get('alarm_mode', 'fixed')
+    if mode not in ALARM_MODES:
+        raise ValueError(f"alarm_mode must be one of {', '.join(ALARM_MODES)}")
+    if mode != 'solar':
+        return
+    if 'latitude' not in config or 'longitude' not in config:
+        raise ValueError('A solar alarm needs latitude and longitude')
+    if not -90 <= config['latitude'] <= 90:
+        raise ValueError('latitude must be between -90 and 90')
+    if not -180 <= config['longitude'] <= 180:
+        raise ValueError('longitude must be between -180 and 180')
+    if config.get('solar_event', 'sunrise') not in SOLAR_EVENTS:
+        raise ValueError(f"solar_event must be one of {', '.join(SOLAR_EVENTS)}")
+    if abs(config.get('solar_offset', 0)) > MAX_SOLAR_OFFSET:
+        raise ValueError(f'solar_offset must be within {MAX_SOLAR_OFFSET} minutes')
+
+def alarm_time_for_date(config, date):
+    """
+    The alarm time on a given date.
+
+    With 'alarm_mode': 'solar' the alarm follows the natural sunrise:
+    'solar_event' ('sunrise' or 'dawn') plus 'solar_offset' minutes at
+    'latitude'/'longitude', but never later than 'alarm_time'. Days
+    without that event (polar day or night) use 'alarm_time'.
     """
-    config = load_config()
     alarm_hour, alarm_minute = map(int, config['alarm_time'].split(':'))
+    alarm_time = datetime.combine(date, time(alarm_hour, alarm_minute))
+    if config.get('alarm_mode') != 'solar':
+        return alarm_time
     
-    now = datetime.now()
-    alarm_time = now.replace(hour=alarm_hour, minute=alarm_minute, second=0, microsecond=0)
+    # numpy is only needed for solar alarms
+    from solar import solar_time
+    event = solar_time(date, config['latitude'], config['longitude'], config.get('solar_event', 'sunrise'))
+    if event is None:
+        return alarm_time
+    return min(event + timedelta(minutes=config.get('solar_offset', 0)), alarm_time)
+
+def get_next_alarm_time(now=None):
+    """
+    Calculate the next alarm time based on the configuration
+
+    now is a naive local datetime (default: the current time), so callers
+    can evaluate the schedule on a simulated clock.
+    """
+    config = load_config()
+    now = now or datetime.now()
+    alarm_time = alarm_time_for_date(config, now.date())
     
     # If the alarm time has already passed today, schedule for tomorrow
     if alarm_time <= now:
-        alarm_time += timedelta(days=1)
+        alarm_time = alarm_time_for_date(config, now.date() + timedelta(days=1))
     
     return alarm_time
\ No newline at end of file
@@ -1,16 +1,20 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_from_directory
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect, CSRFError
 from functools import wraps
-import hashlib
+import json
+import mimetypes
 import os
 from dotenv import load_dotenv
-import subprocess
-import signal
+import atexit
 
 # Import shared utilities
-from alarm_utils import load_config, save_config, get_next_alarm_time
+from alarm_utils import load_config, save_config, validate_config, get_next_alarm_time
+from controller_supervisor import ControllerSupervisor, ControllerError
+from fleet import Fleet, FLEET_FILE
+from auth_utils import PasswordVerifier, TokenVerifier, bearer_token
+import rate_limit_storage  # Registers the sqlite:// limiter storage  # noqa: F401
 
 load_dotenv()
 
@@ -21,21 +25,73 @@ csrf = CSRFProtect(app)
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=['20 per day', '5 per hour'],
-    storage_uri='memory://',
+    default_limits=['1000 per day', '200 per hour'],
+    # Persistent and shared by all worker processes
+    storage_uri=os.getenv('RATELIMIT_STORAGE_URI', 'sqlite:///ratelimit.db'),
 )
 
-# Path to the alarm controller script
-CONTROLLER_SCRIPT = 'alarm_controller.py'
-controller_process = None
+# Fingerprinted assets written by build_assets.py
+ASSET_DIST_DIR = os.path.join(app.static_folder, 'dist')
+ASSET_MAX_AGE = 365 * 24 * 3600
+try:
+    with open(os.path.join(ASSET_DIST_DIR, 'manifest.json')) as f:
+        asset_manifest = json.load(f)
+except FileNotFoundError:
+    # Not built: serve the plain files from static/
+    asset_manifest = {}
+
+@app.template_global()
+def asset_url(filename):
+    """URL of the built (fingerprinted) asset, or the plain static file"""
+    if filename in asset_manifest:
+        return url_for('assets', filename=asset_manifest[filename])
+    return url_for('static', filename=filename)
+
+@app.route('/assets/<path:filename>')
+@limiter.exempt
+def assets(filename):
+    """Serve a fingerprinted asset, precompressed when the client accepts it"""
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in accepted and os.path.isfile(os.path.join(ASSET_DIST_DIR, filename + suffix)):
+            encoding = candidate
+            break
+    
+    if encoding:
+        response = send_from_directory(ASSET_DIST_DIR, filename + ('.br' if encoding == 'br' else '.gz'),
+                                       mimetype=mimetypes.guess_type(filename)[0], max_age=ASSET_MAX_AGE)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(ASSET_DIST_DIR, filename, max_age=ASSET_MAX_AGE)
+    # The name changes with the content, so the file never needs revalidating
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# Owns the alarm controller process for the lifetime of the app
+supervisor = ControllerSupervisor()
+
+# Other Lumenators managed from this front-end, if fleet.json exists
+fleet = Fleet.from_file() if os.path.exists(FLEET_FILE) else None
+
+# Derived once at startup rather than on every login attempt
+password_verifier = PasswordVerifier(os.getenv('PASSWORD'))
+# Comma-separated long-lived tokens for scripts (Authorization: Bearer <token>)
+token_verifier = TokenVerifier(os.getenv('API_TOKENS', '').split(','))
 
 def check_password(password):
-    correct_password_hash = hashlib.sha256(os.getenv('PASSWORD').encode()).hexdigest()
-    return hashlib.sha256(password.encode()).hexdigest() == correct_password_hash
+    return password_verifier.verify(password)
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        # API tokens skip the session entirely, so no cookie is read or set
+        token = bearer_token(request.headers.get('Authorization'))
+        if token is not None:
+            if token_verifier.verify(token):
+                return f(*args, **kwargs)
+            return jsonify({'error': 'Invalid API token'}), 401
         if 'authenticated' not in session:
             return redirect(url_for('login'))
         return f(*args, **kwargs)
@@ -62,89 +118,148 @@ def index():
     config = load_config()
     if request.method == 'POST':
         # Update configuration
-        config['alarm_time'] = request.form['alarm_time']
-        config['fade_duration'] = int(request.form['fade_duration'])
-        config['enabled'] = 'enabled' in request.form
-        if 'max_brightness' in request.form:
-            config['max_brightness'] = int(request.form['max_brightness'])
+        try:
+            config['alarm_time'] = request.form['alarm_time']
+            config['fade_duration'] = int(request.form['fade_duration'])
+            config['enabled'] = 'enabled' in request.form
+            if 'max_brightness' in request.form:
+                config['max_brightness'] = int(request.form['max_brightness'])
+            
+            # Solar alarms need a location; without one the alarm stays fixed
+            config['alarm_mode'] = 'fixed'
+            if request.form.get('alarm_mode') == 'solar' and request.form.get('latitude') and request.form.get('longitude'):
+                config['alarm_mode'] = 'solar'
+                config['latitude'] = float(request.form['latitude'])
+                config['longitude'] = float(request.form['longitude'])
+                config['solar_event'] = request.form.get('solar_event', 'sunrise')
+                config['solar_offset'] = int(request.form.get('solar_offset') or 0)
+            
+            # The controller would refuse these settings, so never save them
+            validate_config(config)
+        except ValueError as e:
+            return render_template('index.html', config=load_config(), error=str(e)), 400
         
         save_config(config)
         
-        # Restart alarm controller to apply changes
-        restart_controller()
+        # Deliver the new configuration to the running controller
+        supervisor.reload_config()
         
         return redirect(url_for('index'))
     
     return render_template('index.html', config=config)
 
 @app.route('/api/control', methods=['POST'])
+@limiter.limit("60 per minute")
 @login_required
 @csrf.exempt  # For API use, but implement API token instead in production
 def control_alarm():
     action = request.json.get('action')
     
-    if action == 'on':
-        # Start sunrise immediately
-        subprocess.run(['python', CONTROLLER_SCRIPT, 'on'], check=True)
-        return jsonify({'status': 'success', 'message': 'Alarm started'})
-    
-    elif action == 'off':
-        # Turn off the light
-        subprocess.run(['python', CONTROLLER_SCRIPT, 'off'], check=True)
-        return jsonify({'status': 'success', 'message': 'Alarm stopped'})
-    
-    elif action == 'set_brightness':
-        # Set manual brightness
-        level = request.json.get('level', 0)
-        subprocess.run(['python', CONTROLLER_SCRIPT, 'set', str(level)], check=True)
-        return jsonify({'status': 'success', 'message': f'Brightness set to {level}%'})
+    try:
+        if action == 'on':
+            # Start sunrise immediately
+            supervisor.command({'cmd': 'on'})
+            return jsonify({'status': 'success', 'message': 'Alarm started'})
+        
+        elif action == 'off':
+            # Turn off the light
+            supervisor.command({'cmd': 'off'})
+            return jsonify({'status': 'success', 'message': 'Alarm stopped'})
+        
+        elif action == 'set_brightness':
+            # Set manual brightness
+            level = request.json.get('level', 0)
+            supervisor.command({'cmd': 'set', 'level': level})
+            return jsonify({'status': 'success', 'message': f'Brightness set to {level}%'})
+    except ControllerError as e:
+        return jsonify({'status': 'error', 'message': f'Controller unavailable: {e}'}), 503
     
     return jsonify({'status': 'error', 'message': 'Unknown action'})
 
 @app.route('/api/status', methods=['GET'])
+@limiter.exempt  # Polled by the page and home automation
 @login_required
 def get_status():
-    # Run the controller with status command to get current state
-    result = subprocess.run(['python', CONTROLLER_SCRIPT, 'status'], 
-                           capture_output=True, text=True, check=True)
-    
-    # Parse the output
-    lines = result.stdout.strip().split('\n')
-    status = {}
-    for line in lines:
-        if ':' in line:
-            key, value = line.split(':', 1)
-            status[key.strip()] = value.strip()
+    try:
+        status = supervisor.command({'cmd': 'status'})['status']
+    except (ControllerError, KeyError) as e:
+        return jsonify({'error': f'Controller unavailable: {e}'}), 503
     
-    return jsonify(status)
+    return jsonify({
+        'Alarm time': status['alarm_time'],
+        'Fade duration': f"{status['fade_duration']} minutes",
+        'Enabled': status['enabled'],
+        'Max brightness': f"{status['max_brightness']}%",
+        'Current brightness': f"{status['brightness']:.1f}%",
+        'Current dim level': status['dim_level'],
+        'Alarm active': status['alarm_active'],
+        'Next alarm': status['next_alarm'],
+        'Mains frequency': f"{status['mains_hz']} Hz",
+    })
 
-def start_controller():
-    """Start the alarm controller as a background process"""
-    global controller_process
-    
-    # Check if already running
-    if controller_process and controller_process.poll() is None:
-        return
+@app.route('/api/events', methods=['GET'])
+@limiter.exempt
+@login_required
+def get_events():
+    """
+    Controller events, filtered by ?since=&until= (epoch seconds), ?type= and ?limit=.
+    Without since only the controller's in-memory buffer is searched.
+    """
+    message = {'cmd': 'events', 'limit': request.args.get('limit', 500, type=int)}
+    for key in ('since', 'until'):
+        value = request.args.get(key, type=float)
+        if value is not None:
+            message[key] = value
+    if request.args.get('type'):
+        message['type'] = request.args['type']
     
-    # Start as a background process
-    controller_process = subprocess.Popen(['python', CONTROLLER_SCRIPT, 'daemon'])
+    try:
+        return jsonify(supervisor.command(message)['events'])
+    except (ControllerError, KeyError) as e:
+        return jsonify({'error': f'Controller unavailable: {e}'}), 503
 
-def stop_controller():
-    """Stop the alarm controller process"""
-    global controller_process
-    
-    if controller_process:
-        try:
-            controller_process.terminate()
-            controller_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            controller_process.kill()
-        controller_process = None
+@app.route('/api/supervisor', methods=['GET'])
+@limiter.exempt
+@login_required
+def get_supervisor_metrics():
+    return jsonify(supervisor.metrics())
 
-def restart_controller():
-    """Restart the alarm controller to apply config changes"""
-    stop_controller()
-    start_controller()
+@app.route('/api/fleet/status', methods=['GET'])
+@limiter.exempt
+@login_required
+def get_fleet_status():
+    """Status of every controller in fleet.json, or ?nodes=a,b"""
+    if fleet is None:
+        return jsonify({'error': f'No {FLEET_FILE} configured'}), 404
+    names = [name for name in request.args.get('nodes', '').split(',') if name]
+    try:
+        return jsonify(fleet.status(names))
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/fleet/control', methods=['POST'])
+@limiter.limit("60 per minute")
+@login_required
+@csrf.exempt
+def fleet_control():
+    """
+    Apply a scene ({"action": "scene", "level": 40}) or alarm settings
+    ({"action": "schedule", "config": {...}}) to all or the listed nodes
+    """
+    if fleet is None:
+        return jsonify({'error': f'No {FLEET_FILE} configured'}), 404
+    action = request.json.get('action')
+    names = request.json.get('nodes')
+    
+    try:
+        if action == 'scene':
+            return jsonify(fleet.scene(float(request.json.get('level', 0)), names))
+        elif action == 'schedule':
+            return jsonify(fleet.set_schedule(request.json.get('config', {}), names))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'error': 'Unknown action'}), 400
 
 @app.errorhandler(429)
 def ratelimit_handler(e):
@@ -154,17 +269,15 @@ def ratelimit_handler(e):
 def handle_csrf_error(e):
     return render_template('csrf_error.html', reason=e.description), 400
 
-# We'll initialize the controller when the app starts
-# For newer Flask versions, we'll use a different approach
-
-# Stop the controller when the app stops
-@app.teardown_appcontext
-def shutdown(exception=None):
-    stop_controller()
-
 # Create a function to initialize resources
 def initialize_app():
-    start_controller()
+    # Compile every template now instead of on the first request that uses it
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    
+    supervisor.start()
+    # The controller lives as long as the app process, not a request context
+    atexit.register(supervisor.stop)
 
 if __name__ == '__main__':
     try:
@@ -172,4 +285,4 @@ if __name__ == '__main__':
         initialize_app()
         app.run(host='0.0.0.0', port=5000, debug=False)
     finally:
-        stop_controller()
\ No newline at end of file
+        supervisor.stop()
\ No newline at end of file
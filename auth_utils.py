@@ -0,0 +1,55 @@
+import hashlib
+import hmac
+import os
+
+"""
+Password and API token verification for the Flask app.
+
+The configured password is run through PBKDF2 once at startup; login
+attempts are derived with the same salt and compared in constant time.
+API tokens let scripts authenticate per request with an
+'Authorization: Bearer <token>' header instead of a session cookie.
+"""
+
+KDF_ITERATIONS = 200000
+
+def derive_password_hash(password, salt):
+    """
+    Derive a PBKDF2-SHA256 hash of password
+    """
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, KDF_ITERATIONS)
+
+class PasswordVerifier:
+    def __init__(self, password):
+        self.salt = os.urandom(16)
+        # Without a configured password no login can succeed
+        self.password_hash = derive_password_hash(password, self.salt) if password else None
+
+    def verify(self, attempt):
+        if self.password_hash is None or not attempt:
+            return False
+        return hmac.compare_digest(derive_password_hash(attempt, self.salt), self.password_hash)
+
+class TokenVerifier:
+    def __init__(self, tokens):
+        # Tokens are long random strings, so a single SHA-256 is enough to
+        # avoid keeping them in memory in plain text
+        self.token_hashes = [hashlib.sha256(token.encode()).digest() for token in tokens if token]
+
+    def verify(self, token):
+        if not token or not self.token_hashes:
+            return False
+        token_hash = hashlib.sha256(token.encode()).digest()
+        # Check every token so timing does not reveal which one matched
+        matched = False
+        for candidate in self.token_hashes:
+            matched |= hmac.compare_digest(token_hash, candidate)
+        return matched
+
+def bearer_token(authorization_header):
+    """
+    Extract the token from an 'Authorization: Bearer <token>' header
+    """
+    if authorization_header and authorization_header.startswith('Bearer '):
+        return authorization_header[len('Bearer '):].strip()
+    return None
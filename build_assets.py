@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Build step for the web app's static assets.
+
+Minifies the CSS/JS under static/, writes content-fingerprinted copies to
+static/dist/ together with .gz (and .br when the brotli module is
+installed) variants, and records the mapping in static/dist/manifest.json.
+app.py serves those files with far-future immutable caching. Run it after
+changing anything in static/:
+
+    python build_assets.py
+"""
+
+STATIC_DIR = 'static'
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+ASSET_EXTENSIONS = ('.css', '.js')
+
+# Assets loaded by the main page, for the page weight report
+PAGE_ASSETS = ['style.css', 'js/index.js']
+
+def minify_css(source):
+    """
+    Strip comments and unneeded whitespace from a stylesheet
+
+    The space before a colon stays: in a selector it is a descendant
+    combinator ('a :hover' is not 'a:hover').
+    """
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = source.replace(': ', ':')
+    return source.replace(';}', '}').strip()
+
+def minify_js(source):
+    """
+    Conservative JS minifier: drops comment-only lines, indentation and blank lines.
+
+    It never touches code inside a line, so string literals and regexes
+    are left intact, and lines inside a multi-line template literal are
+    kept verbatim. Backticks are counted per line, so a backtick inside
+    an ordinary string or comment would throw that tracking off.
+    """
+    lines = []
+    in_comment = False
+    in_template = False
+    for line in source.split('\n'):
+        if not in_template:
+            line = line.lstrip()
+            if in_comment or line.startswith('/*'):
+                end = line.find('*/')
+                in_comment = end < 0
+                line = '' if in_comment else line[end + 2:].lstrip()
+            if not line.strip() or line.startswith('//'):
+                continue
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+        # Trailing whitespace on a line that ends inside a template literal belongs to it
+        lines.append(line if in_template else line.rstrip())
+    return '\n'.join(lines) + '\n'
+
+def fingerprinted_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+def build():
+    """
+    Build every asset and return {logical name: size info}
+    """
+    manifest = {}
+    sizes = {}
+
+    for dirpath, dirnames, filenames in os.walk(STATIC_DIR):
+        # Never reprocess our own output
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != DIST_DIR]
+        for filename in filenames:
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+
+            minified = (minify_css(source) if filename.endswith('.css') else minify_js(source)).encode()
+            output_name = fingerprinted_name(name, minified)
+            output_path = os.path.join(DIST_DIR, output_name)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            with open(output_path, 'wb') as f:
+                f.write(minified)
+            # mtime=0 keeps the .gz output byte-identical between builds
+            gzipped = gzip.compress(minified, compresslevel=9, mtime=0)
+            with open(output_path + '.gz', 'wb') as f:
+                f.write(gzipped)
+            sizes[name] = {'raw': len(source.encode()), 'min': len(minified), 'gzip': len(gzipped)}
+            if brotli is not None:
+                compressed = brotli.compress(minified, quality=11)
+                with open(output_path + '.br', 'wb') as f:
+                    f.write(compressed)
+                sizes[name]['br'] = len(compressed)
+
+            manifest[name] = output_name
+
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return sizes
+
+def report(sizes, link_kbps, rtt_ms):
+    """
+    Print the page weight and an estimated first-load time over a slow link
+    """
+    print(f"{'asset':<20}{'raw':>8}{'min':>8}{'gzip':>8}{'br':>8}")
+    for name, size in sorted(sizes.items()):
+        print(f"{name:<20}{size['raw']:>8}{size['min']:>8}{size['gzip']:>8}{size.get('br', '-'):>8}")
+
+    page = [sizes[name] for name in PAGE_ASSETS if name in sizes]
+    before = sum(size['raw'] for size in page)
+    after = sum(size.get('br', size['gzip']) for size in page)
+    bytes_per_ms = link_kbps * 1000 / 8 / 1000
+
+    # Before: assets fetched uncompressed on every load (one round trip each).
+    # After: compressed on first load, served from cache without a request later.
+    print(f"\nPage assets: {before} -> {after} bytes")
+    print(f"First load at {link_kbps} kbit/s, {rtt_ms} ms RTT: "
+          f"{len(page) * rtt_ms + before / bytes_per_ms:.0f} ms -> "
+          f"{len(page) * rtt_ms + after / bytes_per_ms:.0f} ms")
+    print(f"Repeat load: {len(page) * rtt_ms + before / bytes_per_ms:.0f} ms -> 0 ms (immutable cache)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed static assets')
+    parser.add_argument('--link-kbps', type=int, default=500, help='Link speed for the load time estimate')
+    parser.add_argument('--rtt-ms', type=int, default=100, help='Round trip time for the load time estimate')
+
+    args = parser.parse_args()
+    report(build(), args.link_kbps, args.rtt_ms)
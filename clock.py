@@ -0,0 +1,98 @@
+"""
+Clock abstraction for scheduling and fades.
+
+Scheduling and fade code asks a clock for the time and sleeps through it,
+so the same code can run against the real clock or against a VirtualClock
+in which a week of alarms, including DST transitions, passes in seconds.
+Ramps read the same clock through perf_counter_ns; the sub-millisecond
+gate timing always uses the real clock.
+
+The controller (clock.py) and sunrise_alarm (app/clock.py) each carry
+this module, since sunrise_alarm is deployed as a directory of its own.
+Keep the two files identical; tests/test_shared_modules.py fails when they drift.
+"""
+import threading
+import time
+from datetime import datetime
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+
+class SystemClock:
+    """The real wall clock"""
+
+    def now(self):
+        """Naive local datetime, like datetime.now()"""
+        return datetime.now()
+
+    def time(self):
+        """Wall-clock epoch seconds, like time.time()"""
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def perf_counter_ns(self):
+        """Monotonic nanoseconds for ramp timing, like time.perf_counter_ns()"""
+        return time.perf_counter_ns()
+
+    def timestamp(self, local_time):
+        """Epoch seconds of a naive local datetime"""
+        return local_time.timestamp()
+
+
+class VirtualClock:
+    """
+    Simulated clock that only moves when something sleeps on it.
+
+    Local time comes from the given IANA time zone, so DST transitions
+    happen exactly as they would on the device. Every sleep calls
+    on_advance(clock) before time moves on, which lets a harness record
+    the brightness trajectory at each step.
+    """
+
+    def __init__(self, start, tz=None, on_advance=None):
+        if tz is not None and ZoneInfo is None:
+            raise RuntimeError('Time zones need Python 3.9+ (zoneinfo)')
+        self.tz = ZoneInfo(tz) if tz else None
+        self.on_advance = on_advance
+        self._lock = threading.Lock()
+        self._epoch = self.timestamp(start) if isinstance(start, datetime) else float(start)
+
+    def now(self):
+        with self._lock:
+            epoch = self._epoch
+        if self.tz is None:
+            return datetime.fromtimestamp(epoch)
+        return datetime.fromtimestamp(epoch, self.tz).replace(tzinfo=None)
+
+    def time(self):
+        with self._lock:
+            return self._epoch
+
+    def sleep(self, seconds):
+        if self.on_advance:
+            self.on_advance(self)
+        with self._lock:
+            self._epoch += max(0.0, seconds)
+
+    def sleep_until(self, epoch):
+        self.sleep(epoch - self.time())
+
+    def perf_counter_ns(self):
+        """The simulated time in nanoseconds, so ramps advance with the clock"""
+        return int(self.time() * 1e9)
+
+    def timestamp(self, local_time):
+        """
+        Epoch seconds of a naive local datetime in this clock's zone.
+
+        Times skipped by a spring-forward transition land an hour later
+        (02:30 becomes 03:30); repeated autumn times resolve to the first one.
+        """
+        if self.tz is None:
+            return local_time.timestamp()
+        return local_time.replace(tzinfo=self.tz, fold=0).timestamp()
@@ -0,0 +1,207 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+"""
+Supervisor for the alarm controller process.
+
+Owns the alarm_runtime.py process for the lifetime of the web app, checks
+its health over IPC and restarts it only when it has died or stopped
+answering. Configuration changes are delivered to the running controller
+with a 'reload' command instead of a restart.
+"""
+
+CONTROLLER_SCRIPT = 'alarm_runtime.py'
+CONTROL_HOST = '127.0.0.1'
+CONTROL_PORT = 5055
+
+HEALTH_CHECK_INTERVAL = 10   # Seconds between pings
+MAX_FAILED_PINGS = 3         # Restart after this many consecutive failures
+STARTUP_TIMEOUT = 15         # Seconds to wait for a new controller to answer
+
+class ControllerError(Exception):
+    """Raised when the controller cannot be reached"""
+
+class ControllerSupervisor:
+    def __init__(self, script=CONTROLLER_SCRIPT, host=CONTROL_HOST, port=CONTROL_PORT,
+                 check_interval=HEALTH_CHECK_INTERVAL):
+        self.script = script
+        self.host = host
+        self.port = port
+        self.check_interval = check_interval
+        # The controller inherits the same token through the environment
+        self.token = os.getenv('LUMENATOR_CONTROL_TOKEN')
+
+        self.process = None
+        self._sock = None
+        self._file = None
+        self._io_lock = threading.Lock()
+        self._lifecycle_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread = None
+        self._next_id = 0
+
+        # Metrics
+        self.starts = 0
+        self.restarts = 0
+        self.reloads = 0
+        self.commands = 0
+        self.last_startup_seconds = 0.0
+        self.total_startup_seconds = 0.0
+
+    # --- IPC -------------------------------------------------------------
+
+    def _close_connection(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def send(self, message, timeout=2.0):
+        """
+        Send one command to the controller over a persistent connection and return its response
+        """
+        with self._io_lock:
+            self._next_id += 1
+            message = dict(message, id=self._next_id)
+            if self.token:
+                message['token'] = self.token
+            payload = json.dumps(message).encode() + b'\n'
+
+            # One retry on a fresh connection in case the old one went stale
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = socket.create_connection((self.host, self.port), timeout=timeout)
+                        self._file = self._sock.makefile('rb')
+                    self._sock.settimeout(timeout)
+                    self._sock.sendall(payload)
+                    line = self._file.readline()
+                    if not line:
+                        raise ConnectionError('Controller closed the connection')
+                    return json.loads(line)
+                except (OSError, ValueError) as e:
+                    self._close_connection()
+                    if attempt:
+                        raise ControllerError(str(e))
+
+    def command(self, message):
+        """
+        Run a control/status command in the live controller.
+
+        Each of these used to spawn a one-shot alarm_controller.py process.
+        """
+        response = self.send(message)
+        self.commands += 1
+        return response
+
+    def ping(self):
+        try:
+            return self.send({'cmd': 'ping'}, timeout=1.0).get('ok', False)
+        except ControllerError:
+            return False
+
+    # --- lifecycle -------------------------------------------------------
+
+    def _spawn(self):
+        start = time.monotonic()
+        self.process = subprocess.Popen([sys.executable, self.script,
+                                         '--host', self.host, '--port', str(self.port)])
+        while time.monotonic() - start < STARTUP_TIMEOUT:
+            if self.process.poll() is not None:
+                break
+            if self.ping():
+                break
+            time.sleep(0.1)
+
+        self.last_startup_seconds = time.monotonic() - start
+        self.total_startup_seconds += self.last_startup_seconds
+        self.starts += 1
+
+    def _terminate(self):
+        with self._io_lock:
+            self._close_connection()
+        if self.process:
+            try:
+                self.process.terminate()
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def start(self):
+        """Start the controller and the health checker (no-op if already running)"""
+        with self._lifecycle_lock:
+            if self.process and self.process.poll() is None:
+                return
+            self._stop_event.clear()
+            self._spawn()
+            if self._health_thread is None or not self._health_thread.is_alive():
+                self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+                self._health_thread.start()
+
+    def stop(self):
+        """Stop the health checker and the controller"""
+        self._stop_event.set()
+        with self._lifecycle_lock:
+            self._terminate()
+
+    def restart(self):
+        with self._lifecycle_lock:
+            if self._stop_event.is_set():
+                return
+            self._terminate()
+            self._spawn()
+            self.restarts += 1
+
+    def _health_loop(self):
+        failures = 0
+        while not self._stop_event.wait(self.check_interval):
+            if self.process is None or self.process.poll() is not None:
+                print("Alarm controller exited, restarting")
+                failures = 0
+                self.restart()
+            elif self.ping():
+                failures = 0
+            else:
+                failures += 1
+                if failures >= MAX_FAILED_PINGS:
+                    print(f"Alarm controller missed {failures} health checks, restarting")
+                    failures = 0
+                    self.restart()
+
+    # --- live configuration ----------------------------------------------
+
+    def reload_config(self):
+        """Tell the running controller to re-read its configuration"""
+        try:
+            response = self.send({'cmd': 'reload'})
+        except ControllerError:
+            # Not reachable: the health checker will bring it back with the new config
+            return False
+        if response.get('ok'):
+            self.reloads += 1
+        return response.get('ok', False)
+
+    def metrics(self):
+        average_startup = self.total_startup_seconds / self.starts if self.starts else 0.0
+        return {
+            'running': self.process is not None and self.process.poll() is None,
+            'pid': self.process.pid if self.process else None,
+            'starts': self.starts,
+            'restarts': self.restarts,
+            'config_reloads': self.reloads,
+            'last_startup_seconds': round(self.last_startup_seconds, 3),
+            'commands': self.commands,
+            # Every reload used to restart the controller and every command
+            # used to start a one-shot controller process
+            'restarts_avoided': self.reloads + self.commands,
+            'startup_seconds_avoided': round((self.reloads + self.commands) * average_startup, 3),
+        }
@@ -0,0 +1,124 @@
+import collections
+import itertools
+import json
+import os
+import threading
+import time
+
+"""
+Structured event log for the alarm controller.
+
+Events go into an in-memory ring buffer; record() is a single deque append,
+so it is safe to call from the gate loop without any disk I/O. A
+background flush writes new events in batches to a size-rotated JSON
+lines file, and query() filters by type and time range, reading the
+rotated files only when an explicit since is older than the buffer.
+
+Each event is a compact JSON object: {"t": epoch, "e": type, ...fields}.
+"""
+
+EVENT_LOG_FILE = 'alarm_events.log'
+BUFFER_SIZE = 4096
+MAX_FILE_BYTES = 512 * 1024
+BACKUP_COUNT = 3
+
+# Event types
+ZERO_CROSS_LOSS = 'zero_cross_loss'
+ZERO_CROSS_RESTORED = 'zero_cross_restored'
+ALARM_START = 'alarm_start'
+ALARM_END = 'alarm_end'
+MANUAL_OVERRIDE = 'manual_override'
+BRIGHTNESS = 'brightness'
+CONFIG_RELOAD = 'config_reload'
+
+class EventLog:
+    def __init__(self, path=EVENT_LOG_FILE, buffer_size=BUFFER_SIZE,
+                 max_bytes=MAX_FILE_BYTES, backup_count=BACKUP_COUNT, clock=None):
+        self.path = path
+        # Events carry the controller's clock, so query ranges match under a VirtualClock
+        self.time = clock.time if clock is not None else time.time
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        # deque.append is atomic, so writers never take a lock
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._flushed_seq = 0
+        self._seq = itertools.count(1)  # next() is atomic, unlike += 1
+        self._flush_lock = threading.Lock()
+
+    def record(self, event_type, **fields):
+        """Append one event to the ring buffer (no I/O)"""
+        fields['t'] = self.time()
+        fields['e'] = event_type
+        fields['n'] = next(self._seq)
+        self._buffer.append(fields)
+
+    def flush(self):
+        """
+        Write every event recorded since the last flush in one batch.
+
+        Returns the number of events written. Events that fell out of the
+        ring buffer before a flush are lost, and are counted in a 'dropped' event.
+        """
+        with self._flush_lock:
+            pending = [event for event in list(self._buffer) if event['n'] > self._flushed_seq]
+            if not pending:
+                return 0
+
+            dropped = pending[0]['n'] - self._flushed_seq - 1
+            lines = []
+            if dropped > 0:
+                lines.append(json.dumps({'t': pending[0]['t'], 'e': 'dropped', 'count': dropped},
+                                        separators=(',', ':')))
+            lines.extend(json.dumps(event, separators=(',', ':')) for event in pending)
+
+            self._rotate_if_needed()
+            with open(self.path, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+            self._flushed_seq = pending[-1]['n']
+            return len(pending)
+
+    def _rotate_if_needed(self):
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        os.replace(self.path, f'{self.path}.1')
+
+    def _read_files(self):
+        """Yield flushed events from the oldest rotated file to the newest"""
+        paths = [f'{self.path}.{index}' for index in range(self.backup_count, 0, -1)] + [self.path]
+        for path in paths:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except OSError:
+                continue
+
+    def query(self, since=None, until=None, event_type=None, limit=500):
+        """
+        Events with since <= t < until (epoch seconds), newest last.
+
+        since defaults to the start of the in-memory buffer; only an
+        explicit older since reads (and parses) the rotated files.
+        """
+        events = list(self._buffer)
+        # Only go to disk when the range starts before the buffered events
+        if since is not None and (not events or since < events[0]['t']):
+            with self._flush_lock:
+                events = list(self._read_files())
+                events.extend(event for event in list(self._buffer) if event['n'] > self._flushed_seq)
+
+        result = [event for event in events
+                  if (since is None or event['t'] >= since)
+                  and (until is None or event['t'] < until)
+                  and (event_type is None or event['e'] == event_type)]
+        return result[-limit:]
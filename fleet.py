@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+
+"""
+Fleet manager: one web front-end driving the controllers of several Lumenators.
+
+Each node is an alarm_runtime.py listening on the network (start it with
+--host 0.0.0.0 and LUMENATOR_CONTROL_TOKEN set); the sunrise_alarm app
+has no control socket and cannot join a fleet. The manager keeps one
+persistent connection per node and multiplexes requests over it,
+matching responses by id, so a fan-out to N nodes costs one round trip
+on N already open sockets. Slow nodes time out individually and offline
+nodes are skipped with backoff, so they never hold up the rest.
+
+Nodes are listed in fleet.json:
+    {"nodes": [{"name": "bedroom", "host": "192.168.1.20", "port": 5055, "token": "..."}]}
+
+Run a local demo against simulated controllers with:
+    python fleet.py simulate --nodes 8 --slow 2 --offline 1
+"""
+
+FLEET_FILE = 'fleet.json'
+REQUEST_TIMEOUT = 2.0     # Seconds before one node's request gives up
+CONNECT_TIMEOUT = 2.0
+MAX_BACKOFF = 60.0        # Longest an offline node is skipped before retrying
+
+class NodeError(Exception):
+    """Raised when a node cannot be reached or does not answer in time"""
+
+class FleetNode:
+    """
+    Multiplexed connection to one controller; all methods run on the fleet's event loop
+    """
+    def __init__(self, name, host, port=5055, token=None, timeout=REQUEST_TIMEOUT):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._connect_lock = asyncio.Lock()
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+        # Offline backoff
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self.connected:
+                return
+            if time.monotonic() < self.retry_at:
+                raise NodeError(f'offline ({self.last_error}), retrying in '
+                                f'{self.retry_at - time.monotonic():.0f} s')
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError) as e:
+                self._mark_failed(e)
+                raise NodeError(f'cannot connect: {self.last_error}')
+            self._read_task = asyncio.get_running_loop().create_task(self._read_loop(self._reader))
+
+    def _mark_failed(self, error):
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        self.retry_at = time.monotonic() + min(MAX_BACKOFF, 2 ** (self.failures - 1))
+
+    async def _read_loop(self, reader):
+        """Hand each response to the request waiting for its id"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = json.loads(line)
+                except ValueError:
+                    continue
+                future = self._pending.pop(response.pop('id', None), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # A reconnect may already have replaced this connection
+            if self._reader is reader:
+                self._drop_connection(ConnectionError('connection closed'))
+
+    def _drop_connection(self, error):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(NodeError(str(error)))
+
+    async def request(self, message, timeout=None):
+        """Send one command and wait for its response"""
+        await self._connect()
+        request_id = next(self._ids)
+        message = dict(message, id=request_id)
+        if self.token:
+            message['token'] = self.token
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(json.dumps(message).encode() + b'\n')
+            await self._writer.drain()
+            response = await asyncio.wait_for(future, timeout or self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self._pending.pop(request_id, None)
+            # A timed-out connection may deliver stale responses later; start over
+            self._drop_connection(e)
+            self._mark_failed(e if str(e) else 'timed out')
+            raise NodeError(self.last_error)
+        self.failures = 0
+        self.retry_at = 0.0
+        return response
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
+
+class Fleet:
+    """
+    The set of nodes, driven from any thread through a private event loop.
+
+    Flask request threads call the blocking methods; the connections live
+    on one background loop and are shared by every request.
+    """
+    def __init__(self, nodes, timeout=REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.nodes = {}
+        for node in nodes:
+            self.nodes[node['name']] = self._run(self._make_node(node))
+
+    @classmethod
+    def from_file(cls, path=FLEET_FILE):
+        with open(path) as f:
+            return cls(json.load(f)['nodes'])
+
+    async def _make_node(self, node):
+        # Created on the loop so its lock belongs to that loop
+        return FleetNode(node['name'], node['host'], node.get('port', 5055),
+                         node.get('token'), self.timeout)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _call_one(self, node, message):
+        start = time.monotonic()
+        try:
+            response = await node.request(message)
+        except NodeError as e:
+            response = {'ok': False, 'error': str(e), 'offline': True}
+        response['latency_ms'] = round((time.monotonic() - start) * 1000, 1)
+        return response
+
+    async def _fan_out(self, message, names):
+        nodes = [self.nodes[name] for name in names]
+        responses = await asyncio.gather(*(self._call_one(node, message) for node in nodes))
+        return dict(zip(names, responses))
+
+    def call(self, message, names=None):
+        """
+        Send message to every node (or the named ones) in parallel.
+
+        Returns {name: response}; unreachable nodes get ok=False and offline=True.
+        """
+        names = list(names) if names else list(self.nodes)
+        unknown = [name for name in names if name not in self.nodes]
+        if unknown:
+            raise KeyError(f"Unknown node(s): {', '.join(unknown)}")
+        return self._run(self._fan_out(message, names))
+
+    def status(self, names=None):
+        responses = self.call({'cmd': 'status'}, names)
+        return {
+            'nodes': responses,
+            'online': sum(1 for response in responses.values() if response.get('ok')),
+            'total': len(responses),
+        }
+
+    def set_schedule(self, config, names=None):
+        """Apply alarm settings (alarm_time, fade_duration, enabled, max_brightness)"""
+        return self.call({'cmd': 'config', 'config': config}, names)
+
+    def scene(self, level, names=None):
+        """Set every node to the same brightness (0 turns the lights off)"""
+        if level <= 0:
+            return self.call({'cmd': 'off'}, names)
+        return self.call({'cmd': 'set', 'level': level}, names)
+
+    def close(self):
+        for node in self.nodes.values():
+            self._run(node.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=1)
+
+# --- simulated controllers --------------------------------------------------
+
+class SimulatedController:
+    """
+    In-memory stand-in for alarm_runtime.py speaking the same IPC protocol
+    """
+    def __init__(self, delay=0.0, token=None):
+        self.delay = delay
+        self.token = token
+        self.config = {'alarm_time': '07:00', 'fade_duration': 30, 'enabled': True, 'max_brightness': 100}
+        self.brightness = 0.0
+        self.server = None
+
+    def handle_command(self, message):
+        if self.token and message.get('token') != self.token:
+            return {'ok': False, 'error': 'Invalid token'}
+        cmd = message.get('cmd')
+        if cmd == 'status':
+            return {'ok': True, 'status': dict(self.config, brightness=self.brightness)}
+        elif cmd == 'set':
+            self.brightness = max(0.0, min(100.0, float(message.get('level', 0))))
+            return {'ok': True, 'brightness': self.brightness}
+        elif cmd == 'off':
+            self.brightness = 0.0
+            return {'ok': True}
+        elif cmd == 'config':
+            self.config.update(message.get('config', {}))
+            return {'ok': True, 'config': self.config}
+        elif cmd in ('on', 'reload', 'ping'):
+            return {'ok': True}
+        return {'ok': False, 'error': f'Unknown command: {cmd}'}
+
+    async def _answer(self, message, writer):
+        await asyncio.sleep(self.delay)
+        response = self.handle_command(message)
+        if 'id' in message:
+            response['id'] = message['id']
+        writer.write(json.dumps(response).encode() + b'\n')
+
+    async def handle_client(self, reader, writer):
+        # Answers concurrently, so responses can come back out of order
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self._answer(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+def simulate(count, slow, offline, slow_delay, timeout):
+    """
+    Drive count local simulated controllers, some slow or offline, and time the fan-out
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def start_nodes():
+        nodes = []
+        for index in range(count):
+            name = f'node{index}'
+            if index < offline:
+                # Nothing listens on this port
+                nodes.append({'name': name, 'host': '127.0.0.1', 'port': 9})
+                continue
+            delay = slow_delay if index < offline + slow else 0.005
+            controller = SimulatedController(delay=delay, token='secret')
+            nodes.append({'name': name, 'host': '127.0.0.1', 'port': await controller.start(), 'token': 'secret'})
+        return nodes
+
+    nodes = asyncio.run_coroutine_threadsafe(start_nodes(), loop).result()
+    fleet = Fleet(nodes, timeout=timeout)
+
+    for label, action in (('status', fleet.status),
+                          ('scene 40%', lambda: fleet.scene(40)),
+                          ('schedule 06:45', lambda: fleet.set_schedule({'alarm_time': '06:45'})),
+                          ('status', fleet.status)):
+        start = time.monotonic()
+        result = action()
+        elapsed = (time.monotonic() - start) * 1000
+        responses = result['nodes'] if 'nodes' in result else result
+        ok = sum(1 for response in responses.values() if response.get('ok'))
+        print(f"{label:<16} {ok}/{len(responses)} ok in {elapsed:6.1f} ms")
+
+    serial = sum(min(response['latency_ms'], timeout * 1000)
+                 for response in fleet.status()['nodes'].values())
+    print(f"One-by-one the last status would take about {serial:.0f} ms")
+    fleet.close()
+    loop.call_soon_threadsafe(loop.stop)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Drive a fleet of sunrise alarm controllers')
+    parser.add_argument('command', choices=['status', 'scene', 'schedule', 'simulate'])
+    parser.add_argument('value', nargs='?', help='Brightness for scene, JSON settings for schedule')
+    parser.add_argument('--file', default=FLEET_FILE, help='Fleet definition')
+    parser.add_argument('--nodes', type=int, default=8, help='Simulated nodes')
+    parser.add_argument('--slow', type=int, default=1, help='Simulated nodes that answer slowly')
+    parser.add_argument('--offline', type=int, default=1, help='Simulated nodes that are down')
+    parser.add_argument('--slow-delay', type=float, default=1.0, help='Delay of a slow node (s)')
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT)
+
+    args = parser.parse_args()
+
+    if args.command == 'simulate':
+        simulate(args.nodes, args.slow, args.offline, args.slow_delay, args.timeout)
+    else:
+        fleet = Fleet.from_file(args.file) if os.path.exists(args.file) else None
+        if fleet is None:
+            parser.error(f'{args.file} not found')
+        if args.command == 'status':
+            result = fleet.status()
+        elif args.command == 'scene':
+            result = fleet.scene(float(args.value or 0))
+        else:
+            result = fleet.set_schedule(json.loads(args.value or '{}'))
+        print(json.dumps(result, indent=2))
+        fleet.close()
@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for serving app.py in production.
+
+Run with:  gunicorn -c gunicorn.conf.py wsgi:app
+Reload:    kill -HUP <master pid>   (new worker starts once the old one exits)
+"""
+import fcntl
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# One worker process owns the alarm controller; a small thread pool serves
+# requests concurrently without multiplying memory on the Pi
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+
+keepalive = 5
+timeout = 30
+graceful_timeout = 10
+
+accesslog = '-'
+errorlog = '-'
+
+# Held by the worker for its lifetime so that during a graceful reload the
+# new worker only starts the controller after the old one has exited
+LOCK_FILE = os.getenv('LUMENATOR_LOCK', '/tmp/lumenator-app.lock')
+
+
+def post_fork(server, worker):
+    worker.singleton_lock = open(LOCK_FILE, 'w')
+    fcntl.flock(worker.singleton_lock, fcntl.LOCK_EX)
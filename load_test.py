@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+"""
+Simple HTTP load test for comparing the development server with gunicorn.
+
+Each client thread keeps one keep-alive connection open and issues GET
+requests back to back for the given duration, then requests/s and latency
+percentiles are reported. Example:
+
+    python load_test.py http://127.0.0.1:5000/auth/login --clients 8 --seconds 20
+"""
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+def client(url, deadline, cookie, latencies, errors):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    headers = {'Connection': 'keep-alive'}
+    if cookie:
+        headers['Cookie'] = cookie
+
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn.close()
+    conn.close()
+
+def run(url, clients, seconds, cookie=None):
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(url, deadline, cookie, latencies, errors))
+               for _ in range(clients)]
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    print(f"URL: {url}")
+    print(f"Clients: {clients}, duration: {elapsed:.1f}s")
+    print(f"Requests: {len(latencies)}, errors: {len(errors)}")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} requests/s")
+    print(f"Latency p50: {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"Latency p99: {percentile(latencies, 99) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='HTTP load test for the alarm web apps')
+    parser.add_argument('url', help='URL to request')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent connections')
+    parser.add_argument('--seconds', type=int, default=20, help='Test duration')
+    parser.add_argument('--cookie', help='Cookie header, e.g. a logged-in session')
+
+    args = parser.parse_args()
+    run(args.url, args.clients, args.seconds, args.cookie)
@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import collections
+import http.client
+import json
+import math
+import os
+import queue
+import time
+from urllib.parse import urlsplit
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+"""
+MQTT bridge for home-automation hubs.
+
+Runs inside alarm_runtime.py. It publishes the controller state as
+retained topics and turns command topics into the same commands the IPC
+socket takes:
+
+    <prefix>/availability     online / offline (retained, offline is the last will)
+    <prefix>/state            {"brightness": .., "dim_level": .., "alarm_active": .., "next_alarm": ..}
+    <prefix>/light/set        ON / OFF
+    <prefix>/brightness/set   0-100
+    <prefix>/sunrise/set      anything: start a sunrise now
+
+State changes during a fade are coalesced, so a hub sees at most one
+state message per PUBLISH_INTERVAL. paho reconnects on its own with
+exponential backoff between RECONNECT_MIN_DELAY and RECONNECT_MAX_DELAY.
+Needs paho-mqtt (pip install paho-mqtt).
+
+Compare command latency over MQTT and over the web app's /api/control
+against a running controller and app:
+
+    python mqtt_bridge.py bench --broker 127.0.0.1 --url http://127.0.0.1:5000 --api-token <token>
+"""
+
+DEFAULT_PREFIX = 'lumenator'
+MQTT_PORT = 1883
+PUBLISH_INTERVAL = 1.0     # Seconds between coalesced state messages
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 120
+LATENCY_SAMPLES = 256      # Command latencies kept for the percentiles
+BENCH_TIMEOUT = 5.0        # Seconds a bench sample waits for its confirmation
+
+def new_client():
+    """A paho client; 2.x needs the callback API version, 1.x has no such argument"""
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    return mqtt.Client()
+
+class MQTTBridge:
+    def __init__(self, runtime, host, port=MQTT_PORT, prefix=DEFAULT_PREFIX,
+                 username=None, password=None, publish_interval=PUBLISH_INTERVAL):
+        if mqtt is None:
+            raise RuntimeError('The MQTT bridge needs paho-mqtt (pip install paho-mqtt)')
+        self.runtime = runtime
+        self.host = host
+        self.port = port
+        self.prefix = prefix.rstrip('/')
+        self.publish_interval = publish_interval
+
+        self.loop = None
+        self._dirty = None
+        self.connected = False
+
+        # Metrics
+        self.published = 0
+        self.coalesced = 0
+        self.commands = 0
+        self.rejected = 0
+        self._latencies_us = collections.deque(maxlen=LATENCY_SAMPLES)
+
+        self.client = new_client()
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.will_set(self.topic('availability'), 'offline', qos=1, retain=True)
+        self.client.reconnect_delay_set(RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+
+    def topic(self, name):
+        return f'{self.prefix}/{name}'
+
+    # --- paho network thread ---------------------------------------------
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            return
+        self.connected = True
+        client.subscribe(self.topic('+/set'), qos=1)
+        client.publish(self.topic('availability'), 'online', qos=1, retain=True)
+        # Retained state may be stale after an outage
+        self.loop.call_soon_threadsafe(self.notify)
+
+    def _on_disconnect(self, client, userdata, *args):
+        self.connected = False
+
+    def _on_message(self, client, userdata, msg):
+        received_ns = time.perf_counter_ns()
+        name = msg.topic[len(self.prefix) + 1:].split('/')[0]
+        payload = msg.payload.decode(errors='replace').strip()
+
+        if name == 'light':
+            message = {'cmd': 'set', 'level': 100} if payload.upper() == 'ON' else {'cmd': 'off'}
+        elif name == 'brightness':
+            try:
+                level = float(payload)
+            except ValueError:
+                return
+            # nan and inf parse but are no brightness
+            if not math.isfinite(level):
+                return
+            message = {'cmd': 'set', 'level': level}
+        elif name == 'sunrise':
+            message = {'cmd': 'on'}
+        else:
+            return
+        # All controller state belongs to the event loop
+        self.loop.call_soon_threadsafe(self._dispatch, message, received_ns)
+
+    # --- event loop ------------------------------------------------------
+
+    def _dispatch(self, message, received_ns):
+        if self.runtime.token:
+            message['token'] = self.runtime.token
+        response = self.runtime.handle_command(message)
+        if not response.get('ok'):
+            self.rejected += 1
+            print(f"MQTT command {message['cmd']} rejected: {response.get('error', 'not applied')}")
+        # The gate loop picks the new level up on its next half-cycle
+        self._latencies_us.append((time.perf_counter_ns() - received_ns) // 1000)
+        self.commands += 1
+
+    def notify(self):
+        """Mark the state as changed; cheap enough to call on every level change"""
+        if self._dirty is None:
+            return
+        if self._dirty.is_set():
+            self.coalesced += 1
+        self._dirty.set()
+
+    def _publish_state(self):
+        status = self.runtime.status()
+        state = {key: status[key] for key in ('brightness', 'dim_level', 'alarm_active', 'next_alarm')}
+        state['brightness'] = round(state['brightness'], 1)
+        self.client.publish(self.topic('state'), json.dumps(state, separators=(',', ':')),
+                            qos=0, retain=True)
+        self.published += 1
+
+    async def publish_loop(self):
+        """Publish the state whenever it changed, at most once per interval"""
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            if self.connected:
+                self._publish_state()
+            await asyncio.sleep(self.publish_interval)
+
+    def start(self, loop):
+        self.loop = loop
+        self._dirty = asyncio.Event()
+        self._dirty.set()
+        # Non-blocking: the first connection and every reconnect happen on paho's thread
+        self.client.connect_async(self.host, self.port, keepalive=30)
+        self.client.loop_start()
+
+    def stop(self):
+        if self.connected:
+            self.client.publish(self.topic('availability'), 'offline', qos=1, retain=True)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def metrics(self):
+        latencies = sorted(self._latencies_us)
+        return {
+            'connected': self.connected,
+            'published': self.published,
+            'coalesced': self.coalesced,
+            'commands': self.commands,
+            'rejected': self.rejected,
+            'command_latency_us_p50': latencies[len(latencies) // 2] if latencies else None,
+            'command_latency_us_p99': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+                                      if latencies else None,
+        }
+
+# --- benchmark -----------------------------------------------------------
+
+def bench(broker, url, api_token, samples=20, port=MQTT_PORT, prefix=DEFAULT_PREFIX):
+    """
+    Time brightness commands end to end over both paths, alternating.
+
+    MQTT: publish <prefix>/brightness/set until the state message showing
+    the new brightness arrives. HTTP: POST /api/control set_brightness until
+    the response, which the app sends once the controller has applied it.
+    Samples are spaced by more than PUBLISH_INTERVAL, so coalescing never
+    holds a state message back, and slow enough for /api/control's rate limit.
+    """
+    if mqtt is None:
+        raise RuntimeError('The benchmark needs paho-mqtt (pip install paho-mqtt)')
+    prefix = prefix.rstrip('/')
+    states = queue.Queue()
+
+    def on_message(client, userdata, msg):
+        try:
+            states.put((json.loads(msg.payload)['brightness'], time.perf_counter()))
+        except (ValueError, KeyError):
+            pass
+
+    client = new_client()
+    client.on_message = on_message
+    client.connect(broker, port, keepalive=30)
+    client.subscribe(f'{prefix}/state', qos=0)
+    client.loop_start()
+
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=BENCH_TIMEOUT)
+    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {api_token}'}
+
+    latencies = {'mqtt': [], 'http': []}
+    failures = {'mqtt': 0, 'http': 0}
+    try:
+        for sample in range(samples * 2):
+            level = 20 + (sample % 7) * 10  # Always a change from the previous sample
+            path = 'mqtt' if sample % 2 == 0 else 'http'
+            # Drop the retained state and anything from earlier samples
+            while not states.empty():
+                states.get_nowait()
+
+            start = time.perf_counter()
+            if path == 'mqtt':
+                client.publish(f'{prefix}/brightness/set', str(level), qos=1)
+                deadline = start + BENCH_TIMEOUT
+                while True:
+                    try:
+                        brightness, received = states.get(timeout=max(0.0, deadline - time.perf_counter()))
+                    except queue.Empty:
+                        failures[path] += 1
+                        break
+                    if abs(brightness - level) < 1:
+                        latencies[path].append(received - start)
+                        break
+            else:
+                try:
+                    conn.request('POST', '/api/control', headers=headers,
+                                 body=json.dumps({'action': 'set_brightness', 'level': level}))
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status == 200:
+                        latencies[path].append(time.perf_counter() - start)
+                    else:
+                        failures[path] += 1
+                except (OSError, http.client.HTTPException):
+                    failures[path] += 1
+                    conn.close()
+            time.sleep(PUBLISH_INTERVAL * 1.5)
+    finally:
+        conn.close()
+        client.loop_stop()
+        client.disconnect()
+
+    for path, label in (('mqtt', 'MQTT brightness/set -> state'), ('http', 'POST /api/control')):
+        values = sorted(latencies[path])
+        if not values:
+            print(f"{label:<30} no successful samples, {failures[path]} failed")
+            continue
+        p50 = values[len(values) // 2]
+        p99 = values[min(len(values) - 1, len(values) * 99 // 100)]
+        print(f"{label:<30} {len(values)} samples, {failures[path]} failed, "
+              f"p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='MQTT bridge tools')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--broker', default=os.getenv('LUMENATOR_MQTT_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('LUMENATOR_MQTT_PORT', MQTT_PORT)))
+    parser.add_argument('--prefix', default=os.getenv('LUMENATOR_MQTT_PREFIX', DEFAULT_PREFIX))
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Web app base URL')
+    parser.add_argument('--api-token', default=os.getenv('LUMENATOR_API_TOKEN'),
+                        help='One of the app\'s API_TOKENS')
+    parser.add_argument('--samples', type=int, default=20, help='Samples per path')
+
+    args = parser.parse_args()
+    if not args.api_token:
+        parser.error('--api-token (or LUMENATOR_API_TOKEN) is required for /api/control')
+    bench(args.broker, args.url, args.api_token, args.samples, args.port, args.prefix)
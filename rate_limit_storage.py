@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+
+"""
+SQLite storage backend for flask_limiter.
+
+Counters live in a local SQLite database, so limits survive restarts and
+are shared by every worker process on the Pi. Importing this module
+registers the 'sqlite' scheme with the limits library:
+
+    Limiter(..., storage_uri='sqlite:///ratelimit.db')
+
+Each hit is a single UPSERT plus a SELECT in one transaction on a
+per-thread connection in WAL mode, so the per-request cost stays small.
+"""
+
+# Expired rows are purged after this many increments on a connection
+PURGE_EVERY = 1000
+
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # sqlite:///relative/path.db or sqlite:////absolute/path.db
+        self.path = uri[len('sqlite:///'):] or 'ratelimit.db'
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS counters ('
+                         'key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL)')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.increments = 0
+        return conn
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            # Start a fresh window if the old one has expired
+            conn.execute(
+                'INSERT INTO counters (key, value, expiry) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'value = CASE WHEN expiry <= ? THEN excluded.value ELSE value + excluded.value END, '
+                'expiry = CASE WHEN expiry <= ? OR ? THEN excluded.expiry ELSE expiry END',
+                (key, amount, now + expiry, now, now, bool(elastic_expiry)))
+            value = conn.execute('SELECT value FROM counters WHERE key = ?', (key,)).fetchone()[0]
+
+        self._local.increments += 1
+        if self._local.increments % PURGE_EVERY == 0:
+            with conn:
+                conn.execute('DELETE FROM counters WHERE expiry <= ?', (now,))
+        return value
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND expiry > ?', (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute(
+            'SELECT expiry FROM counters WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        conn = self._connection()
+        with conn:
+            return conn.execute('DELETE FROM counters').rowcount
+
+    def clear(self, key):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM counters WHERE key = ?', (key,))
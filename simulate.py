@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import tempfile
+import types
+from datetime import datetime, timedelta
+
+from clock import VirtualClock
+
+"""
+Time-compressed simulation of the alarm controller.
+
+Runs the asyncio runtime (alarm_runtime.ControllerRuntime) on a
+VirtualClock, so a week of planned sunrises (fade plus 30-minute hold
+each day) runs in well under a second, with DST transitions handled as on
+the device. Records the exact brightness trajectory and how late each
+sunrise started against its plan, and exits non-zero when a start misses
+the bound:
+
+    python simulate.py --start 2026-03-05 --days 7 --tz America/New_York --alarm 06:30
+"""
+
+def _simulated_gpio():
+    """
+    Minimal stand-in for RPi.GPIO so the controller imports off the Pi.
+    The simulation never runs the gate loop, so nothing here does anything.
+    """
+    gpio = types.ModuleType('RPi.GPIO')
+    gpio.BCM, gpio.IN, gpio.OUT, gpio.LOW, gpio.HIGH = 11, 1, 0, 0, 1
+    for name in ('setwarnings', 'setmode', 'setup', 'output', 'cleanup'):
+        setattr(gpio, name, lambda *args, **kwargs: None)
+    gpio.input = lambda pin: 0
+    package = types.ModuleType('RPi')
+    package.GPIO = gpio
+    sys.modules['RPi'] = package
+    sys.modules['RPi.GPIO'] = gpio
+
+try:
+    import RPi.GPIO  # noqa: F401
+except (ImportError, RuntimeError):
+    _simulated_gpio()
+
+import alarm_controller as controller
+import alarm_runtime
+
+# Worst start error the CLI accepts; the runtime sleeps until the planned
+# start, so anything beyond timer rounding is a scheduling bug
+MAX_START_ERROR = 1.0
+
+def local_time(clock, epoch):
+    """Naive local datetime of an epoch in the clock's time zone"""
+    if clock.tz is None:
+        return datetime.fromtimestamp(epoch)
+    return datetime.fromtimestamp(epoch, clock.tz).replace(tzinfo=None)
+
+class SimulatedRuntime(alarm_runtime.ControllerRuntime):
+    """
+    The runtime without the gate loop, recording when each planned sunrise
+    starts and stopping itself after the simulated days
+    """
+    def __init__(self, clock, days):
+        super().__init__(port=0, gate=False, clock=clock)
+        self.end = clock.time() + days * 86400
+        self.runs = []
+
+    async def run(self):
+        asyncio.get_running_loop().call_later(self.end - self.clock.time(), lambda: self.stop_event.set())
+        await super().run()
+
+    async def run_plan(self):
+        now = self.clock.time()
+        planned, fade_seconds = self.plan.segment(self.plan.find(now))[:2]
+        self.runs.append({
+            'alarm_time': local_time(self.clock, planned + fade_seconds).isoformat(),
+            'planned_start': planned,
+            'actual_start': now,
+            'start_error_s': now - planned,
+        })
+        await super().run_plan()
+
+    async def flush_loop(self):
+        """Events stay in memory until the final flush; a flush thread would race virtual time"""
+
+def simulate(config, start, days, tz=None):
+    """
+    Run the controller for days of virtual time from start.
+
+    Returns (trajectory, runs): trajectory is a list of (epoch, dim level)
+    at every level change, runs has the planned and actual start of each sunrise.
+    """
+    trajectory = []
+
+    def record(clock):
+        if not trajectory or trajectory[-1][1] != controller.current_dim_level:
+            trajectory.append((clock.time(), controller.current_dim_level))
+
+    clock = VirtualClock(start, tz, on_advance=record)
+    controller.set_dim_level(0)
+
+    # Config, plan and event log files live in a scratch directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            with open('alarm_config.json', 'w') as f:
+                json.dump(config, f)
+            runtime = SimulatedRuntime(clock, days)
+            alarm_runtime.run(runtime)
+            record(clock)
+        finally:
+            os.chdir(cwd)
+    return trajectory, runtime.runs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulate the alarm controller on a virtual clock')
+    parser.add_argument('--start', default=datetime.now().strftime('%Y-%m-%d'), help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--tz', help='IANA time zone, e.g. Europe/London (default: system local time)')
+    parser.add_argument('--alarm', default='07:00', help='Alarm time HH:MM')
+    parser.add_argument('--fade', type=int, default=30, help='Fade duration in minutes')
+    parser.add_argument('--max-brightness', type=int, default=100)
+    parser.add_argument('--max-start-error', type=float, default=MAX_START_ERROR,
+                        help='Fail if a sunrise starts more than this many seconds off plan')
+    parser.add_argument('--csv', help='Write the brightness trajectory to this file')
+
+    args = parser.parse_args()
+    config = {'alarm_time': args.alarm, 'fade_duration': args.fade,
+              'enabled': True, 'max_brightness': args.max_brightness}
+
+    trajectory, runs = simulate(config, datetime.strptime(args.start, '%Y-%m-%d'), args.days, args.tz)
+
+    for run in runs:
+        print(f"Alarm {run['alarm_time']}: sunrise started {run['start_error_s']:+.3f} s from plan")
+    print(f"{len(runs)} sunrises, {len(trajectory)} brightness changes")
+
+    # A day without a run means the plan had no sunrise for it, e.g. an
+    # alarm time lost to a spring-forward transition
+    start_date = datetime.strptime(args.start, '%Y-%m-%d').date()
+    ran = {run['alarm_time'][:10] for run in runs}
+    missed = [day for day in (start_date + timedelta(days=n) for n in range(args.days))
+              if day.isoformat() not in ran]
+    for day in missed:
+        print(f"MISSED: no sunrise for the {args.alarm} alarm on {day}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['epoch', 'dim_level'])
+            writer.writerows(trajectory)
+
+    worst = max((abs(run['start_error_s']) for run in runs), default=0.0)
+    if worst > args.max_start_error:
+        print(f"FAIL: worst start error {worst:.3f} s exceeds {args.max_start_error:.3f} s")
+    if missed or worst > args.max_start_error:
+        sys.exit(1)
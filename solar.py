@@ -0,0 +1,74 @@
+import math
+from datetime import date as ddate, datetime, timedelta
+
+import numpy as np
+
+"""
+Natural sunrise and civil dawn times for solar-time alarms.
+
+A whole year of times for one location is computed in a single
+vectorized pass (NOAA's fractional-year approximation, accurate to about
+a minute) and stored as a compact int16 array of minutes after local
+midnight. A lookup for any day is then one array index.
+"""
+
+SUNRISE = 0
+CIVIL_DAWN = 1
+EVENTS = {'sunrise': SUNRISE, 'dawn': CIVIL_DAWN}
+
+# Solar zenith angles: sunrise includes refraction and the solar disc,
+# civil dawn is the sun 6 degrees below the horizon
+ZENITH_DEGREES = np.array([90.833, 96.0])
+
+NO_EVENT = -1  # Polar day or night: the sun never crosses that angle
+
+_tables = {}
+
+def solar_table(year, latitude, longitude):
+    """
+    int16 array of shape (days in year, 2): minutes after local midnight
+    of sunrise and civil dawn for each day, NO_EVENT where there is none
+    """
+    first = ddate(year, 1, 1)
+    days = (ddate(year + 1, 1, 1) - first).days
+    doy = np.arange(1, days + 1)
+
+    gamma = 2 * math.pi / days * (doy - 1)
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+            - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+            - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    lat = math.radians(latitude)
+    zenith = np.radians(ZENITH_DEGREES)[np.newaxis, :]
+    cos_ha = (np.cos(zenith) / (math.cos(lat) * np.cos(decl)[:, np.newaxis])
+              - math.tan(lat) * np.tan(decl)[:, np.newaxis])
+    with np.errstate(invalid='ignore'):
+        hour_angle = np.degrees(np.arccos(cos_ha))
+    utc_minutes = 720 - 4 * (longitude + hour_angle) - eqtime[:, np.newaxis]
+
+    # Local offset (DST aware) at noon of each day
+    noon = datetime(year, 1, 1, 12)
+    offsets = np.array([(noon + timedelta(days=day)).astimezone().utcoffset().total_seconds() / 60
+                        for day in range(days)])
+    local = np.rint(utc_minutes + offsets[:, np.newaxis])
+
+    table = np.full(local.shape, NO_EVENT, dtype=np.int16)
+    valid = ~np.isnan(local) & (local >= 0) & (local < 24 * 60)
+    table[valid] = local[valid]
+    return table
+
+def solar_time(date, latitude, longitude, event='sunrise'):
+    """
+    Naive local datetime of the event on date, or None if it does not happen
+    """
+    key = (date.year, round(latitude, 4), round(longitude, 4))
+    table = _tables.get(key)
+    if table is None:
+        table = _tables[key] = solar_table(date.year, latitude, longitude)
+
+    minutes = int(table[date.timetuple().tm_yday - 1, EVENTS[event]])
+    if minutes == NO_EVENT:
+        return None
+    return datetime.combine(date, datetime.min.time()) + timedelta(minutes=minutes)
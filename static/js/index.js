@@ -0,0 +1,91 @@
+// JavaScript for dynamic controls
+document.addEventListener('DOMContentLoaded', function() {
+    // Manual control buttons
+    const btnOn = document.getElementById('btn-on');
+    const btnOff = document.getElementById('btn-off');
+    const brightnessSlider = document.getElementById('brightness');
+    const brightnessValue = document.getElementById('brightness-value');
+    const refreshStatus = document.getElementById('refresh-status');
+    
+    // CSRF token from the form
+    const csrfToken = document.querySelector('input[name="csrf_token"]').value;
+    
+    // Function to send control commands
+    async function sendControl(action, data = {}) {
+        try {
+            const response = await fetch('/api/control', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrfToken
+                },
+                body: JSON.stringify({ action, ...data })
+            });
+            
+            if (!response.ok) {
+                throw new Error('Failed to send command');
+            }
+            
+            const result = await response.json();
+            alert(result.message);
+            
+            // Refresh status after action
+            fetchStatus();
+        } catch (error) {
+            alert('Error: ' + error.message);
+        }
+    }
+    
+    // Function to fetch status
+    async function fetchStatus() {
+        try {
+            const response = await fetch('/api/status');
+            if (!response.ok) {
+                throw new Error('Failed to fetch status');
+            }
+            
+            const status = await response.json();
+            displayStatus(status);
+            
+            // Update brightness slider
+            if (status['Current brightness']) {
+                const brightness = parseFloat(status['Current brightness']);
+                brightnessSlider.value = brightness;
+                brightnessValue.textContent = brightness.toFixed(1) + '%';
+            }
+        } catch (error) {
+            document.getElementById('status-container').innerHTML = 
+                '<p class="error">Error fetching status: ' + error.message + '</p>';
+        }
+    }
+    
+    // Function to display status information
+    function displayStatus(status) {
+        let html = '<ul>';
+        
+        for (const [key, value] of Object.entries(status)) {
+            html += `<li><strong>${key}:</strong> ${value}</li>`;
+        }
+        
+        html += '</ul>';
+        document.getElementById('status-container').innerHTML = html;
+    }
+    
+    // Event listeners
+    btnOn.addEventListener('click', () => sendControl('on'));
+    btnOff.addEventListener('click', () => sendControl('off'));
+    
+    brightnessSlider.addEventListener('input', function() {
+        const value = this.value;
+        brightnessValue.textContent = value + '%';
+    });
+    
+    brightnessSlider.addEventListener('change', function() {
+        sendControl('set_brightness', { level: parseInt(this.value) });
+    });
+    
+    refreshStatus.addEventListener('click', fetchStatus);
+    
+    // Initial status fetch
+    fetchStatus();
+});
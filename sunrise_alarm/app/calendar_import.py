@@ -0,0 +1,235 @@
+"""
+Alarms derived from local ICS calendar files.
+
+Each day's alarm is CALENDAR_WAKE_LEAD_MINUTES before the first timed
+event of that day. Files are streamed line by line, and a file whose
+content hash has not changed is not parsed again. Recurring events are
+expanded only inside a rolling window of CALENDAR_WINDOW_DAYS, and a
+RECURRENCE-ID override (same UID) replaces its single occurrence: the
+original time is dropped and the moved one used unless it is CANCELLED. The
+resulting alarms are kept as one sorted list with a cursor, so
+next_alarm() is constant time however large the calendars are.
+"""
+import bisect
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from config import Config
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+from dateutil.rrule import rrulestr
+
+# Stands in for an AlarmSchedule row in the scheduler
+CalendarAlarm = namedtuple('CalendarAlarm', ['fade_duration', 'summary'])
+
+# Properties the importer needs; everything else is skipped while parsing
+EVENT_PROPERTIES = {'UID', 'DTSTART', 'RRULE', 'EXDATE', 'SUMMARY', 'STATUS', 'RECURRENCE-ID'}
+
+HASH_CHUNK = 64 * 1024
+
+
+def unfolded_lines(f):
+    """Yield logical lines of an ICS file, joining folded continuation lines"""
+    current = None
+    for raw in f:
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def parse_property(line):
+    """'DTSTART;TZID=Europe/London:20261020T090000' -> ('DTSTART', {'TZID': ...}, value)"""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(param.partition('=')[::2] for param in params), value
+
+
+def parse_datetime(value, params):
+    """
+    ICS date-time as a naive local datetime, or None for all-day dates
+    """
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return None
+    if value.endswith('Z'):
+        moment = datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+    else:
+        moment = datetime.strptime(value, '%Y%m%dT%H%M%S')
+        tzid = params.get('TZID')
+        if tzid and ZoneInfo is not None:
+            try:
+                moment = moment.replace(tzinfo=ZoneInfo(tzid))
+            except (KeyError, ValueError):
+                pass  # Unknown zone: treat as floating local time
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def parse_events(path):
+    """
+    Stream the timed VEVENTs of an ICS file as dicts.
+
+    Only the properties the importer uses are kept, so memory grows with
+    the number of events rather than with the size of the file. Cancelled
+    events are dropped, except RECURRENCE-ID overrides: a cancelled override
+    still removes its occurrence from the recurring event. Events with a
+    date-time that does not parse are dropped as well.
+    """
+    event = None
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in unfolded_lines(f):
+            if line == 'BEGIN:VEVENT':
+                event = {'exdates': []}
+            elif line == 'END:VEVENT':
+                if event is not None and (event.get('recurrence_id') is not None or (
+                        event.get('start') is not None and event.get('status') != 'CANCELLED')):
+                    yield event
+                event = None
+            elif event is not None:
+                name, params, value = parse_property(line)
+                if name not in EVENT_PROPERTIES:
+                    continue
+                try:
+                    if name == 'DTSTART':
+                        event['start'] = parse_datetime(value, params)
+                    elif name == 'RRULE':
+                        event['rrule'] = value
+                    elif name == 'EXDATE':
+                        event['exdates'].extend(parse_datetime(part, params) for part in value.split(','))
+                    elif name == 'SUMMARY':
+                        event['summary'] = value
+                    elif name == 'STATUS':
+                        event['status'] = value.upper()
+                    elif name == 'UID':
+                        event['uid'] = value
+                    else:
+                        event['recurrence_id'] = parse_datetime(value, params)
+                except ValueError:
+                    # An unreadable date: skip this event, not the whole file
+                    event = None
+
+
+def occurrences(event, window_start, window_end, overridden=()):
+    """
+    Start times of an event inside [window_start, window_end), leaving out
+    the recurrences in overridden (their RECURRENCE-ID overrides stand in)
+    """
+    start = event['start']
+    if 'rrule' not in event:
+        return [start] if window_start <= start < window_end else []
+    try:
+        rule = rrulestr(event['rrule'], dtstart=start, ignoretz=True)
+    except (ValueError, TypeError):
+        return [start] if window_start <= start < window_end else []
+    exdates = set(event['exdates']).union(overridden)
+    return [moment for moment in rule.between(window_start, window_end, inc=True)
+            if moment not in exdates and moment < window_end]
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CalendarAlarms:
+    def __init__(self, paths=None, window_days=None, lead_minutes=None, fade_minutes=None):
+        self.paths = paths if paths is not None else Config.CALENDAR_FILES
+        self.window_days = window_days if window_days is not None else Config.CALENDAR_WINDOW_DAYS
+        self.lead = timedelta(minutes=lead_minutes if lead_minutes is not None
+                              else Config.CALENDAR_WAKE_LEAD_MINUTES)
+        self.fade_minutes = fade_minutes if fade_minutes is not None else Config.CALENDAR_FADE_MINUTES
+
+        # path -> (digest, parsed events); reused while the file is unchanged
+        self._files = {}
+        self._window_start = None
+        # Sorted (alarm time, summary) pairs and the index of the next one
+        self._alarms = []
+        self._times = []
+        self._cursor = 0
+
+    def refresh(self, now=None):
+        """
+        Re-read changed files and re-expand when needed; returns True if the alarms changed
+        """
+        now = now or datetime.now()
+        changed = False
+        for path in self.paths:
+            try:
+                digest = file_digest(path)
+            except OSError:
+                changed |= self._files.pop(path, None) is not None
+                continue
+            cached = self._files.get(path)
+            if cached is None or cached[0] != digest:
+                self._files[path] = (digest, list(parse_events(path)))
+                changed = True
+
+        # Roll the window forward once a day even if no file changed
+        window_start = datetime.combine(now.date(), datetime.min.time())
+        if changed or window_start != self._window_start:
+            alarms = self._alarms
+            self._expand(window_start)
+            return self._alarms != alarms
+        return False
+
+    def _expand(self, window_start):
+        window_end = window_start + timedelta(days=self.window_days)
+        events = [event for _, file_events in self._files.values() for event in file_events]
+
+        # Recurrences replaced (moved or cancelled) by an override, per UID
+        overridden = {}
+        for event in events:
+            if event.get('recurrence_id') is not None and event.get('uid') is not None:
+                overridden.setdefault(event.get('uid'), set()).add(event['recurrence_id'])
+
+        first_per_day = {}
+        for event in events:
+            if event.get('recurrence_id') is not None:
+                # One moved occurrence; a cancelled one only removes the original
+                if event.get('status') == 'CANCELLED' or event.get('start') is None:
+                    continue
+                starts = [event['start']] if window_start <= event['start'] < window_end else []
+            else:
+                starts = occurrences(event, window_start, window_end,
+                                     overridden.get(event.get('uid'), ()))
+            for start in starts:
+                day = start.date()
+                if day not in first_per_day or start < first_per_day[day][0]:
+                    first_per_day[day] = (start, event.get('summary', ''))
+
+        self._alarms = sorted((start - self.lead, summary) for start, summary in first_per_day.values())
+        self._times = [alarm for alarm, _ in self._alarms]
+        self._window_start = window_start
+        self._cursor = 0
+
+    def next_alarm(self, now=None):
+        """
+        (CalendarAlarm, alarm datetime) for the first alarm after now, or (None, None)
+        """
+        now = now or datetime.now()
+        # The cursor only moves forward as time does; bisect if now went back
+        if self._cursor and self._times[self._cursor - 1] > now:
+            self._cursor = bisect.bisect_right(self._times, now)
+        while self._cursor < len(self._times) and self._times[self._cursor] <= now:
+            self._cursor += 1
+        if self._cursor >= len(self._alarms):
+            return None, None
+        alarm_time, summary = self._alarms[self._cursor]
+        return CalendarAlarm(self.fade_minutes, summary), alarm_time
+
+    def __len__(self):
+        return len(self._alarms)
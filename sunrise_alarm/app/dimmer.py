@@ -3,11 +3,39 @@ Trailing edge dimmer implementation for LED lighting.
 Adapted from the provided code to work as a module within the Flask application.
 """
 import RPi.GPIO as GPIO
+import itertools
 import time
 import threading
 import signal
 import sys
 from config import Config
+from app.zero_cross import ZeroCrossTracker, EdgeFilter
+from app.effects import REPLACE, ADD
+
+def cycle_skip(fine_level, accumulator, burst_level):
+    """
+    One whole mains cycle of cycle-skip dimming: fine_level accumulates
+    every cycle and the cycle fires (both half-cycles at burst_level) each
+    time the sum reaches burst_level, so fired cycles are spread as evenly
+    as possible and average out to the fine setpoint. Returns (fire, accumulator)
+    """
+    accumulator += fine_level
+    if accumulator >= burst_level:
+        return True, accumulator - burst_level
+    return False, accumulator
+
+def sigma_delta(fine_level, dither, fraction_bits):
+    """
+    One half-cycle of first-order sigma-delta dithering: the part of
+    fine_level below one level accumulates in dither and adds one level
+    when it overflows, so the pulse width alternates between adjacent
+    levels and averages out to the fine setpoint. Returns (dim level, dither)
+    """
+    fraction_one = 1 << fraction_bits
+    dither += fine_level & (fraction_one - 1)
+    if dither >= fraction_one:
+        return (fine_level >> fraction_bits) + 1, dither - fraction_one
+    return fine_level >> fraction_bits, dither
 
 class DimmerController:
     def __init__(self, zero_cross_pin=None, gate_pin=None):
@@ -16,13 +44,43 @@ class DimmerController:
         self.GATE_PIN = gate_pin or Config.GATE_PIN
         
         # Constants
-        self.AC_HALF_CYCLE_US = Config.AC_HALF_CYCLE_US
         self.MAX_DIM_LEVEL = Config.MAX_DIM_LEVEL
+        # Sub-level resolution: the setpoint is kept in 1/2**FRACTION_BITS
+        # steps of a dim level and dithered across half-cycles
+        self.FRACTION_BITS = Config.DITHER_BITS if Config.DITHER_ENABLED else 0
+        # Levels below this fire or skip whole mains cycles at this level
+        # instead of cutting the phase ever narrower, which tiny conduction
+        # angles make LED drivers flicker at
+        self.CYCLE_SKIP_BELOW = Config.CYCLE_SKIP_BELOW if Config.CYCLE_SKIP_ENABLED else 0
+        
+        # Measured mains period and predicted crossings
+        self.tracker = ZeroCrossTracker(Config.AC_HALF_CYCLE_US, Config.ZC_PHASE_SHIFT, Config.ZC_PERIOD_SHIFT)
+        self.edge_filter = EdgeFilter(
+            self.tracker, Config.ZC_MIN_INTERVAL_US, Config.ZC_MAJORITY_SAMPLES,
+            Config.ZC_OUTLIER_TOLERANCE_US, Config.ZC_MAX_OUTLIER_RUN, Config.ZC_OUTLIER_ARM_EDGES,
+        ) if Config.ZC_FILTER_ENABLED else None
         
         # State variables
-        self.dim_level = 0
-        self.running = False
+        # The setpoint is published as a single (version, fine_level) tuple,
+        # fine_level being the dim level shifted left by FRACTION_BITS.
+        # Rebinding an attribute is atomic, so the dimmer thread always sees
+        # a complete, already clamped value and never a half-written one.
+        self._versions = itertools.count(1)
+        self._setpoint = (0, 0)
+        self._state_lock = threading.Lock()  # Serialises start/stop
+        # Active app.ramp.Ramp, evaluated by the dimmer thread each half-cycle
+        self._ramp = None
+        self._ramp_lock = threading.Lock()  # Serialises ramp hand-offs with set_brightness
+        # Active app.effects.Effect layers, highest priority first; the
+        # tuple is replaced, never mutated, so the dimmer thread can read it
+        self._effects = ()
+        self._stop_event = None
+        # Set whenever the setpoint changes, to wake a thread idling at 0 or 100%
+        self._changed = threading.Event()
+        self.idle = False
         self.thread = None
+        # Called once, from the dimmer thread, after the next non-zero pulse
+        self.on_first_pulse = None
         
         # Initialize GPIO
         GPIO.setwarnings(False)  # Disable GPIO warnings
@@ -40,38 +98,103 @@ class DimmerController:
         GPIO.setup(self.GATE_PIN, GPIO.OUT)
         GPIO.output(self.GATE_PIN, GPIO.LOW)
     
-    def precise_delay(self, delay_us):
-        """More precise delay function for microsecond timing"""
-        start_time = time.time()
-        while (time.time() - start_time) < (delay_us / 1000000.0):
+    def wait_until_us(self, deadline_us):
+        """Busy-wait until the perf counter reaches deadline_us"""
+        while time.perf_counter_ns() // 1000 < deadline_us:
             pass
     
-    def dimmer_thread_function(self):
+    def dimmer_thread_function(self, stop_event):
         """Main dimmer control thread that handles the trailing edge dimming"""
         last_pin_state = GPIO.LOW
+        tracker = self.tracker
+        tracker.reset()
+        edge_filter = self.edge_filter
+        if edge_filter:
+            edge_filter.reset()
+        read_pin = lambda: GPIO.input(self.ZERO_CROSS_PIN)
+        
+        # Sigma-delta accumulator for the setpoint's fraction (see sigma_delta)
+        fraction_bits = self.FRACTION_BITS
+        dither = 0
+        full_scale = self.MAX_DIM_LEVEL << fraction_bits
         
-        while self.running:
+        # Cycle-skip accumulator (see cycle_skip); a decision covers a whole
+        # cycle, so both polarities always conduct alike and the load sees no DC
+        cycle_skip_below = self.CYCLE_SKIP_BELOW
+        burst_level = cycle_skip_below << fraction_bits
+        burst = 0
+        fire = False
+        
+        while not stop_event.is_set():
+            # Fully off or fully on needs no phase cutting: hold the gate
+            # and sleep until the setpoint changes instead of polling
+            version, fine_level = self._setpoint
+            if (fine_level == 0 or fine_level == full_scale) and self._ramp is None and not self._effects:
+                self._changed.clear()
+                # Re-check after clearing so a change made in between still wakes us
+                if (self._setpoint[0] == version and self._ramp is None and not self._effects
+                        and not stop_event.is_set()):
+                    self._idle_until_changed(fine_level == full_scale)
+                    last_pin_state = GPIO.input(self.ZERO_CROSS_PIN)
+                    continue
+            
             # Poll for zero crossing (rising edge)
             current_pin_state = GPIO.input(self.ZERO_CROSS_PIN)
             
-            # Detect rising edge (transition from LOW to HIGH)
-            if current_pin_state == GPIO.HIGH and last_pin_state == GPIO.LOW:
+            # Detect rising edge (transition from LOW to HIGH) and drop glitches
+            if (current_pin_state == GPIO.HIGH and last_pin_state == GPIO.LOW and
+                    (edge_filter is None or edge_filter.accept(time.perf_counter_ns() // 1000, read_pin))):
                 # Zero-crossing detected
+                # Take exactly one snapshot of the setpoint for this half-cycle
+                version, fine_level = self._setpoint
+                ramp = self._ramp
+                if ramp is not None and ramp.version == version:
+                    fine_level = ramp.level_at(ramp.now_ns(), fraction_bits)
+                    if ramp.done:
+                        self._finish_ramp(ramp)
+                effects = self._effects
+                if effects:
+                    fine_level = self._layer_effects(effects, fine_level, full_scale)
                 
-                # For trailing edge dimming:
-                # 1. Turn ON at zero crossing
-                GPIO.output(self.GATE_PIN, GPIO.HIGH)
-                
-                # 2. Calculate delay before turning OFF
-                # The delay is proportional to the dim level
-                # Higher dim_level = longer delay = brighter light
-                delay_time = int((self.AC_HALF_CYCLE_US * self.dim_level) / self.MAX_DIM_LEVEL)
-                
-                # 3. Wait for the calculated time
-                self.precise_delay(delay_time)
+                if fine_level >> fraction_bits < cycle_skip_below:
+                    # Cycle skipping: the first half of each cycle decides
+                    # whether the whole cycle fires at the band's top level.
+                    # Crossings the tracker knows were missed still count, so
+                    # a lost edge does not swap the halves of later cycles
+                    crossing_us = tracker.update(time.perf_counter_ns() // 1000)
+                    if (tracker.edges + tracker.missed) & 1:
+                        fire, burst = cycle_skip(fine_level, burst, burst_level)
+                    dim_level = cycle_skip_below if fire else 0
+                    if fire:
+                        GPIO.output(self.GATE_PIN, GPIO.HIGH)
+                        self.wait_until_us(crossing_us + (tracker.period_us * dim_level) // self.MAX_DIM_LEVEL)
+                        GPIO.output(self.GATE_PIN, GPIO.LOW)
+                else:
+                    fire = False
+                    dim_level, dither = sigma_delta(fine_level, dither, fraction_bits)
+                    
+                    # For trailing edge dimming:
+                    # 1. Turn ON at zero crossing
+                    GPIO.output(self.GATE_PIN, GPIO.HIGH)
+                    
+                    # 2. Calculate when to turn OFF
+                    # The delay is proportional to the dim level and the measured
+                    # half-cycle, and counts from the tracker's estimate of the true
+                    # crossing, so a late detection does not lengthen the pulse
+                    crossing_us = tracker.update(time.perf_counter_ns() // 1000)
+                    delay_time = (tracker.period_us * dim_level) // self.MAX_DIM_LEVEL
+                    
+                    # 3. Wait for the calculated time
+                    self.wait_until_us(crossing_us + delay_time)
+                    
+                    # 4. Turn OFF after delay (trailing edge)
+                    GPIO.output(self.GATE_PIN, GPIO.LOW)
                 
-                # 4. Turn OFF after delay (trailing edge)
-                GPIO.output(self.GATE_PIN, GPIO.LOW)
+                # Report the first pulse only after the gate is low again
+                on_first_pulse = self.on_first_pulse
+                if on_first_pulse is not None and dim_level > 0:
+                    self.on_first_pulse = None
+                    on_first_pulse()
             
             # Update last pin state
             last_pin_state = current_pin_state
@@ -79,34 +202,200 @@ class DimmerController:
             # Small delay to prevent CPU hogging
             time.sleep(0.00005)  # 50 microseconds
     
+    def _idle_until_changed(self, full_on):
+        """Hold the gate static LOW (off) or HIGH (full on) until woken"""
+        GPIO.output(self.GATE_PIN, GPIO.HIGH if full_on else GPIO.LOW)
+        on_first_pulse = self.on_first_pulse
+        if on_first_pulse is not None and full_on:
+            self.on_first_pulse = None
+            on_first_pulse()
+        self.idle = True
+        self._changed.wait()
+        self.idle = False
+        GPIO.output(self.GATE_PIN, GPIO.LOW)
+        # Crossings went unseen meanwhile: keep the period, find the phase again
+        self.tracker.resume()
+        if self.edge_filter:
+            self.edge_filter.last_accepted_us = None
+    
+    def _layer_effects(self, effects, fine_level, full_scale):
+        """Apply the highest priority running effect to this half-cycle's level"""
+        now_ns = time.perf_counter_ns()
+        for effect in effects:
+            sample = effect.sample_at(now_ns)
+            if sample is None:
+                self._remove_effects(lambda e: e is effect)
+                continue
+            if effect.blend == REPLACE:
+                fine_level = sample << self.FRACTION_BITS
+            elif effect.blend == ADD:
+                fine_level += sample << self.FRACTION_BITS
+            else:
+                fine_level = fine_level * sample // self.MAX_DIM_LEVEL
+            return max(0, min(full_scale, fine_level))
+        return fine_level
+    
+    def _remove_effects(self, match):
+        with self._ramp_lock:
+            self._effects = tuple(e for e in self._effects if not match(e))
+        self._changed.set()
+    
+    def play_effect(self, effect):
+        """
+        Layer an app.effects.Effect over the brightness and start it now.
+        
+        Among effects of equal priority the newest one shows.
+        """
+        effect.start()
+        with self._ramp_lock:
+            self._effects = tuple(sorted((effect,) + self._effects, key=lambda e: -e.priority))
+        self._changed.set()
+        self.start()
+    
+    def stop_effects(self, name=None):
+        """Stop the effects called name, or all of them"""
+        self._remove_effects(lambda e: name is None or e.name == name)
+    
+    @property
+    def effects(self):
+        """Running effects, highest priority first"""
+        return self._effects
+    
+    def _finish_ramp(self, ramp):
+        """Publish a finished ramp's final level (called once, by the dimmer thread)"""
+        with self._ramp_lock:
+            if self._ramp is not ramp:
+                return
+            self._ramp = None
+            self._setpoint = (next(self._versions), ramp.final_level << self.FRACTION_BITS)
+        if ramp.off_at_end:
+            self.stop()
+    
+    def run_ramp(self, ramp):
+        """
+        Hand a ramp to the dimmer thread, replacing any running one.
+        
+        Returns immediately; a later set_brightness or run_ramp cancels it.
+        """
+        with self._ramp_lock:
+            ramp.version = next(self._versions)
+            ramp.start(self.dim_level)
+            self._setpoint = (ramp.version, ramp.start_level << self.FRACTION_BITS)
+            self._ramp = ramp
+        self._changed.set()
+        self.start()
+    
+    def cancel_ramp(self):
+        """Stop the running ramp, keeping the brightness it had reached"""
+        with self._ramp_lock:
+            ramp = self._ramp
+            if ramp is None:
+                return
+            self._ramp = None
+            self._setpoint = (next(self._versions),
+                              ramp.level_at(ramp.now_ns(), self.FRACTION_BITS))
+        self._changed.set()
+    
+    @property
+    def ramp(self):
+        """The running Ramp, or None"""
+        return self._ramp
+    
+    @property
+    def running(self):
+        """True while the dimmer thread is active"""
+        return self._stop_event is not None and not self._stop_event.is_set()
+    
+    @property
+    def fine_level(self):
+        """The current setpoint in 1/2**FRACTION_BITS steps of a dim level"""
+        version, fine_level = self._setpoint
+        ramp = self._ramp
+        if ramp is not None and ramp.version == version:
+            return ramp.level_at(ramp.now_ns(), self.FRACTION_BITS)
+        return fine_level
+    
+    @property
+    def dim_level(self):
+        """The current dim level (0-MAX_DIM_LEVEL)"""
+        return self.fine_level >> self.FRACTION_BITS
+    
+    @property
+    def setpoint_version(self):
+        """Changes on every set_brightness, ramp start, cancel and finish"""
+        return self._setpoint[0]
+    
     def start(self):
-        """Start the dimmer controller"""
-        if not self.running:
-            self.running = True
-            self.thread = threading.Thread(target=self.dimmer_thread_function)
+        """Start the dimmer controller (no-op if already running)"""
+        with self._state_lock:
+            if self.running:
+                return
+            # Each thread gets its own stop event, so a thread that is still
+            # winding down can never be revived by a later start()
+            self._stop_event = threading.Event()
+            self.thread = threading.Thread(target=self.dimmer_thread_function,
+                                           args=(self._stop_event,))
             self.thread.daemon = True
             self.thread.start()
     
     def stop(self):
-        """Stop the dimmer controller"""
-        self.running = False
-        if self.thread:
-            self.thread.join(timeout=0.5)
-        GPIO.output(self.GATE_PIN, GPIO.LOW)
+        """Stop the dimmer controller (no-op if already stopped)"""
+        with self._state_lock:
+            if self._stop_event is not None:
+                self._stop_event.set()
+                self._changed.set()
+            if self.thread and self.thread is not threading.current_thread():
+                self.thread.join(timeout=0.5)
+            self.thread = None
+            GPIO.output(self.GATE_PIN, GPIO.LOW)
+    
+    def _fine_level(self, brightness_percent):
+        """Brightness percentage as a clamped fine dim level"""
+        brightness_percent = float(brightness_percent)  # Ensure we're working with a number
+        full_scale = self.MAX_DIM_LEVEL << self.FRACTION_BITS
+        return max(0, min(full_scale, int((brightness_percent / 100.0) * full_scale)))
     
     def set_brightness(self, brightness_percent):
         """Set the brightness level as a percentage (0-100)"""
-        # Convert percentage to dim level
-        brightness_percent = float(brightness_percent)  # Ensure we're working with a number
-        self.dim_level = int((brightness_percent / 100.0) * self.MAX_DIM_LEVEL)
-        # Ensure within bounds
-        self.dim_level = max(0, min(self.MAX_DIM_LEVEL, self.dim_level))
-        # Return the actual brightness percentage based on the adjusted dim_level
-        return self.get_brightness_percent()
+        # Convert percentage to a fine dim level and clamp before publishing
+        fine_level = self._fine_level(brightness_percent)
+        # Single atomic store; next() on itertools.count is atomic as well.
+        # The lock only orders this against a ramp finishing at the same time
+        with self._ramp_lock:
+            self._ramp = None
+            self._setpoint = (next(self._versions), fine_level)
+        self._changed.set()
+        # Return the actual brightness percentage based on the adjusted level
+        return (fine_level / (self.MAX_DIM_LEVEL << self.FRACTION_BITS)) * 100
+    
+    def replace_brightness(self, brightness_percent, version):
+        """
+        Set the brightness only if the setpoint is still at version.
+        
+        Returns the new setpoint version, or None when anything else has
+        changed the setpoint (or started a ramp) since; that change is kept.
+        """
+        fine_level = self._fine_level(brightness_percent)
+        with self._ramp_lock:
+            if self._setpoint[0] != version:
+                return None
+            self._ramp = None
+            self._setpoint = (next(self._versions), fine_level)
+            version = self._setpoint[0]
+        self._changed.set()
+        return version
+    
+    def get_mains_status(self):
+        """Measured mains frequency, tracker and glitch filter counters"""
+        status = self.tracker.stats()
+        if self.edge_filter:
+            status.update(self.edge_filter.stats())
+        status['idle'] = self.idle  # Edges are not processed while idle
+        return status
     
     def get_brightness_percent(self):
         """Get the current brightness as a percentage"""
-        return (self.dim_level / self.MAX_DIM_LEVEL) * 100
+        return (self.fine_level / (self.MAX_DIM_LEVEL << self.FRACTION_BITS)) * 100
     
     def cleanup(self):
         """Clean up GPIO resources"""
@@ -114,4 +403,8 @@ class DimmerController:
         GPIO.cleanup([self.ZERO_CROSS_PIN, self.GATE_PIN])
 
 # Create a global instance of the dimmer controller
-dimmer = DimmerController()
\ No newline at end of file
+if Config.DIMMER_MODE == 'pwm':
+    from app.pwm_dimmer import PWMDimmerController
+    dimmer = PWMDimmerController()
+else:
+    dimmer = DimmerController()
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Keyframe light effects: breathing, pulses and notification blinks.
+
+An Effect is compiled once into a compact waveform, an array of dim
+levels sampled EFFECT_SAMPLE_HZ times a second. The phase dimmer looks up
+one sample per half-cycle, so a running effect needs no thread and no
+sleeping loop. Several effects can be active at once; the one with the
+highest priority is layered over the base brightness (the setpoint or
+running ramp), and the others wait underneath it.
+"""
+import math
+import time
+from array import array
+from config import Config
+
+EASINGS = {
+    'linear': lambda t: t,
+    'ease_in': lambda t: t * t,
+    'ease_out': lambda t: 1 - (1 - t) * (1 - t),
+    'ease_in_out': lambda t: 0.5 - 0.5 * math.cos(math.pi * t),
+    'step': lambda t: 0.0,  # Hold the previous value, jump at the next keyframe
+}
+
+# How a sample combines with the base brightness:
+#   replace: the sample is the level
+#   add:     the sample (possibly negative) is added to the base level
+#   scale:   the sample is a fraction of the base, MAX_DIM_LEVEL being 100%
+REPLACE, ADD, SCALE = 0, 1, 2
+BLENDS = {'replace': REPLACE, 'add': ADD, 'scale': SCALE}
+
+
+class Effect:
+    def __init__(self, keyframes, start=0, loops=1, priority=0, blend='replace',
+                 name='effect', sample_hz=None):
+        """
+        keyframes is a list of (seconds, percent) or (seconds, percent, easing):
+        move from the previous value to percent over seconds. loops=0
+        repeats until the effect is stopped.
+        """
+        if blend not in BLENDS:
+            raise ValueError(f'unknown blend {blend!r}')
+        self.name = name
+        self.priority = int(priority)
+        self.blend = BLENDS[blend]
+        self.blend_name = blend
+        self.loops = max(0, int(loops))
+        self.sample_hz = int(sample_hz or Config.EFFECT_SAMPLE_HZ)
+        self.waveform = self._compile(keyframes, start)
+        self._start_ns = None
+        self._end_index = len(self.waveform) * self.loops
+
+    def _compile(self, keyframes, start):
+        max_level = Config.MAX_DIM_LEVEL
+        max_samples = Config.EFFECT_MAX_SECONDS * self.sample_hz
+        value = float(start)
+        if not -100 <= value <= 100:
+            raise ValueError('start needs a percent in -100..100')
+        waveform = array('h')
+        total = 0
+        for keyframe in keyframes:
+            seconds, target = float(keyframe[0]), float(keyframe[1])
+            easing = keyframe[2] if len(keyframe) > 2 else 'linear'
+            if easing not in EASINGS:
+                raise ValueError(f'unknown easing {easing!r}')
+            if not -100 <= target <= 100 or not seconds >= 0:
+                raise ValueError('keyframes need seconds >= 0 and percent in -100..100')
+            # Bound the length before building any samples, so an oversized
+            # keyframe is refused at once instead of after filling memory
+            if seconds > Config.EFFECT_MAX_SECONDS:
+                raise ValueError(f'effects are limited to {Config.EFFECT_MAX_SECONDS} seconds per loop')
+            samples = round(seconds * self.sample_hz)
+            total += samples
+            if total > max_samples:
+                raise ValueError(f'effects are limited to {Config.EFFECT_MAX_SECONDS} seconds per loop')
+            ease = EASINGS[easing]
+            for i in range(samples):
+                percent = value + (target - value) * ease(i / samples)
+                waveform.append(int(percent * max_level / 100))
+            value = target
+        if not waveform:
+            waveform.append(int(value * max_level / 100))
+        return waveform
+
+    @property
+    def duration(self):
+        """Seconds until the effect ends, or None if it loops forever"""
+        if not self.loops:
+            return None
+        return len(self.waveform) * self.loops / self.sample_hz
+
+    def start(self, now_ns=None):
+        self._start_ns = time.perf_counter_ns() if now_ns is None else now_ns
+
+    def sample_at(self, now_ns):
+        """
+        Waveform sample at now_ns, or None once the effect has finished
+        """
+        index = max(0, now_ns - self._start_ns) * self.sample_hz // 1000000000
+        if self.loops and index >= self._end_index:
+            return None
+        return self.waveform[index % len(self.waveform)]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'priority': self.priority,
+            'blend': self.blend_name,
+            'loops': self.loops,
+            'duration_seconds': self.duration,
+            'samples': len(self.waveform),
+        }
+
+
+def pulse(cycles=3, fade_time=5.0, pause_time=1.0):
+    """Off, fade up, hold, fade down, hold (the pulser_1/pulser_2 cycle)"""
+    return Effect([(0.5, 0), (fade_time, 100, 'ease_in_out'), (pause_time, 100),
+                   (fade_time, 0, 'ease_in_out'), (pause_time, 0)],
+                  loops=cycles, name='pulse')
+
+
+def breathe(period=4.0, depth=70, loops=0):
+    """Slow breathing around the current brightness, dipping by depth percent"""
+    return Effect([(period / 2, 100 - depth, 'ease_in_out'), (period / 2, 100, 'ease_in_out')],
+                  start=100, loops=loops, blend='scale', name='breathe')
+
+
+def notify(blinks=2, percent=30):
+    """Short soft blinks on top of whatever is lit, e.g. 'alarm in 5 minutes'"""
+    return Effect([(0.3, percent, 'ease_out'), (0.7, 0, 'ease_in')],
+                  loops=blinks, priority=10, blend='add', name='notify')
+
+
+PRESETS = {'pulse': pulse, 'breathe': breathe, 'notify': notify}
@@ -0,0 +1,66 @@
+"""
+Ambient light sensors for closed-loop brightness control.
+
+BH1750Sensor reads a BH1750 lux meter over I2C (smbus2), and
+SimulatedLightSensor models the light from the dimmer plus daylight
+for running the control loop without hardware. Both offer read() -> lux
+and are only ever read from the lux control thread, never the dimmer thread.
+"""
+import random
+from config import Config
+
+try:
+    from smbus2 import SMBus
+except ImportError:
+    SMBus = None
+
+# BH1750 continuous high-resolution mode: 1 lx resolution, 120 ms per reading
+BH1750_CONTINUOUS_HIGH_RES = 0x10
+
+
+class BH1750Sensor:
+    def __init__(self, bus=None, address=None):
+        if SMBus is None:
+            raise RuntimeError('The BH1750 sensor needs smbus2 (pip install smbus2)')
+        self.address = address if address is not None else Config.LUX_I2C_ADDRESS
+        self.bus = SMBus(bus if bus is not None else Config.LUX_I2C_BUS)
+        self.bus.write_byte(self.address, BH1750_CONTINUOUS_HIGH_RES)
+
+    def read(self):
+        """Latest measurement in lux"""
+        high, low = self.bus.read_i2c_block_data(self.address, BH1750_CONTINUOUS_HIGH_RES, 2)
+        return ((high << 8) | low) / 1.2
+
+    def close(self):
+        self.bus.close()
+
+
+class SimulatedLightSensor:
+    """
+    Lux a sensor would see from the dimmer at its current level.
+
+    Lamp output follows level**gamma scaled to max_lux, on top of a
+    constant ambient level, with gaussian noise. Changing max_lux or
+    ambient mid-run stands in for a different bulb or season.
+    """
+    def __init__(self, dimmer, max_lux=400.0, ambient=5.0, gamma=1.8, noise=1.0):
+        self.dimmer = dimmer
+        self.max_lux = max_lux
+        self.ambient = ambient
+        self.gamma = gamma
+        self.noise = noise
+
+    def read(self):
+        level = self.dimmer.dim_level / self.dimmer.MAX_DIM_LEVEL
+        lux = self.ambient + self.max_lux * level ** self.gamma
+        return max(0.0, lux + random.gauss(0.0, self.noise))
+
+    def close(self):
+        pass
+
+
+def create_sensor(dimmer):
+    """The sensor selected by Config.LUX_SENSOR"""
+    if Config.LUX_SENSOR == 'simulated':
+        return SimulatedLightSensor(dimmer)
+    return BH1750Sensor()
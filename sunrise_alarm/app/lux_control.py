@@ -0,0 +1,136 @@
+"""
+Closed-loop brightness control from an ambient light sensor.
+
+During a sunrise the scheduler sets a target illuminance together with
+the open-loop brightness it would have used. The controller thread
+averages a batch of sensor readings per step and corrects the dimmer
+with a PI loop on top of that feedforward. The correction is rate
+limited, so the light never jumps, and clamped against windup. The
+timing-critical dimmer thread only ever sees ordinary setpoint changes.
+
+The loop only replaces the setpoint it published itself: a manual
+brightness, sleep timer, wind-down or any other ramp changes the
+dimmer's setpoint version, and the loop stops instead of overwriting it.
+"""
+import threading
+import time
+from config import Config
+
+
+class LuxController:
+    def __init__(self, dimmer, sensor, kp=None, ki=None, max_rate=None,
+                 interval=None, samples=None):
+        self.dimmer = dimmer
+        self.sensor = sensor
+        self.kp = kp if kp is not None else Config.LUX_KP
+        self.ki = ki if ki is not None else Config.LUX_KI
+        self.max_rate = max_rate if max_rate is not None else Config.LUX_MAX_RATE
+        self.interval = interval if interval is not None else Config.LUX_INTERVAL
+        self.samples = samples if samples is not None else Config.LUX_SAMPLES
+
+        # (target lux, feedforward percent), published as one tuple
+        self._target = None
+        self._integral = 0.0
+        self.output = 0.0
+        self.measured = None
+        # Set when another setpoint took over from the loop
+        self.overridden = False
+
+        self._stop_event = None
+        self.thread = None
+        self._state_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._stop_event is not None and not self._stop_event.is_set()
+
+    def set_target(self, lux, feedforward_percent):
+        """Track lux, starting from the open-loop brightness feedforward_percent"""
+        self._target = (float(lux), float(feedforward_percent))
+
+    def start(self):
+        with self._state_lock:
+            if self.running:
+                return
+            self._integral = 0.0
+            self.output = self.dimmer.get_brightness_percent()
+            self.overridden = False
+            self._stop_event = threading.Event()
+            self.thread = threading.Thread(target=self._control_loop, args=(self._stop_event,),
+                                           daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop correcting; the dimmer keeps the last output"""
+        with self._state_lock:
+            if self._stop_event is not None:
+                self._stop_event.set()
+            if self.thread and self.thread is not threading.current_thread():
+                self.thread.join(timeout=2 * self.interval + 1)
+            self.thread = None
+            self._target = None
+
+    def _measure(self):
+        """Average of a batch of readings, spread over one control interval"""
+        total = 0.0
+        for _ in range(self.samples):
+            total += self.sensor.read()
+            time.sleep(self.interval / self.samples)
+        return total / self.samples
+
+    def step(self, lux, dt):
+        """
+        One PI update from a measurement; returns the new brightness percent
+        """
+        target = self._target
+        if target is None:
+            return self.output
+        target_lux, feedforward = target
+        self.measured = lux
+        error = target_lux - lux
+
+        # Integrate only while the output is not pinned in the error's direction
+        integral = self._integral + error * dt
+        desired = feedforward + self.kp * error + self.ki * integral
+        if (desired < 100 or error < 0) and (desired > 0 or error > 0):
+            self._integral = integral
+        desired = max(0.0, min(100.0, feedforward + self.kp * error + self.ki * self._integral))
+
+        # Rate limit so a noisy reading or a sudden target step cannot flash the light
+        max_step = self.max_rate * dt
+        self.output += max(-max_step, min(max_step, desired - self.output))
+        return self.output
+
+    def _control_loop(self, stop_event):
+        last = time.monotonic()
+        version = self.dimmer.setpoint_version
+        while not stop_event.is_set():
+            lux = self._measure()
+            now = time.monotonic()
+            if stop_event.is_set():
+                break
+            version = self.dimmer.replace_brightness(self.step(lux, now - last), version)
+            if version is None:
+                # Someone else set the brightness or started a ramp; leave it alone
+                self.overridden = True
+                stop_event.set()
+                break
+            last = now
+
+    def get_status(self):
+        target = self._target
+        return {
+            'running': self.running,
+            'overridden': self.overridden,
+            'target_lux': target[0] if target else None,
+            'measured_lux': round(self.measured, 1) if self.measured is not None else None,
+            'output_percent': round(self.output, 2),
+        }
+
+
+def create_lux_controller(dimmer):
+    """A LuxController for the configured sensor, or None when closed-loop control is off"""
+    if not Config.LUX_CONTROL_ENABLED:
+        return None
+    from app.light_sensor import create_sensor
+    return LuxController(dimmer, create_sensor(dimmer))
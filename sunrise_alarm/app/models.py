@@ -1,10 +1,15 @@
 """
 Database models for the Sunrise Alarm application.
 """
+import time
 from datetime import datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db, login
+from config import Config
+
+# Detached User objects keyed by the session's user id, with their expiry
+_user_cache = {}
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,6 +18,7 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
+        _user_cache.pop(str(self.id), None)
         
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -22,7 +28,20 @@ class User(UserMixin, db.Model):
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    """Load the logged-in user, hitting the database at most once per TTL"""
+    cached = _user_cache.get(id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    user = db.session.get(User, int(id))
+    if user is None:
+        _user_cache.pop(id, None)
+        return None
+    # Detach it so the loaded attributes stay valid after this request's
+    # session is closed and the object can be shared between requests
+    db.session.expunge(user)
+    _user_cache[id] = (time.monotonic() + Config.USER_CACHE_TTL, user)
+    return user
 
 class AlarmSchedule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,100 @@
+"""
+Sampling profiler for the running application.
+
+Samples the stacks of every thread (dimmer, APScheduler and request
+threads) at a fixed rate for a number of seconds and returns them in the
+collapsed-stack format understood by flamegraph.pl and speedscope, along
+with the CPU time each thread used while it was being sampled.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+# Functions that identify what a thread is doing, checked root to leaf
+THREAD_ROLES = [
+    ('dimmer_thread_function', 'dimmer'),
+    ('start_sunrise', 'sunrise'),
+    ('full_dispatch_request', 'request'),
+]
+
+# Only one profile at a time; sampling twice would double the overhead
+_profile_lock = threading.Lock()
+
+
+def _thread_cpu_time(ident):
+    """CPU seconds used by a thread so far, or None if unavailable"""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def profile(seconds, rate_hz):
+    """
+    Sample all threads and return (collapsed stack counts, per-thread stats).
+
+    Raises RuntimeError if another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError('A profile is already running')
+    try:
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        cpu_start = {ident: _thread_cpu_time(ident) for ident in names}
+        stacks = collections.Counter()
+        roles = collections.defaultdict(collections.Counter)
+        samples = collections.Counter()
+
+        interval = 1.0 / rate_hz
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(frame.f_code)
+                    frame = frame.f_back
+                labels.reverse()
+
+                role = 'other'
+                for code in labels:
+                    for function, candidate in THREAD_ROLES:
+                        if code.co_name == function:
+                            role = candidate
+                            break
+                    if role != 'other':
+                        break
+
+                name = names.get(ident) or f'thread-{ident}'
+                stacks[';'.join([f'{name} [{role}]'] + [_frame_label(code) for code in labels])] += 1
+                roles[ident][role] += 1
+                samples[ident] += 1
+            time.sleep(interval)
+
+        threads = []
+        for ident, count in samples.items():
+            start = cpu_start.get(ident)
+            end = _thread_cpu_time(ident)
+            threads.append({
+                'name': names.get(ident) or f'thread-{ident}',
+                'role': roles[ident].most_common(1)[0][0],
+                'samples': count,
+                # Threads started during the profile have no start reading
+                'cpu_seconds': round(end - start, 4) if start is not None and end is not None else None,
+            })
+        threads.sort(key=lambda thread: thread['cpu_seconds'] or 0, reverse=True)
+        return stacks, threads
+    finally:
+        _profile_lock.release()
+
+
+def collapsed(stacks):
+    """Render stack counts in collapsed-stack format, one 'stack count' per line"""
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
@@ -0,0 +1,243 @@
+"""
+PWM-mode dimmer for drivers with a PWM/GATE control input.
+
+Production version of the pulser_*.py experiments. Offers the same interface
+as DimmerController, maps brightness onto a calibrated duty-cycle curve that
+skips dead zones, and runs fades without blocking the caller. Uses the
+pigpio daemon's hardware PWM when it is available, falling back to
+RPi.GPIO software PWM otherwise.
+"""
+import RPi.GPIO as GPIO
+import threading
+from config import Config
+from app.ramp import Ramp
+
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+# pigpio expresses hardware PWM duty in millionths
+PIGPIO_DUTY_RANGE = 1000000
+
+
+def map_duty(brightness_percent, min_duty, max_duty, dead_zones):
+    """
+    Map 0-100% brightness onto a duty cycle, skipping dead zones.
+
+    The usable duty range is min_duty..max_duty minus every (start, end)
+    dead zone, and brightness is spread evenly over what remains, so no
+    brightness value ever lands inside a zone that flickers.
+    """
+    if brightness_percent <= 0:
+        return 0.0
+    if brightness_percent >= 100:
+        return float(max_duty)
+
+    usable = (max_duty - min_duty) - sum(end - start for start, end in dead_zones)
+    duty = min_duty + usable * brightness_percent / 100.0
+    for start, end in sorted(dead_zones):
+        if duty >= start:
+            duty += end - start
+    return min(duty, float(max_duty))
+
+
+class PWMDimmerController:
+    def __init__(self, gate_pin=None, frequency=None):
+        self.GATE_PIN = gate_pin or Config.GATE_PIN
+        self.MAX_DIM_LEVEL = Config.MAX_DIM_LEVEL
+        self.frequency = frequency or Config.PWM_FREQUENCY
+        self.min_duty = Config.PWM_MIN_DUTY
+        self.max_duty = Config.PWM_MAX_DUTY
+        self.dead_zones = Config.PWM_DEAD_ZONES
+
+        # Brightness is published as a single tuple like DimmerController
+        self._setpoint = (0, 0)
+        self._version = 0
+        self._state_lock = threading.Lock()
+        self._duty = None
+        self._running = False
+        # Called once after the next non-zero duty is written, like DimmerController
+        self.on_first_pulse = None
+
+        # Running app.ramp.Ramp (fade_to builds a one-segment ramp)
+        self._fade = None
+        self._fade_event = threading.Event()
+        self._fade_thread = None
+
+        self.pi = None
+        if pigpio is not None and Config.PWM_USE_HARDWARE:
+            pi = pigpio.pi()
+            if pi.connected:
+                self.pi = pi
+
+        if self.pi is None:
+            GPIO.setwarnings(False)
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.GATE_PIN, GPIO.OUT)
+            self.pwm = GPIO.PWM(self.GATE_PIN, self.frequency)
+            self.pwm.start(0)
+        self._apply_duty(0.0)
+
+    @property
+    def hardware(self):
+        """True when driving the pin from the hardware PWM peripheral"""
+        return self.pi is not None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def dim_level(self):
+        return self._setpoint[1]
+
+    def _apply_duty(self, duty):
+        """Write the duty cycle to the PWM peripheral, skipping no-op writes"""
+        if duty == self._duty:
+            return
+        self._duty = duty
+        if self.pi is not None:
+            self.pi.hardware_PWM(self.GATE_PIN, self.frequency, int(duty * PIGPIO_DUTY_RANGE / 100))
+        else:
+            self.pwm.ChangeDutyCycle(duty)
+
+    def _publish(self, dim_level, fade=None, version=None):
+        """Publish a level; with version, only if the setpoint is still at it"""
+        with self._state_lock:
+            # A fade step computed just before the fade was replaced is stale
+            if fade is not None and self._fade is not fade:
+                return None
+            if version is not None and self._setpoint[0] != version:
+                return None
+            self._version += 1
+            self._setpoint = (self._version, dim_level)
+            # Write under the lock so concurrent publishers cannot reorder duties
+            if self._running:
+                self._apply_duty(map_duty(dim_level * 100.0 / self.MAX_DIM_LEVEL,
+                                          self.min_duty, self.max_duty, self.dead_zones))
+                if self.on_first_pulse is not None and dim_level > 0:
+                    on_first_pulse, self.on_first_pulse = self.on_first_pulse, None
+                    on_first_pulse()
+            return self._version
+
+    def start(self):
+        """Start driving the output at the current setpoint"""
+        with self._state_lock:
+            if self._running:
+                return
+            self._running = True
+        self._publish(self.dim_level)
+
+    def stop(self):
+        """Stop any fade and switch the output off"""
+        self.cancel_fade()
+        with self._state_lock:
+            self._running = False
+            self._apply_duty(0.0)
+
+    def set_brightness(self, brightness_percent):
+        """Set the brightness level as a percentage (0-100)"""
+        self.cancel_fade()
+        return self._set_level_percent(brightness_percent)
+
+    def _set_level_percent(self, brightness_percent):
+        dim_level = self._dim_level(brightness_percent)
+        self._publish(dim_level)
+        return (dim_level / self.MAX_DIM_LEVEL) * 100
+
+    def _dim_level(self, brightness_percent):
+        dim_level = int((float(brightness_percent) / 100.0) * self.MAX_DIM_LEVEL)
+        return max(0, min(self.MAX_DIM_LEVEL, dim_level))
+
+    def replace_brightness(self, brightness_percent, version):
+        """Set the brightness only if the setpoint is still at version, like DimmerController"""
+        return self._publish(self._dim_level(brightness_percent), version=version)
+
+    @property
+    def setpoint_version(self):
+        return self._setpoint[0]
+
+    def get_brightness_percent(self):
+        return (self.dim_level / self.MAX_DIM_LEVEL) * 100
+
+    # --- fades -----------------------------------------------------------
+
+    def fade_to(self, brightness_percent, duration):
+        """
+        Fade from the current brightness to brightness_percent over duration seconds.
+
+        Returns immediately. A single worker wakes only when the output has
+        to change by one dim level, so slow fades cost almost nothing.
+        """
+        target = max(0, min(self.MAX_DIM_LEVEL, int(float(brightness_percent) / 100.0 * self.MAX_DIM_LEVEL)))
+        self._begin_ramp(Ramp([(duration, target)]))
+
+    def run_ramp(self, ramp):
+        """Run a multi-segment ramp (see app.ramp) and switch the output on"""
+        self._begin_ramp(ramp)
+        self.start()
+
+    def _begin_ramp(self, ramp):
+        with self._state_lock:
+            ramp.start(self.dim_level)
+            self._fade = ramp
+            if self._fade_thread is None or not self._fade_thread.is_alive():
+                self._fade_thread = threading.Thread(target=self._fade_worker, daemon=True)
+                self._fade_thread.start()
+        self._fade_event.set()
+
+    def cancel_fade(self):
+        with self._state_lock:
+            self._fade = None
+        self._fade_event.set()
+
+    # Same interface as DimmerController; the last published level is kept
+    cancel_ramp = cancel_fade
+
+    @property
+    def fading(self):
+        return self._fade is not None
+
+    @property
+    def ramp(self):
+        return self._fade
+
+    def _fade_worker(self):
+        while True:
+            self._fade_event.clear()
+            fade = self._fade
+            if fade is None:
+                # Park until the next fade_to(); exit if none arrives soon
+                if not self._fade_event.wait(timeout=60):
+                    with self._state_lock:
+                        if self._fade is None:
+                            self._fade_thread = None
+                            return
+                continue
+
+            now_ns = fade.now_ns()
+            level = fade.level_at(now_ns)
+            self._publish(level, fade)
+            if fade.done:
+                with self._state_lock:
+                    finished = self._fade is fade
+                    if finished:
+                        self._fade = None
+                if finished and fade.off_at_end:
+                    self.stop()
+                continue
+
+            # Sleep until the level next moves by one step (or the fade is replaced)
+            next_ns = fade.next_change_ns(now_ns)
+            self._fade_event.wait(timeout=max(0.0, (next_ns - fade.now_ns()) / 1e9))
+
+    def cleanup(self):
+        """Release the PWM output"""
+        self.stop()
+        if self.pi is not None:
+            self.pi.hardware_PWM(self.GATE_PIN, 0, 0)
+            self.pi.stop()
+        else:
+            self.pwm.stop()
+            GPIO.cleanup(self.GATE_PIN)
@@ -0,0 +1,118 @@
+"""
+Brightness ramps evaluated by the dimmer itself.
+
+A Ramp is a list of (duration, target level) segments: up, down or
+holds at the same level, optionally switching the light off at the end.
+Once started it is a pure function of time. The phase dimmer evaluates
+it on every half-cycle and the PWM dimmer wakes only when the level
+changes, so sunrises, wind-downs and sleep timers need no sleeping
+thread of their own. Time comes from the perf counter, or from the
+clock the ramp was given (the scheduler passes its own, so a ramp
+follows a VirtualClock in simulations).
+"""
+import time
+
+
+class Ramp:
+    def __init__(self, segments, start_level=None, off_at_end=False, name='ramp', clock=None):
+        """
+        segments is a list of (seconds, target dim level); start_level
+        defaults to the dimmer's level when the ramp starts. clock is an
+        app.clock clock; by default the ramp runs on time.perf_counter_ns
+        """
+        self.segments = [(max(0.0, float(seconds)), int(level)) for seconds, level in segments]
+        self.start_level = start_level
+        self.off_at_end = off_at_end
+        self.name = name
+        # Nanosecond time source for level_at and friends
+        self.now_ns = clock.perf_counter_ns if clock is not None else time.perf_counter_ns
+
+        self.version = None  # Setpoint version the ramp belongs to
+        self.done = False
+        self._start_ns = None
+        self._ends_ns = []
+        self._from_levels = []
+        self._index = 0
+
+    @property
+    def final_level(self):
+        if self.off_at_end:
+            return 0
+        if self.segments:
+            return self.segments[-1][1]
+        return self.start_level
+
+    @property
+    def duration(self):
+        return sum(seconds for seconds, _ in self.segments)
+
+    def start(self, current_level, now_ns=None):
+        """Anchor the ramp at now (now_ns())"""
+        now_ns = self.now_ns() if now_ns is None else now_ns
+        if self.start_level is None:
+            self.start_level = current_level
+        self._start_ns = now_ns
+        self._ends_ns = []
+        self._from_levels = []
+        end_ns = now_ns
+        level = self.start_level
+        for seconds, target in self.segments:
+            end_ns += int(seconds * 1e9)
+            self._ends_ns.append(end_ns)
+            self._from_levels.append(level)
+            level = target
+        self._index = 0
+        self.done = not self.segments
+
+    def level_at(self, now_ns, fraction_bits=0):
+        """
+        Dim level at now_ns in units of 1/2**fraction_bits of a level;
+        integer math, and the segment index only moves forward
+        """
+        ends = self._ends_ns
+        index = self._index
+        while index < len(ends) and now_ns >= ends[index]:
+            index += 1
+        self._index = index
+        if index >= len(ends):
+            self.done = True
+            return self.final_level << fraction_bits
+
+        seconds, target = self.segments[index]
+        from_level = self._from_levels[index]
+        span_ns = int(seconds * 1e9)
+        if span_ns <= 0 or target == from_level:
+            return target << fraction_bits
+        # A reader whose clock sample predates another reader's can land before the segment
+        elapsed_ns = max(0, span_ns - (ends[index] - now_ns))
+        return (from_level << fraction_bits) + ((target - from_level) << fraction_bits) * elapsed_ns // span_ns
+
+    def next_change_ns(self, now_ns):
+        """
+        When level_at next differs from its value at now_ns (for sleepers like the PWM worker)
+        """
+        level = self.level_at(now_ns)
+        if self.done:
+            return None
+        index = self._index
+        seconds, target = self.segments[index]
+        from_level = self._from_levels[index]
+        if target == from_level:
+            return self._ends_ns[index]
+        # First time at which the linear segment shows another whole level;
+        # level_at floors, so a rising ramp changes on reaching the next
+        # level and a falling one as soon as it drops below this one
+        span_ns = int(seconds * 1e9)
+        start_ns = self._ends_ns[index] - span_ns
+        if target > from_level:
+            offset = -(-(level + 1 - from_level) * span_ns // (target - from_level))
+        else:
+            offset = (from_level - level) * span_ns // (from_level - target) + 1
+        return min(self._ends_ns[index], start_ns + offset)
+
+    def progress(self, now_ns=None):
+        """(elapsed seconds, total seconds) for status displays"""
+        if self._start_ns is None:
+            return 0.0, self.duration
+        now_ns = self.now_ns() if now_ns is None else now_ns
+        return min(self.duration, (now_ns - self._start_ns) / 1e9), self.duration
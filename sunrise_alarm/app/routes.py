@@ -1,14 +1,18 @@
 """
 Main routes for the Sunrise Alarm application.
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, current_app
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import TimeField, IntegerField, BooleanField, SubmitField
 from wtforms.validators import DataRequired, NumberRange
 from app.models import AlarmSchedule, SystemConfig, User
 from app.dimmer import dimmer
-from app.scheduler import schedule_next_alarm, initialize_scheduler
+from app.effects import Effect, PRESETS
+from app.scheduler import (schedule_next_alarm, initialize_scheduler, get_wind_down,
+                           schedule_wind_down, start_sleep_timer)
+from app import profiler
+from app.slo import recorder
 from app import db
 import json
 from datetime import datetime, time
@@ -172,6 +176,133 @@ def set_brightness(level):
     
     return jsonify({'success': True, 'brightness': actual_level})
 
+@main_bp.route('/api/wind_down', methods=['GET', 'POST'])
+@login_required
+def wind_down():
+    """Evening wind-down: {"enabled", "time": "HH:MM", "start_brightness", "fade_minutes"}"""
+    if request.method == 'POST':
+        settings = get_wind_down()
+        data = request.get_json(silent=True) or {}
+        try:
+            if 'enabled' in data:
+                settings['enabled'] = bool(data['enabled'])
+            if 'time' in data:
+                hour, minute = map(int, str(data['time']).split(':'))
+                if not (0 <= hour < 24 and 0 <= minute < 60):
+                    raise ValueError('time must be HH:MM')
+                settings['time'] = f'{hour:02d}:{minute:02d}'
+            if 'start_brightness' in data:
+                settings['start_brightness'] = max(0, min(100, int(data['start_brightness'])))
+            if 'fade_minutes' in data:
+                settings['fade_minutes'] = max(1, min(240, int(data['fade_minutes'])))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        SystemConfig.set_value('wind_down', json.dumps(settings))
+        schedule_wind_down()
+        return jsonify(settings)
+    
+    return jsonify(get_wind_down())
+
+@main_bp.route('/api/sleep_timer', methods=['POST', 'DELETE'])
+@login_required
+def sleep_timer():
+    """Hold the current brightness for hold_minutes, then fade out over fade_minutes and turn off"""
+    if request.method == 'DELETE':
+        dimmer.cancel_ramp()
+        return jsonify({'success': True})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        fade_minutes = max(0.0, min(240.0, float(data.get('fade_minutes', 15))))
+        hold_minutes = max(0.0, min(240.0, float(data.get('hold_minutes', 0))))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    start_sleep_timer(fade_minutes, hold_minutes)
+    return jsonify({'success': True, 'fade_minutes': fade_minutes, 'hold_minutes': hold_minutes})
+
+@main_bp.route('/api/ramp')
+@login_required
+def ramp_status():
+    """The running sunrise, wind-down or sleep timer ramp"""
+    ramp = dimmer.ramp
+    if ramp is None:
+        return jsonify({'active': False, 'brightness': dimmer.get_brightness_percent()})
+    elapsed, total = ramp.progress()
+    return jsonify({'active': True, 'name': ramp.name, 'elapsed_seconds': round(elapsed, 1),
+                    'total_seconds': total, 'brightness': dimmer.get_brightness_percent()})
+
+@main_bp.route('/api/effects', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def effects():
+    """
+    Light effects run by the phase dimmer. POST either {"preset": name,
+    "params": {...}} or {"keyframes": [[seconds, percent, easing], ...],
+    "start", "loops", "priority", "blend", "name"}; DELETE ?name= stops them
+    """
+    if not hasattr(dimmer, 'play_effect'):
+        abort(404)  # PWM mode has no per-half-cycle loop to run them in
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            if 'preset' in data:
+                if data['preset'] not in PRESETS:
+                    raise ValueError(f"unknown preset {data['preset']!r}")
+                effect = PRESETS[data['preset']](**(data.get('params') or {}))
+            else:
+                effect = Effect(data['keyframes'],
+                                start=data.get('start', 0),
+                                loops=data.get('loops', 1),
+                                priority=data.get('priority', 0),
+                                blend=data.get('blend', 'replace'),
+                                name=str(data.get('name', 'effect')))
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            return jsonify({'error': str(e)}), 400
+        dimmer.play_effect(effect)
+        return jsonify(effect.to_dict())
+    
+    if request.method == 'DELETE':
+        dimmer.stop_effects(request.args.get('name'))
+    
+    return jsonify({'effects': [effect.to_dict() for effect in dimmer.effects]})
+
+@main_bp.route('/api/mains')
+@login_required
+def mains():
+    """Measured mains frequency, tracker lock, rejected zero-cross edges and idle state"""
+    if not hasattr(dimmer, 'get_mains_status'):
+        abort(404)  # PWM mode does not follow the mains
+    return jsonify(dimmer.get_mains_status())
+
+@main_bp.route('/api/slo')
+@login_required
+def slo():
+    """Start accuracy percentiles for recent sunrise runs"""
+    return jsonify(recorder.summary())
+
+@main_bp.route('/debug/profile')
+@login_required
+def profile():
+    """Sample all thread stacks: ?seconds=10&rate=100&format=collapsed|json"""
+    if not current_app.config['PROFILER_ENABLED']:
+        abort(404)
+    
+    seconds = min(request.args.get('seconds', 10, type=float), current_app.config['PROFILER_MAX_SECONDS'])
+    rate = min(request.args.get('rate', 100, type=float), current_app.config['PROFILER_MAX_RATE_HZ'])
+    if seconds <= 0 or rate <= 0:
+        return jsonify({'error': 'seconds and rate must be positive'}), 400
+    
+    try:
+        stacks, threads = profiler.profile(seconds, rate)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    if request.args.get('format') == 'json':
+        return jsonify({'threads': threads, 'collapsed': profiler.collapsed(stacks)})
+    return current_app.response_class(
+        profiler.collapsed(stacks), mimetype='text/plain',
+        headers={'Content-Disposition': 'attachment; filename=profile.collapsed'})
+
 # This function is now called explicitly in create_app instead of using before_app_first_request
 def initialize_app():
     """Initialize the application"""
@@ -1,15 +1,54 @@
 """
 Scheduler for sunrise alarm functionality.
 """
-import time
+import json
 from datetime import datetime, timedelta
+from flask import current_app
 from app import scheduler, db
 from app.models import AlarmSchedule, SystemConfig
 from app.dimmer import dimmer
+from app.slo import recorder
+from app.clock import SystemClock
+from app.lux_control import create_lux_controller
+from app.calendar_import import CalendarAlarms
+from app.ramp import Ramp
+from config import Config
 
-def get_next_alarm():
+# Time source for scheduling and fades; swap in a clock.VirtualClock to
+# run schedules in simulated time
+clock = SystemClock()
+
+# Corrects the fade from a light sensor when LUX_CONTROL_ENABLED is set
+lux_controller = create_lux_controller(dimmer)
+
+# Alarms from the calendars in CALENDAR_FILES, alongside the weekly schedule
+calendar_alarms = CalendarAlarms() if Config.CALENDAR_FILES else None
+
+# Jobs run on APScheduler's threads, outside any request; they use this
+# app's context for database access (set by initialize_scheduler)
+_app = None
+
+DEFAULT_WIND_DOWN = {'enabled': False, 'time': '22:00', 'start_brightness': 40, 'fade_minutes': 30}
+
+def percent_to_level(percent):
+    """Brightness percentage as a clamped dim level"""
+    return max(0, min(dimmer.MAX_DIM_LEVEL, int(float(percent) / 100.0 * dimmer.MAX_DIM_LEVEL)))
+
+def get_next_alarm(now=None):
     """Get the next scheduled alarm"""
-    now = datetime.now()
+    now = now or clock.now()
+    alarm, alarm_datetime = get_next_scheduled_alarm(now)
+    
+    # A calendar alarm wins if it comes first
+    if calendar_alarms is not None:
+        calendar_alarm, calendar_datetime = calendar_alarms.next_alarm(now)
+        if calendar_alarm and (alarm_datetime is None or calendar_datetime < alarm_datetime):
+            return calendar_alarm, calendar_datetime
+    
+    return alarm, alarm_datetime
+
+def get_next_scheduled_alarm(now):
+    """Get the next alarm from the weekly AlarmSchedule rows"""
     day_of_week = now.weekday()  # 0-6 for Monday-Sunday
     
     # Search for the next 7 days
@@ -30,15 +69,16 @@ def schedule_next_alarm():
     alarm, alarm_time = get_next_alarm()
     
     if alarm:
-        # Remove any existing jobs
-        scheduler.remove_all_jobs()
-        
-        # Schedule the sunrise alarm
+        # Schedule the sunrise alarm, replacing any earlier one (but not
+        # the calendar refresh job)
+        run_date = alarm_time - timedelta(minutes=alarm.fade_duration)
         scheduler.add_job(
             start_sunrise,
             'date',
-            run_date=alarm_time - timedelta(minutes=alarm.fade_duration),
-            args=[alarm.fade_duration]
+            id='sunrise',
+            replace_existing=True,
+            run_date=run_date,
+            args=[alarm.fade_duration, clock.timestamp(run_date)]
         )
         
         # Update the next alarm time in the system config
@@ -49,34 +89,115 @@ def schedule_next_alarm():
         SystemConfig.set_value('next_alarm', '')
         return False
 
-def start_sunrise(fade_duration):
+def start_sunrise(fade_duration, planned_start=None):
     """Start the sunrise effect over the specified duration"""
+    # Record how late this run is against its planned start (epoch seconds);
+    # runs started by hand have no plan to be late against
+    now = clock.time()
+    run = recorder.begin(planned_start if planned_start is not None else now,
+                         fade_duration * 60,
+                         source='scheduler' if planned_start is not None else 'manual', now=now)
+    
     # Start with 0% brightness
     dimmer.set_brightness(0)
+    dimmer.on_first_pulse = lambda: recorder.mark_first_pulse(run)
     dimmer.start()
     
-    # Calculate the total number of steps for smooth fading
+    if lux_controller:
+        # With a light sensor the fade follows a target illuminance instead,
+        # using the open-loop brightness as the starting point
+        run_closed_loop_sunrise(fade_duration)
+        finish_sunrise(run)
+        return
+    
+    # The dimmer runs the fade itself; this job thread is free straight away
+    dimmer.run_ramp(Ramp([(fade_duration * 60, dimmer.MAX_DIM_LEVEL)], start_level=0,
+                         name='sunrise', clock=clock))
+    scheduler.add_job(
+        finish_sunrise,
+        'date',
+        id='sunrise_finish',
+        replace_existing=True,
+        run_date=clock.now() + timedelta(minutes=fade_duration),
+        args=[run]
+    )
+
+def finish_sunrise(run):
+    """Runs when the sunrise ramp has reached full brightness"""
+    recorder.mark_target(run, now=clock.time())
+    with _app.app_context():
+        schedule_next_alarm()
+
+def run_closed_loop_sunrise(fade_duration):
+    """Step the lux controller's target once a second through the fade"""
     total_steps = fade_duration * 60  # Convert minutes to seconds
     step_size = 100.0 / total_steps
     
-    # Gradually increase brightness
+    lux_controller.start()
     current_brightness = 0
     for _ in range(total_steps):
+        if not lux_controller.running:
+            break  # A manual change or another ramp took over
         current_brightness += step_size
-        dimmer.set_brightness(min(100, current_brightness))
-        time.sleep(1)  # Update every second
-    
-    # Ensure we reach 100% brightness
-    dimmer.set_brightness(100)
+        lux_controller.set_target(Config.LUX_TARGET * min(100, current_brightness) / 100,
+                                  min(100, current_brightness))
+        clock.sleep(1)  # Update every second
     
-    # Schedule the next alarm
-    schedule_next_alarm()
+    # Leave the light at whatever reached the target
+    lux_controller.stop()
+
+def get_wind_down():
+    """The evening wind-down settings"""
+    settings = dict(DEFAULT_WIND_DOWN)
+    settings.update(json.loads(SystemConfig.get_value('wind_down', '{}') or '{}'))
+    return settings
+
+def schedule_wind_down():
+    """(Re)schedule the daily wind-down from its settings"""
+    settings = get_wind_down()
+    if scheduler.get_job('wind_down'):
+        scheduler.remove_job('wind_down')
+    if settings['enabled']:
+        hour, minute = map(int, settings['time'].split(':'))
+        scheduler.add_job(start_wind_down, 'cron', id='wind_down', hour=hour, minute=minute,
+                          args=[settings['start_brightness'], settings['fade_minutes']])
+
+def start_wind_down(start_brightness, fade_minutes):
+    """Evening sunset: come on at start_brightness, then fade out and switch off"""
+    dimmer.run_ramp(Ramp([(2, percent_to_level(start_brightness)),
+                          (fade_minutes * 60, 0)], off_at_end=True, name='wind_down', clock=clock))
+
+def start_sleep_timer(fade_minutes, hold_minutes=0):
+    """Hold the current brightness, then fade to off"""
+    dimmer.run_ramp(Ramp([(hold_minutes * 60, dimmer.dim_level),
+                          (fade_minutes * 60, 0)], off_at_end=True, name='sleep_timer', clock=clock))
+
+def refresh_calendar_alarms():
+    """Pick up calendar changes and reschedule if the alarms moved"""
+    if calendar_alarms.refresh(clock.now()):
+        with _app.app_context():
+            schedule_next_alarm()
 
 def initialize_scheduler():
     """Initialize the scheduler system"""
+    global _app
+    _app = current_app._get_current_object()
+    
     # Start the scheduler if not already running
     if not scheduler.running:
         scheduler.start()
     
+    if calendar_alarms is not None:
+        calendar_alarms.refresh(clock.now())
+        scheduler.add_job(
+            refresh_calendar_alarms,
+            'interval',
+            id='calendar_refresh',
+            replace_existing=True,
+            minutes=Config.CALENDAR_REFRESH_MINUTES
+        )
+    
+    schedule_wind_down()
+    
     # Schedule the next alarm
     schedule_next_alarm()
\ No newline at end of file
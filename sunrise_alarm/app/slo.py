@@ -0,0 +1,92 @@
+"""
+Start-accuracy tracking for scheduled sunrises.
+
+Every run records when it was planned to start (alarm time minus fade
+duration), when start_sunrise actually ran, when the dimmer produced its
+first non-zero gate pulse and when the fade reached full brightness.
+Percentiles over the recent runs are served by /api/slo.
+"""
+import collections
+import math
+import threading
+import time
+from config import Config
+
+# Runs kept for the percentile summary
+MAX_RUNS = 200
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class StartLatencyRecorder:
+    def __init__(self, max_runs=MAX_RUNS, start_bound_ms=None):
+        self.runs = collections.deque(maxlen=max_runs)
+        self.start_bound_ms = start_bound_ms if start_bound_ms is not None else Config.SLO_START_BOUND_MS
+        self._lock = threading.Lock()
+
+    def begin(self, planned_start, fade_seconds, source='scheduler', now=None):
+        """
+        Record the start of a run and return it for the later marks.
+
+        planned_start and now are wall-clock epoch timestamps; now defaults
+        to the current time and is passed in when running on a simulated clock.
+        """
+        now = time.time() if now is None else now
+        run = {
+            'source': source,
+            'planned_start': planned_start,
+            'actual_start': now,
+            'fade_seconds': fade_seconds,
+            'start_delay_ms': round((now - planned_start) * 1000, 3),
+            'first_pulse_ms': None,
+            'time_to_target_s': None,
+        }
+        with self._lock:
+            self.runs.append(run)
+        return run
+
+    def mark_first_pulse(self, run):
+        """Called from the dimmer on the first gate pulse of the run"""
+        run['first_pulse_ms'] = round((time.time() - run['actual_start']) * 1000, 3)
+
+    def mark_target(self, run, now=None):
+        now = time.time() if now is None else now
+        run['time_to_target_s'] = round(now - run['actual_start'], 3)
+
+    def summary(self):
+        """Percentiles of each measurement over the recorded runs"""
+        with self._lock:
+            runs = list(self.runs)
+
+        result = {'runs': len(runs), 'start_bound_ms': self.start_bound_ms}
+        scheduled = [run for run in runs if run['source'] == 'scheduler']
+        delays = sorted(run['start_delay_ms'] for run in scheduled)
+        if delays:
+            within = sum(1 for delay in delays if abs(delay) <= self.start_bound_ms)
+            result['start_within_bound'] = round(within / len(delays), 4)
+
+        # How much longer than planned the fade took to reach full brightness
+        overruns = sorted(run['time_to_target_s'] - run['fade_seconds']
+                          for run in runs if run['time_to_target_s'] is not None)
+        pulses = sorted(run['first_pulse_ms'] for run in runs if run['first_pulse_ms'] is not None)
+
+        for name, values in (('start_delay_ms', delays), ('first_pulse_ms', pulses),
+                             ('fade_overrun_s', overruns)):
+            result[name] = {
+                'count': len(values),
+                'p50': percentile(values, 0.50),
+                'p90': percentile(values, 0.90),
+                'p99': percentile(values, 0.99),
+                'max': values[-1] if values else None,
+            }
+        result['recent'] = runs[-10:]
+        return result
+
+
+# Shared recorder for the scheduler and the API
+recorder = StartLatencyRecorder()
@@ -11,12 +11,79 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Opt-in sampling profiler at /debug/profile (logged-in users only)
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED') == '1'
+    PROFILER_MAX_SECONDS = 60
+    PROFILER_MAX_RATE_HZ = 1000
+    
+    # A scheduled sunrise that starts later than this counts against the start SLO
+    SLO_START_BOUND_MS = int(os.environ.get('SLO_START_BOUND_MS', 1000))
+    
+    # Seconds a logged-in user is served from memory before re-reading the DB
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    
     # GPIO Pin Definitions
     ZERO_CROSS_PIN = 17    # Input from zero-crossing detector
     GATE_PIN = 18          # Output to MOSFET gate
     
-    # Constants for 60Hz AC power
-    AC_HALF_CYCLE_US = 8333  # Microseconds for 60Hz (1/60/2 seconds)
+    # Initial half-cycle estimate for 60Hz AC power (1/60/2 seconds).
+    # The dimmer measures the real period from zero crossings, so this only
+    # matters until the tracker locks; 50Hz mains are detected automatically.
+    AC_HALF_CYCLE_US = int(os.environ.get('AC_HALF_CYCLE_US', 8333))
+    
+    # Zero-cross tracker loop gains (error is divided by 2**shift per edge)
+    ZC_PHASE_SHIFT = 4
+    ZC_PERIOD_SHIFT = 6
+    
+    # Zero-cross glitch filter
+    ZC_FILTER_ENABLED = os.environ.get('ZC_FILTER_ENABLED', '1') == '1'
+    ZC_MIN_INTERVAL_US = 6000        # Lockout after an accepted edge
+    ZC_MAJORITY_SAMPLES = 3          # Pin reads per edge, majority must be HIGH
+    ZC_OUTLIER_TOLERANCE_US = 1000   # Max distance from the predicted crossing
+    ZC_MAX_OUTLIER_RUN = 8           # Net outliers (minus accepted edges) before forcing a resync
+    ZC_OUTLIER_ARM_EDGES = 16        # Edges the tracker must hold lock before outliers are rejected
+    
+    # Closed-loop sunrise: track a target illuminance from a light sensor
+    LUX_CONTROL_ENABLED = os.environ.get('LUX_CONTROL_ENABLED') == '1'
+    LUX_SENSOR = os.environ.get('LUX_SENSOR', 'bh1750')  # 'bh1750' or 'simulated'
+    LUX_I2C_BUS = int(os.environ.get('LUX_I2C_BUS', 1))
+    LUX_I2C_ADDRESS = int(os.environ.get('LUX_I2C_ADDRESS', '0x23'), 16)
+    LUX_TARGET = float(os.environ.get('LUX_TARGET', 300))  # Lux at the end of the fade
+    LUX_KP = 0.05         # Brightness % per lux of error
+    LUX_KI = 0.02         # Brightness % per lux-second of accumulated error
+    LUX_MAX_RATE = 2.0    # Fastest correction, brightness % per second
+    LUX_INTERVAL = 0.5    # Seconds per control step
+    LUX_SAMPLES = 4       # Sensor readings averaged per step
+    
+    # Alarms from ICS calendars: wake this long before each day's first event
+    CALENDAR_FILES = [path for path in os.environ.get('CALENDAR_FILES', '').split(',') if path]
+    CALENDAR_WAKE_LEAD_MINUTES = int(os.environ.get('CALENDAR_WAKE_LEAD_MINUTES', 90))
+    CALENDAR_FADE_MINUTES = int(os.environ.get('CALENDAR_FADE_MINUTES', 30))
+    CALENDAR_WINDOW_DAYS = 14        # Recurrences are expanded this far ahead
+    CALENDAR_REFRESH_MINUTES = 15    # How often the files are checked for changes
     
     # Dimming parameters
-    MAX_DIM_LEVEL = 1000     # Maximum dimming level
\ No newline at end of file
+    MAX_DIM_LEVEL = 1000     # Maximum dimming level    
+    # Phase mode: dither between adjacent levels for 2**DITHER_BITS finer steps
+    DITHER_ENABLED = os.environ.get('DITHER_ENABLED', '1') == '1'
+    DITHER_BITS = 8
+    # Phase mode: below CYCLE_SKIP_BELOW (in dim levels) fire whole mains
+    # cycles at that level and skip others, instead of cutting the phase
+    CYCLE_SKIP_ENABLED = os.environ.get('CYCLE_SKIP_ENABLED') == '1'
+    CYCLE_SKIP_BELOW = int(os.environ.get('CYCLE_SKIP_BELOW', 60))
+    # Phase mode light effects (app/effects.py): waveform samples per second
+    # and the longest single loop an effect may compile to
+    EFFECT_SAMPLE_HZ = 100
+    EFFECT_MAX_SECONDS = 600
+    # Dimmer backend: 'phase' (zero-cross trailing edge) or 'pwm'
+    DIMMER_MODE = os.environ.get('DIMMER_MODE', 'phase')
+    
+    # PWM mode
+    PWM_FREQUENCY = int(os.environ.get('PWM_FREQUENCY', 60))
+    PWM_USE_HARDWARE = os.environ.get('PWM_USE_HARDWARE', '1') == '1'  # pigpio if available
+    PWM_MIN_DUTY = float(os.environ.get('PWM_MIN_DUTY', 10))   # Lowest duty without flicker
+    PWM_MAX_DUTY = float(os.environ.get('PWM_MAX_DUTY', 100))
+    # Duty ranges the driver flickers in, as "start-end,start-end"
+    # (e.g. "59-82" for the range pulser_1.py worked around)
+    PWM_DEAD_ZONES = [tuple(float(x) for x in zone.split('-'))
+                      for zone in os.environ.get('PWM_DEAD_ZONES', '').split(',') if zone]
@@ -1,6 +1,10 @@
 """
 Application entry point.
+
+For development: python run.py (set FLASK_DEBUG=1 for debug mode)
+For production:  gunicorn -c gunicorn.conf.py run:app
 """
+import os
 from app import create_app, db
 from app.models import User, AlarmSchedule, SystemConfig
 
@@ -16,4 +20,6 @@ def make_shell_context():
     }
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # The reloader would import the app twice and start a second dimmer
+    app.run(host='0.0.0.0', port=5000,
+            debug=os.environ.get('FLASK_DEBUG') == '1', use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,23 @@
+import os
+import sys
+import types
+
+import pytest
+
+# Tests always run against the GPIO stub, also on a Pi
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gpio_stub  # noqa: E402
+
+_rpi = types.ModuleType('RPi')
+_rpi.GPIO = gpio_stub
+sys.modules['RPi'] = _rpi
+sys.modules['RPi.GPIO'] = gpio_stub
+
+
+@pytest.fixture
+def gpio():
+    gpio_stub.reset()
+    yield gpio_stub
+    gpio_stub.reset()
@@ -0,0 +1,65 @@
+"""
+Stand-in for RPi.GPIO in the tests.
+
+The zero-cross input is derived from the real perf counter: it reads HIGH
+for the first ZC_PULSE_NS of every half-cycle of a mains_hz supply, so the
+dimmer thread sees rising edges exactly as it would on the Pi. Every
+output write is recorded, which lets tests rebuild the gate pulses.
+"""
+import time
+
+BCM, IN, OUT, LOW, HIGH = 11, 1, 0, 0, 1
+
+ZC_PULSE_NS = 1000000
+
+mains_hz = 60
+outputs = []  # (perf_counter_ns, pin, value)
+
+
+def reset(hz=60):
+    global mains_hz
+    mains_hz = hz
+    outputs.clear()
+
+
+def half_cycle_ns():
+    return 1000000000 // (2 * mains_hz)
+
+
+def input(pin):
+    return HIGH if time.perf_counter_ns() % half_cycle_ns() < ZC_PULSE_NS else LOW
+
+
+def output(pin, value):
+    outputs.append((time.perf_counter_ns(), pin, value))
+
+
+def pulses(pin):
+    """(start ns, width us) of every completed HIGH pulse on pin"""
+    result = []
+    high_at = None
+    for t, written_pin, value in list(outputs):
+        if written_pin != pin:
+            continue
+        if value and high_at is None:
+            high_at = t
+        elif not value and high_at is not None:
+            result.append((high_at, (t - high_at) // 1000))
+            high_at = None
+    return result
+
+
+def setwarnings(flag):
+    pass
+
+
+def setmode(mode):
+    pass
+
+
+def setup(pin, mode):
+    pass
+
+
+def cleanup(pins=None):
+    pass
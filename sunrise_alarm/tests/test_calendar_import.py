@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('dateutil')
+
+from app.calendar_import import CalendarAlarms  # noqa: E402
+
+# Daily 09:00 stand-up for five days, with the 2nd moved to 07:00,
+# the 3rd cancelled and the 4th moved to 11:00
+CALENDAR = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:standup@example.com
+DTSTART:20261102T090000
+RRULE:FREQ=DAILY;COUNT=5
+SUMMARY:Stand-up
+END:VEVENT
+BEGIN:VEVENT
+UID:standup@example.com
+RECURRENCE-ID:20261103T090000
+DTSTART:20261103T070000
+SUMMARY:Early stand-up
+END:VEVENT
+BEGIN:VEVENT
+UID:standup@example.com
+RECURRENCE-ID:20261104T090000
+DTSTART:20261104T090000
+STATUS:CANCELLED
+END:VEVENT
+BEGIN:VEVENT
+UID:standup@example.com
+RECURRENCE-ID:20261105T090000
+DTSTART:20261105T110000
+SUMMARY:Late stand-up
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def all_alarms(calendar, now):
+    alarms = []
+    while True:
+        alarm, alarm_time = calendar.next_alarm(now)
+        if alarm is None:
+            return alarms
+        alarms.append((alarm_time, alarm.summary))
+        now = alarm_time
+
+
+def test_recurrence_overrides_move_and_cancel_single_occurrences(tmp_path):
+    path = tmp_path / 'work.ics'
+    path.write_text(CALENDAR.replace('\n', '\r\n'))
+    calendar = CalendarAlarms(paths=[str(path)], window_days=14, lead_minutes=60, fade_minutes=30)
+    now = datetime(2026, 11, 1, 12, 0)
+    assert calendar.refresh(now)
+
+    assert all_alarms(calendar, now) == [
+        (datetime(2026, 11, 2, 8, 0), 'Stand-up'),
+        (datetime(2026, 11, 3, 6, 0), 'Early stand-up'),
+        # No alarm on the 4th: its only event was cancelled
+        (datetime(2026, 11, 5, 10, 0), 'Late stand-up'),
+        (datetime(2026, 11, 6, 8, 0), 'Stand-up'),
+    ]
+
+
+def event(start, summary, extra=''):
+    return f'BEGIN:VEVENT\nDTSTART:{start}\n{extra}SUMMARY:{summary}\nEND:VEVENT\n'
+
+
+def test_an_unreadable_date_skips_only_its_event(tmp_path):
+    path = tmp_path / 'work.ics'
+    path.write_text('BEGIN:VCALENDAR\n'
+                    + event('20261102T09', 'No minutes')
+                    + event('20261102T100000', 'Review')
+                    + event('20261103T080000', 'Bad exdate', 'RRULE:FREQ=DAILY\nEXDATE:2026-11-04\n')
+                    + event('20261103T093000', 'Planning', 'RECURRENCE-ID:20261103T9AM\n')
+                    + event('20261104T083000', 'Retro')
+                    + 'END:VCALENDAR\n')
+    calendar = CalendarAlarms(paths=[str(path)], window_days=14, lead_minutes=60, fade_minutes=30)
+    now = datetime(2026, 11, 1, 12, 0)
+    assert calendar.refresh(now)
+
+    assert all_alarms(calendar, now) == [
+        (datetime(2026, 11, 2, 9, 0), 'Review'),
+        (datetime(2026, 11, 4, 7, 30), 'Retro'),
+    ]
+
+
+def test_refresh_reports_only_changes_to_the_alarms(tmp_path):
+    path = tmp_path / 'work.ics'
+    first = event('20261102T090000', 'Stand-up')
+    path.write_text('BEGIN:VCALENDAR\n' + first + 'END:VCALENDAR\n')
+    calendar = CalendarAlarms(paths=[str(path)], window_days=14, lead_minutes=60, fade_minutes=30)
+    now = datetime(2026, 11, 1, 12, 0)
+    assert calendar.refresh(now)
+    assert not calendar.refresh(now)
+
+    # A later event the same day changes the file but not the alarms
+    path.write_text('BEGIN:VCALENDAR\n' + first + event('20261102T140000', 'Lunch talk') + 'END:VCALENDAR\n')
+    assert not calendar.refresh(now)
+    # An earlier one moves the alarm
+    path.write_text('BEGIN:VCALENDAR\n' + first + event('20261102T080000', 'Early call') + 'END:VCALENDAR\n')
+    assert calendar.refresh(now)
+    assert all_alarms(calendar, now) == [(datetime(2026, 11, 2, 7, 0), 'Early call')]
@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+
+import pytest
+
+from app.dimmer import DimmerController, cycle_skip, sigma_delta
+
+
+class RecordingDimmer(DimmerController):
+    """
+    DimmerController that records the dim level behind every pulse.
+
+    The gate still goes HIGH and LOW through the stub, but instead of
+    busy-waiting the pulse width is converted back into the level the
+    dimmer thread used for that half-cycle.
+    """
+    def __init__(self):
+        super().__init__()
+        self.levels = []
+        update = self.tracker.update
+
+        def tracked_update(edge_us):
+            self._crossing_us = update(edge_us)
+            return self._crossing_us
+        self.tracker.update = tracked_update
+
+    def wait_until_us(self, deadline_us):
+        delay_us = deadline_us - self._crossing_us
+        self.levels.append(round(delay_us * self.MAX_DIM_LEVEL / self.tracker.period_us))
+
+
+@pytest.fixture
+def dimmer(gpio):
+    dimmer = RecordingDimmer()
+    yield dimmer
+    dimmer.stop()
+
+
+def test_concurrent_writers_publish_whole_clamped_setpoints(dimmer, gpio):
+    # Each writer has its own values, including out-of-range ones that must clamp
+    writer_values = [[-20, 10, 30], [50, 70, 150], [15, 35, 55], [5, 65, 95]]
+    allowed = {max(0, min(100, value)) * dimmer.MAX_DIM_LEVEL // 100
+               for values in writer_values for value in values}
+    stop = threading.Event()
+
+    def writer(values):
+        while not stop.is_set():
+            dimmer.set_brightness(random.choice(values))
+            time.sleep(0)  # Contend like request threads, not a GIL-bound spin
+
+    dimmer.set_brightness(50)
+    dimmer.start()
+    threads = [threading.Thread(target=writer, args=(values,)) for values in writer_values]
+    for thread in threads:
+        thread.start()
+    time.sleep(1.0)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    dimmer.stop()
+
+    assert len(dimmer.levels) > 20
+    assert set(dimmer.levels) <= allowed
+    assert all(0 <= level <= dimmer.MAX_DIM_LEVEL for level in dimmer.levels)
+    # The gate always ends LOW and every pulse closed
+    assert gpio.outputs[-1][2] == gpio.LOW
+
+
+def test_start_and_stop_are_idempotent(dimmer):
+    dimmer.set_brightness(40)
+    dimmer.start()
+    thread = dimmer.thread
+    dimmer.start()
+    assert dimmer.thread is thread
+    assert dimmer.running
+
+    dimmer.stop()
+    dimmer.stop()
+    assert not dimmer.running
+    assert not thread.is_alive()
+
+    # A restart gets a fresh thread that really runs
+    dimmer.start()
+    assert dimmer.running and dimmer.thread is not thread
+
+
+@pytest.mark.parametrize('hz', [50, 60])
+def test_pulses_every_half_cycle_on_50_and_60hz(gpio, hz):
+    gpio.reset(hz)
+    dimmer = DimmerController()
+    dimmer.set_brightness(30)
+    dimmer.start()
+    time.sleep(1.0)
+    dimmer.stop()
+
+    status = dimmer.get_mains_status()
+    pulses = gpio.pulses(dimmer.GATE_PIN)
+    assert len(pulses) >= 0.9 * 2 * hz
+    assert status['nominal_hz'] == hz and status['locked']
+    assert status['rejected_outlier'] <= 2
+
+
+@pytest.mark.parametrize('fine_level', [1, 64, 128, 255, 2560 + 77, 100 * 256 - 1, 51 * 256 + 3])
+def test_sigma_delta_averages_to_the_fine_setpoint(fine_level):
+    fraction_bits = 8
+    dither = 0
+    total = 0
+    for half_cycle in range(1, 10 * 256 + 1):
+        dim_level, dither = sigma_delta(fine_level, dither, fraction_bits)
+        # Only the two levels either side of the setpoint are ever used
+        assert dim_level in (fine_level >> fraction_bits, (fine_level >> fraction_bits) + 1)
+        total += dim_level
+        # The running sum never drifts a whole level from the setpoint
+        assert abs((total << fraction_bits) - fine_level * half_cycle) < 1 << fraction_bits
+    # Exact over whole accumulator periods
+    assert total << fraction_bits == fine_level * 10 * 256
+
+
+def test_sigma_delta_is_a_no_op_without_fraction_bits():
+    assert sigma_delta(42, 0, 0) == (42, 0)
+
+
+
+@pytest.mark.parametrize('level', range(1, 60))
+def test_cycle_skip_spreads_fired_cycles_evenly(level):
+    fraction_bits = 8
+    burst_level = 60 << fraction_bits
+    # A level and a fraction, to check the sub-level setpoint is kept too
+    fine_level = (level << fraction_bits) + 77
+    accumulator = 0
+    fired = []
+    for cycle in range(60 * 256):
+        fire, accumulator = cycle_skip(fine_level, accumulator, burst_level)
+        if fire:
+            fired.append(cycle)
+
+    # Never more than the unavoidable gap between fired cycles
+    longest_gap = -(-burst_level // fine_level)
+    assert max(b - a for a, b in zip(fired, fired[1:])) <= longest_gap
+    assert fired[0] < longest_gap
+    # Exact average over a whole accumulator period
+    assert len(fired) * burst_level == fine_level * 60 * 256
+
+
+@pytest.mark.parametrize('level', [4, 20, 45])
+def test_cycle_skip_fires_whole_cycles(gpio, level):
+    dimmer = DimmerController()
+    dimmer.CYCLE_SKIP_BELOW = 60
+    dimmer.set_brightness(level / 10)
+    dimmer.start()
+    time.sleep(1.0)
+    dimmer.stop()
+
+    half_cycle_ns = gpio.half_cycle_ns()
+    half_cycles = [start // half_cycle_ns for start, _ in gpio.pulses(dimmer.GATE_PIN)]
+    assert half_cycles
+    # Both polarities conduct alike: only an edge lost mid-cycle can cut a pair
+    positive = sum(1 for half_cycle in half_cycles if half_cycle % 2 == 0)
+    assert abs(2 * positive - len(half_cycles)) <= dimmer.tracker.missed + 1
+    # Fired cycles are spread out: no gap beyond the level's share
+    gaps = [b - a for a, b in zip(half_cycles, half_cycles[1:])]
+    assert max(gaps, default=0) <= 2 * -(-60 // level) + dimmer.tracker.missed
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from app.dimmer import DimmerController
+from app.effects import Effect
+from app.ramp import Ramp
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.fixture
+def dimmer(gpio):
+    dimmer = DimmerController()
+    yield dimmer
+    dimmer.stop()
+
+
+def gate_writes_over(gpio, seconds):
+    before = len(gpio.outputs)
+    time.sleep(seconds)
+    return len(gpio.outputs) - before
+
+
+def test_idles_with_the_gate_static_at_0_and_100_percent(dimmer, gpio):
+    dimmer.set_brightness(0)
+    dimmer.start()
+    assert wait_for(lambda: dimmer.idle)
+    assert gpio.outputs[-1][2] == gpio.LOW
+    assert gate_writes_over(gpio, 0.1) == 0
+    assert dimmer.get_mains_status()['idle']
+
+    dimmer.set_brightness(100)
+    assert wait_for(lambda: dimmer.idle and gpio.outputs[-1][2] == gpio.HIGH)
+    assert gate_writes_over(gpio, 0.1) == 0
+
+
+@pytest.mark.parametrize('wake', ['set_brightness', 'run_ramp', 'play_effect'])
+def test_wakes_to_cut_the_phase_again(dimmer, gpio, wake):
+    dimmer.start()
+    assert wait_for(lambda: dimmer.idle)
+    if wake == 'set_brightness':
+        dimmer.set_brightness(50)
+    elif wake == 'run_ramp':
+        dimmer.run_ramp(Ramp([(10, 500)]))
+    else:
+        dimmer.play_effect(Effect([[10, 50]], start=50))
+    assert wait_for(lambda: not dimmer.idle)
+    # Pulsing every half-cycle again
+    pulses = len(gpio.pulses(dimmer.GATE_PIN))
+    time.sleep(0.1)
+    assert len(gpio.pulses(dimmer.GATE_PIN)) - pulses >= 8
+
+
+def test_stop_ends_an_idle_thread(dimmer, gpio):
+    dimmer.set_brightness(100)
+    dimmer.start()
+    assert wait_for(lambda: dimmer.idle)
+    thread = dimmer.thread
+    dimmer.stop()
+    assert not thread.is_alive() and not dimmer.idle
+    assert gpio.outputs[-1][2] == gpio.LOW
+
+
+@pytest.mark.parametrize('hold', ['ramp', 'effect'])
+def test_does_not_idle_at_0_while_a_ramp_or_effect_runs(dimmer, gpio, hold):
+    dimmer.start()
+    assert wait_for(lambda: dimmer.idle)
+    if hold == 'ramp':
+        # Holds at 0 for a while: the level is 0, but the ramp has to be evaluated
+        dimmer.run_ramp(Ramp([(0.3, 0), (0.2, 0)], start_level=0))
+    else:
+        dimmer.play_effect(Effect([[0.3, 0]], start=0, blend='scale'))
+    assert wait_for(lambda: not dimmer.idle)
+    time.sleep(0.2)
+    assert not dimmer.idle
+    # Back to idle once the ramp or effect is over
+    assert wait_for(lambda: dimmer.idle and dimmer.ramp is None and not dimmer.effects)
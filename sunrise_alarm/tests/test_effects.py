@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+from app.dimmer import DimmerController
+from app.effects import EASINGS, Effect
+from config import Config
+
+SECOND_NS = 1000000000
+
+
+@pytest.mark.parametrize('keyframes', [
+    [[1e7, 50]],
+    [[float('inf'), 50]],
+    [[Config.EFFECT_MAX_SECONDS / 2, 50]] * 3,
+    [[0.01, 10]] * (Config.EFFECT_MAX_SECONDS * Config.EFFECT_SAMPLE_HZ + 1),
+])
+def test_oversized_effects_are_refused_before_compiling(keyframes):
+    started = time.perf_counter()
+    with pytest.raises(ValueError, match='limited to'):
+        Effect(keyframes)
+    assert time.perf_counter() - started < 0.5
+
+
+@pytest.mark.parametrize('keyframe', [[float('nan'), 50], [-1, 50], [1, float('nan')], [1, 101]])
+def test_invalid_keyframes_are_refused(keyframe):
+    with pytest.raises(ValueError, match='keyframes need'):
+        Effect([keyframe])
+
+
+@pytest.mark.parametrize('start', [5000, -101, float('nan'), float('inf')])
+def test_out_of_range_start_is_refused(start):
+    with pytest.raises(ValueError, match='start needs'):
+        Effect([[1, 50]], start=start)
+
+
+def test_an_effect_of_exactly_the_limit_compiles():
+    effect = Effect([[Config.EFFECT_MAX_SECONDS / 2, 100], [Config.EFFECT_MAX_SECONDS / 2, 0]])
+    assert effect.duration == Config.EFFECT_MAX_SECONDS
+    assert max(effect.waveform) == Config.MAX_DIM_LEVEL
+
+
+@pytest.mark.parametrize('easing, quarter, half', [
+    ('linear', 250, 500),
+    ('ease_in', 62, 250),
+    ('ease_out', 437, 750),
+    ('ease_in_out', 146, 500),
+    ('step', 0, 0),
+])
+def test_easing_shapes(easing, quarter, half):
+    effect = Effect([[1, 100, easing], [1, 100]])
+    assert len(effect.waveform) == 2 * Config.EFFECT_SAMPLE_HZ
+    ramp = effect.waveform[:Config.EFFECT_SAMPLE_HZ]
+    assert ramp[0] == 0
+    # Samples truncate to whole levels, so allow one level of float error
+    assert abs(ramp[len(ramp) // 4] - quarter) <= 1
+    assert abs(ramp[len(ramp) // 2] - half) <= 1
+    assert list(ramp) == sorted(ramp)
+    # Every easing reaches the target at the keyframe
+    assert effect.waveform[Config.EFFECT_SAMPLE_HZ] == Config.MAX_DIM_LEVEL
+    assert EASINGS[easing](0) == 0
+
+
+def test_loops_zero_repeats_until_stopped():
+    effect = Effect([[0.1, 100], [0.1, 0]], loops=0)
+    assert effect.duration is None
+    effect.start(now_ns=0)
+    period = len(effect.waveform)
+    for second in (0, 1, 3600):
+        for index in (0, 5, period - 1):
+            now_ns = second * SECOND_NS + index * SECOND_NS // Config.EFFECT_SAMPLE_HZ
+            assert effect.sample_at(now_ns) == effect.waveform[index]
+
+    twice = Effect([[0.1, 100], [0.1, 0]], loops=2)
+    twice.start(now_ns=0)
+    assert twice.duration == 0.4
+    assert twice.sample_at(int(0.39 * SECOND_NS)) is not None
+    assert twice.sample_at(int(0.4 * SECOND_NS)) is None
+
+
+@pytest.fixture
+def dimmer(gpio):
+    dimmer = DimmerController()
+    yield dimmer
+    dimmer.stop()
+
+
+def layered(dimmer, percent):
+    """The dim level _layer_effects gives for a base brightness of percent"""
+    full_scale = dimmer.MAX_DIM_LEVEL << dimmer.FRACTION_BITS
+    return dimmer._layer_effects(dimmer.effects, dimmer._fine_level(percent), full_scale) >> dimmer.FRACTION_BITS
+
+
+def test_higher_priority_wins_and_the_lower_one_resumes(dimmer):
+    low = Effect([[10, 20]], start=20, name='low')
+    high = Effect([[0.5, 80]], start=80, priority=5, name='high')
+    dimmer.play_effect(low)
+    dimmer.play_effect(high)
+    dimmer.stop()
+    assert [effect.name for effect in dimmer.effects] == ['high', 'low']
+    assert layered(dimmer, 50) == 800
+
+    # Once the high priority effect has ended it is dropped, and the low one shows again
+    high.start(time.perf_counter_ns() - SECOND_NS)
+    assert layered(dimmer, 50) == 200
+    assert [effect.name for effect in dimmer.effects] == ['low']
+
+    # Equal priority: the newest one shows
+    newer = Effect([[10, 60]], start=60, name='newer')
+    dimmer.play_effect(newer)
+    dimmer.stop()
+    assert [effect.name for effect in dimmer.effects] == ['newer', 'low']
+    assert layered(dimmer, 50) == 600
+
+    dimmer.stop_effects('newer')
+    assert layered(dimmer, 50) == 200
+    dimmer.stop_effects()
+    assert dimmer.effects == () and layered(dimmer, 50) == 500
+
+
+@pytest.mark.parametrize('blend, sample, base, level', [
+    ('replace', 30, 80, 300),
+    ('replace', 0, 80, 0),
+    ('add', -20, 50, 300),
+    ('add', -20, 10, 0),         # Clamped at off
+    ('add', 80, 50, 1000),       # Clamped at full
+    ('scale', 50, 60, 300),
+    ('scale', 100, 60, 600),
+    ('scale', 0, 60, 0),
+])
+def test_blends_combine_the_sample_with_the_base(dimmer, blend, sample, base, level):
+    dimmer.play_effect(Effect([[10, sample]], start=sample, blend=blend))
+    dimmer.stop()
+    assert layered(dimmer, base) == level
@@ -0,0 +1,136 @@
+import time
+
+import pytest
+
+from app.dimmer import DimmerController
+from app.light_sensor import SimulatedLightSensor
+from app.lux_control import LuxController
+from app.ramp import Ramp
+
+DT = 0.5
+
+
+class DarkRoom:
+    def read(self):
+        return 0.0
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.fixture
+def dimmer(gpio):
+    dimmer = DimmerController()
+    yield dimmer
+    dimmer.stop()
+
+
+@pytest.fixture
+def lux(dimmer):
+    lux = LuxController(dimmer, DarkRoom(), kp=1.0, ki=0.0, max_rate=1000.0,
+                        interval=0.01, samples=1)
+    lux.set_target(100.0, 20.0)
+    lux.start()
+    # The loop is driving the dimmer
+    assert wait_for(lambda: dimmer.get_brightness_percent() > 20)
+    yield lux
+    lux.stop()
+
+
+def test_loop_stops_for_a_manual_setpoint(dimmer, lux):
+    dimmer.set_brightness(5)
+    assert wait_for(lambda: not lux.running)
+    assert lux.overridden
+    time.sleep(0.05)
+    assert dimmer.get_brightness_percent() == pytest.approx(5, abs=0.01)
+
+
+def test_loop_stops_for_a_sleep_timer_ramp(dimmer, lux):
+    ramp = Ramp([(60, 0)], off_at_end=True, name='sleep_timer')
+    dimmer.run_ramp(ramp)
+    assert wait_for(lambda: not lux.running)
+    assert lux.overridden
+    time.sleep(0.05)
+    assert dimmer.ramp is ramp
+
+
+def test_loop_keeps_control_while_nobody_else_writes(dimmer, lux):
+    time.sleep(0.1)
+    assert lux.running and not lux.overridden
+    assert lux.get_status()['output_percent'] == 100
+
+
+@pytest.fixture
+def plant(dimmer):
+    """A PI loop with the configured gains, stepped by hand against a noiseless simulated room"""
+    sensor = SimulatedLightSensor(dimmer, max_lux=400.0, ambient=5.0, noise=0.0)
+    controller = LuxController(dimmer, sensor)
+
+    def run(steps):
+        outputs = []
+        for _ in range(steps):
+            outputs.append(controller.step(sensor.read(), DT))
+            dimmer.set_brightness(outputs[-1])
+        return outputs
+    return controller, sensor, run
+
+
+def test_step_converges_on_the_target(dimmer, plant):
+    controller, sensor, run = plant
+    # The feedforward guess is well off; the integral has to make up the rest
+    controller.set_target(200.0, 40.0)
+    controller.output = 40.0
+    dimmer.set_brightness(40.0)
+    run(300)
+    assert sensor.read() == pytest.approx(200.0, abs=2.0)
+    # Settled: further steps barely move the output
+    assert max(run(20)) - min(run(20)) < 0.2
+
+
+def test_step_never_moves_faster_than_max_rate(dimmer, plant):
+    controller, sensor, run = plant
+    controller.set_target(300.0, 0.0)
+    outputs = [controller.output] + run(100)
+    # A target step down later must be rate limited too
+    controller.set_target(20.0, 0.0)
+    outputs += run(100)
+    steps = [abs(b - a) for a, b in zip(outputs, outputs[1:])]
+    assert max(steps) <= controller.max_rate * DT + 1e-9
+    # It did have to slew: the limit was reached
+    assert max(steps) == pytest.approx(controller.max_rate * DT)
+
+
+def test_integral_holds_while_the_output_is_pinned_at_full(dimmer, plant):
+    controller, sensor, run = plant
+    # More light than the lamp can make: the output pins at 100%
+    controller.set_target(1000.0, 80.0)
+    run(100)
+    assert controller.output == 100
+    integral = controller._integral
+    run(100)
+    assert controller._integral == integral
+    # No wound-up integral to unwind: a reachable target brings it straight down
+    controller.set_target(100.0, 50.0)
+    outputs = run(40)
+    assert all(b < a for a, b in zip([100.0] + outputs[:10], outputs[:10]))
+
+
+def test_integral_holds_while_the_output_is_pinned_at_off(dimmer, plant):
+    controller, sensor, run = plant
+    # Daylight alone is brighter than the target: the output pins at 0%
+    sensor.ambient = 500.0
+    controller.set_target(100.0, 20.0)
+    controller.output = 20.0
+    run(100)
+    assert controller.output == 0
+    integral = controller._integral
+    run(100)
+    assert controller._integral == integral
+    # When the daylight goes, the lamp comes back up without delay
+    sensor.ambient = 5.0
+    outputs = run(10)
+    assert all(b > a for a, b in zip([0.0] + outputs, outputs))
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from app.clock import VirtualClock
+from app.ramp import Ramp
+
+SECOND_NS = 1000000000
+
+
+def started(segments, start_level=0, **kwargs):
+    ramp = Ramp(segments, start_level=start_level, **kwargs)
+    ramp.start(None, now_ns=0)
+    return ramp
+
+
+def test_level_follows_up_down_and_hold_segments():
+    # Up to 100 in 10 s, hold for 5 s, down to 20 in 4 s
+    ramp = started([(10, 100), (5, 100), (4, 20)])
+    assert ramp.duration == 19
+    expected = {0: 0, 2.5: 25, 9.99: 99, 10: 100, 12: 100, 15: 100, 16: 80, 18: 40, 19: 20, 60: 20}
+    for seconds, level in expected.items():
+        assert ramp.level_at(int(seconds * SECOND_NS)) == level, seconds
+    assert ramp.done and ramp.final_level == 20
+
+
+def test_level_keeps_the_fraction_below_one_level():
+    ramp = started([(10, 1000)])
+    assert ramp.level_at(SECOND_NS // 3, fraction_bits=8) == (100 << 8) // 3
+    assert ramp.level_at(SECOND_NS, fraction_bits=8) == 100 << 8
+
+
+def test_zero_length_segments_jump_and_an_empty_ramp_is_done_at_once():
+    ramp = started([(0, 300), (10, 0)])
+    assert ramp.level_at(0) == 300
+    assert ramp.level_at(5 * SECOND_NS) == 150
+
+    empty = Ramp([], start_level=None)
+    empty.start(70, now_ns=0)
+    assert empty.done and empty.final_level == 70
+
+
+def test_off_at_end_finishes_at_zero_after_holding():
+    # Sleep timer: hold at 400 for 60 s, then fade out over 30 s and switch off
+    ramp = started([(60, 400), (30, 0)], start_level=400, off_at_end=True)
+    assert ramp.level_at(59 * SECOND_NS) == 400
+    assert not ramp.done
+    assert ramp.level_at(75 * SECOND_NS) == 200
+    assert ramp.level_at(90 * SECOND_NS) == 0
+    assert ramp.done and ramp.final_level == 0
+
+    # Off at the end even when the last segment does not reach zero
+    assert started([(1, 500)], off_at_end=True).final_level == 0
+
+
+def test_next_change_is_the_next_whole_level_or_the_end_of_a_hold():
+    up = started([(10, 100)])
+    # One level every 0.1 s
+    assert up.next_change_ns(0) == SECOND_NS // 10
+    assert up.level_at(up.next_change_ns(0)) == 1
+    assert up.level_at(up.next_change_ns(0) - 1) == 0
+
+    down = started([(10, 0)], start_level=100)
+    now_ns = 5 * SECOND_NS + 1
+    change = down.next_change_ns(now_ns)
+    assert down.level_at(change) == down.level_at(now_ns) - 1
+    assert down.level_at(change - 1) == down.level_at(now_ns)
+
+    # One level per wake-up all the way down, plus a last one at the end
+    levels = [down.level_at(0)]
+    now_ns = 0
+    while (now_ns := down.next_change_ns(now_ns)) is not None:
+        levels.append(down.level_at(now_ns))
+    assert levels == list(range(100, -1, -1)) + [0]
+
+    # A hold wakes once, at its end
+    hold = started([(10, 50), (5, 0)], start_level=50)
+    assert hold.next_change_ns(SECOND_NS) == 10 * SECOND_NS
+    assert hold.next_change_ns(20 * SECOND_NS) is None
+
+
+def test_ramp_runs_on_the_clock_it_is_given():
+    clock = VirtualClock(datetime(2024, 3, 10, 1, 0), tz='America/New_York')
+    ramp = Ramp([(3600, 1000)], start_level=0, clock=clock)
+    ramp.start(None)
+    assert ramp.level_at(ramp.now_ns()) == 0
+    # An hour across the spring-forward change is still an hour of ramp
+    clock.sleep(1800)
+    assert ramp.level_at(ramp.now_ns()) == 500
+    assert ramp.progress() == (1800, 3600)
+    clock.sleep(1800)
+    assert ramp.level_at(ramp.now_ns()) == 1000 and ramp.done
@@ -0,0 +1,203 @@
+import importlib
+import json
+from datetime import date, datetime, time
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('apscheduler')
+pytest.importorskip('zoneinfo')
+
+from flask import Flask  # noqa: E402
+
+from app import db  # noqa: E402
+from app.clock import VirtualClock  # noqa: E402
+from app.models import AlarmSchedule, SystemConfig  # noqa: E402
+from app.slo import StartLatencyRecorder  # noqa: E402
+
+# The app.scheduler module; app.scheduler as a package attribute is the APScheduler instance
+alarm_scheduler = importlib.import_module('app.scheduler')
+
+TZ = 'America/New_York'
+# APScheduler wakes a little after run_date; the harness adds this much
+DISPATCH_LATENCY_S = 0.2
+
+
+class FakeDimmer:
+    MAX_DIM_LEVEL = 100
+
+    def __init__(self):
+        self.ramps = []
+        self.on_first_pulse = None
+        self.dim_level = 0
+
+    def set_brightness(self, percent):
+        return percent
+
+    def start(self):
+        pass
+
+    def run_ramp(self, ramp):
+        ramp.start(self.dim_level)
+        self.ramps.append(ramp)
+
+
+class FakeScheduler:
+    """Keeps the one-shot jobs and runs them in run_date order on the virtual clock"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.jobs = {}
+        self.cron = {}  # Daily jobs: id -> (cron fields, func, args)
+        # Extra dispatch delay (s) for the sunrise job on a given date
+        self.late = {}
+
+    def add_job(self, func, trigger, id=None, replace_existing=False, run_date=None, args=(), **fields):
+        if trigger == 'cron':
+            self.cron[id] = (fields, func, args)
+        else:
+            self.jobs[id] = (run_date, func, args)
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id) or self.cron.get(job_id)
+
+    def remove_job(self, job_id):
+        self.jobs.pop(job_id, None)
+        self.cron.pop(job_id, None)
+
+    def run_next(self):
+        job_id = min(self.jobs, key=lambda name: self.jobs[name][0])
+        run_date, func, args = self.jobs.pop(job_id)
+        # Fire when the zone's local time reaches run_date, like APScheduler
+        due = run_date.replace(tzinfo=self.clock.tz).timestamp()
+        latency = DISPATCH_LATENCY_S
+        if job_id == 'sunrise':
+            latency += self.late.get(run_date.date(), 0)
+        self.clock.sleep_until(due + latency)
+        func(*args)
+
+
+@pytest.fixture
+def virtual_schedule(monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    # Monday 2024-03-04; US clocks spring forward early on Sunday 2024-03-10
+    clock = VirtualClock(datetime(2024, 3, 4, 12, 0), tz=TZ)
+    jobs = FakeScheduler(clock)
+    recorder = StartLatencyRecorder(start_bound_ms=1000)
+    monkeypatch.setattr(alarm_scheduler, 'clock', clock)
+    monkeypatch.setattr(alarm_scheduler, 'scheduler', jobs)
+    monkeypatch.setattr(alarm_scheduler, 'recorder', recorder)
+    monkeypatch.setattr(alarm_scheduler, 'dimmer', FakeDimmer())
+    monkeypatch.setattr(alarm_scheduler, 'lux_controller', None)
+    monkeypatch.setattr(alarm_scheduler, 'calendar_alarms', None)
+    monkeypatch.setattr(alarm_scheduler, '_app', app)
+
+    with app.app_context():
+        db.create_all()
+        for day in range(7):
+            db.session.add(AlarmSchedule(day_of_week=day, enabled=True,
+                                         alarm_time=time(7, 0), fade_duration=30))
+        db.session.commit()
+        yield clock, jobs, recorder
+        db.drop_all()
+
+
+def run_week(clock, jobs):
+    alarm_scheduler.schedule_next_alarm()
+    dimmer = alarm_scheduler.dimmer
+    # Seven sunrises, each followed by its finish job, which schedules the next
+    for _ in range(7):
+        jobs.run_next()
+        # The ramp runs on the virtual clock: halfway through the fade it
+        # is at half brightness, and full when the finish job runs
+        ramp = dimmer.ramps[-1]
+        clock.sleep(15 * 60)
+        assert ramp.level_at(ramp.now_ns()) == FakeDimmer.MAX_DIM_LEVEL // 2
+        jobs.run_next()
+        assert ramp.level_at(ramp.now_ns()) == FakeDimmer.MAX_DIM_LEVEL and ramp.done
+    assert clock.now().date() == datetime(2024, 3, 11).date()
+
+
+def test_sunrise_start_delay_stays_within_bound_across_dst(virtual_schedule):
+    clock, jobs, recorder = virtual_schedule
+    run_week(clock, jobs)
+
+    runs = list(recorder.runs)
+    assert len(runs) == 7
+    for run in runs:
+        assert run['source'] == 'scheduler'
+        # Planned for 06:30 local time, also after the DST change; a plan
+        # computed in the wrong zone would be an hour off the dispatch
+        assert datetime.fromtimestamp(run['planned_start'], clock.tz).time() == time(6, 30)
+        assert abs(run['start_delay_ms'] - DISPATCH_LATENCY_S * 1000) < 1
+
+    # Every sunrise ramps to full brightness over the alarm's fade
+    for ramp in alarm_scheduler.dimmer.ramps:
+        assert ramp.duration == 30 * 60 and ramp.final_level == FakeDimmer.MAX_DIM_LEVEL
+
+    summary = recorder.summary()
+    assert summary['start_within_bound'] == 1.0
+    assert summary['start_delay_ms']['p99'] <= recorder.start_bound_ms
+
+
+def test_a_late_dispatch_counts_against_the_start_bound(virtual_schedule):
+    clock, jobs, recorder = virtual_schedule
+    # The sunrise on the spring-forward day starts 1.5 s late
+    jobs.late[date(2024, 3, 10)] = 1.5
+    run_week(clock, jobs)
+
+    late = [run for run in recorder.runs if run['start_delay_ms'] > recorder.start_bound_ms]
+    assert len(late) == 1
+    assert datetime.fromtimestamp(late[0]['planned_start'], clock.tz).date() == date(2024, 3, 10)
+    assert late[0]['start_delay_ms'] == pytest.approx(1700, abs=1)
+
+    summary = recorder.summary()
+    assert summary['start_within_bound'] == round(6 / 7, 4)
+    assert summary['start_delay_ms']['max'] == pytest.approx(1700, abs=1)
+    assert summary['start_delay_ms']['p50'] == pytest.approx(200, abs=1)
+
+
+def test_wind_down_is_scheduled_daily_and_fades_out_on_the_clock(virtual_schedule):
+    clock, jobs, recorder = virtual_schedule
+    dimmer = alarm_scheduler.dimmer
+    SystemConfig.set_value('wind_down', json.dumps(
+        {'enabled': True, 'time': '21:45', 'start_brightness': 40, 'fade_minutes': 20}))
+    alarm_scheduler.schedule_wind_down()
+    fields, func, args = jobs.cron['wind_down']
+    assert fields == {'hour': 21, 'minute': 45} and args == [40, 20]
+
+    func(*args)
+    ramp = dimmer.ramps[-1]
+    assert ramp.name == 'wind_down' and ramp.off_at_end
+    # Comes on at 40% within two seconds, then fades out over the 20 minutes
+    clock.sleep(2)
+    assert ramp.level_at(ramp.now_ns()) == 40
+    clock.sleep(10 * 60)
+    assert ramp.level_at(ramp.now_ns()) == 20
+    clock.sleep(10 * 60)
+    assert ramp.level_at(ramp.now_ns()) == 0 and ramp.done
+
+    # Disabling it removes the daily job
+    SystemConfig.set_value('wind_down', json.dumps({'enabled': False}))
+    alarm_scheduler.schedule_wind_down()
+    assert 'wind_down' not in jobs.cron
+
+
+def test_sleep_timer_holds_then_fades_to_off(virtual_schedule):
+    clock, jobs, recorder = virtual_schedule
+    dimmer = alarm_scheduler.dimmer
+    dimmer.dim_level = 60
+    alarm_scheduler.start_sleep_timer(fade_minutes=10, hold_minutes=5)
+    ramp = dimmer.ramps[-1]
+    assert ramp.name == 'sleep_timer' and ramp.off_at_end
+
+    clock.sleep(5 * 60 - 1)
+    assert ramp.level_at(ramp.now_ns()) == 60
+    clock.sleep(1 + 5 * 60)
+    assert ramp.level_at(ramp.now_ns()) == 30
+    clock.sleep(5 * 60)
+    assert ramp.level_at(ramp.now_ns()) == 0 and ramp.done
@@ -0,0 +1,120 @@
+import random
+
+from app.zero_cross import ZeroCrossTracker, EdgeFilter, LOCK_EDGES
+
+
+def edges(half_cycle_us, count, jitter_us=0, start_us=1000000, seed=1):
+    rng = random.Random(seed)
+    return [start_us + n * half_cycle_us + rng.randint(0, jitter_us) for n in range(count)]
+
+
+def test_locks_on_60hz_only_after_several_consistent_edges():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    for n, edge in enumerate(edges(8333, 200, jitter_us=100)):
+        tracker.update(edge)
+        if n < LOCK_EDGES:
+            assert not tracker.locked
+    assert tracker.locked
+    assert tracker.nominal_hz == 60
+    assert abs(tracker.period_us - 8333) < 20
+
+
+def test_acquires_50hz_from_the_60hz_estimate():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    stream = edges(10000, 200, jitter_us=100)
+    tracker.update(stream[0])
+    tracker.update(stream[1])
+    # 1667 us off the 60 Hz prediction is outside the lock window
+    assert not tracker.locked
+    assert tracker.resyncs == 1
+
+    for edge in stream[2:]:
+        tracker.update(edge)
+    assert tracker.locked
+    assert tracker.nominal_hz == 50
+    assert abs(tracker.period_us - 10000) < 20
+    assert tracker.resyncs == 1
+
+
+def test_late_edge_is_timed_from_the_predicted_crossing():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    stream = edges(8333, 50)
+    for edge in stream:
+        tracker.update(edge)
+    on_time = stream[-1] + 8333
+    crossing = tracker.update(on_time + 400)  # Seen 400 us late
+    assert crossing < on_time + 400
+    assert abs(crossing - on_time) <= 400 // 2
+
+
+def test_missed_crossings_are_skipped_without_losing_lock():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    stream = edges(8333, 60)
+    for edge in stream[:30] + stream[33:]:
+        tracker.update(edge)
+    assert tracker.locked
+    assert tracker.missed == 3
+    assert tracker.resyncs == 0
+
+
+def filtered(stream, tracker, edge_filter):
+    accepted = 0
+    for edge in stream:
+        if edge_filter.accept(edge, lambda: 1):
+            tracker.update(edge)
+            accepted += 1
+    return accepted
+
+
+def test_filter_does_not_reject_50hz_edges_while_acquiring():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    edge_filter = EdgeFilter(tracker)
+    accepted = filtered(edges(10000, 200, jitter_us=100), tracker, edge_filter)
+    assert accepted == 200
+    assert edge_filter.rejected_outlier == 0
+    assert tracker.locked and tracker.nominal_hz == 50
+
+
+def test_filter_switches_to_a_changed_frequency():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    edge_filter = EdgeFilter(tracker)
+    first = edges(8333, 100)
+    filtered(first, tracker, edge_filter)
+    assert tracker.locked and tracker.nominal_hz == 60
+
+    # The supply moves to 50 Hz (e.g. a generator takes over)
+    accepted = filtered(edges(10000, 200, start_us=first[-1] + 10000), tracker, edge_filter)
+    assert tracker.locked and tracker.nominal_hz == 50
+    assert abs(tracker.period_us - 10000) < 20
+    assert accepted > 180
+
+
+def test_filter_forced_resync_follows_a_phase_jump():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    edge_filter = EdgeFilter(tracker)
+    first = edges(10000, 100)
+    filtered(first, tracker, edge_filter)
+    assert edge_filter.armed()
+
+    # Every later edge is 4 ms off the prediction, so each one is an outlier
+    # until the filter gives up on the prediction
+    second = edges(10000, 100, start_us=first[-1] + 14000)
+    accepted = filtered(second, tracker, edge_filter)
+    assert edge_filter.forced_resyncs == 1
+    assert edge_filter.rejected_outlier == edge_filter.max_outlier_run
+    assert accepted == 100 - edge_filter.max_outlier_run
+    assert tracker.locked and abs(tracker.period_us - 10000) < 20
+    assert abs(tracker.next_crossing_us - (second[-1] + 10000)) < 50
+
+
+def test_filter_rejects_glitches_once_armed():
+    tracker = ZeroCrossTracker(initial_period_us=8333)
+    edge_filter = EdgeFilter(tracker)
+    stream = edges(10000, 100)
+    filtered(stream, tracker, edge_filter)
+    assert edge_filter.armed()
+
+    glitch = stream[-1] + 10000 + 4000  # Between two crossings
+    assert not edge_filter.accept(glitch, lambda: 1)
+    assert edge_filter.rejected_outlier == 1
+    assert filtered([stream[-1] + 20000], tracker, edge_filter) == 1
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The controller scripts import RPi.GPIO; tests always use the stand-in
+import simulate  # noqa: E402
+
+simulate._simulated_gpio()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so config, plan and log files stay out of the repo"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,36 @@
+import time
+
+from alarm_plan import AlarmPlan, HOLD_SECONDS, compile_plan
+import alarm_runtime
+
+MAX_LEVEL = 1000
+
+
+def mapped_plan(alarms, path='plan.bin'):
+    compile_plan(alarms, MAX_LEVEL, path)
+    return AlarmPlan(path)
+
+
+def test_alarm_end_covers_ramp_hold_and_off(workdir):
+    alarm = time.time() + 3600
+    plan = mapped_plan([(alarm, 30, MAX_LEVEL, 1)])
+    end = alarm + HOLD_SECONDS
+    assert plan.alarm_end(alarm - 600) == end  # Mid-ramp
+    assert plan.alarm_end(alarm + 60) == end   # During the hold
+    assert plan.alarm_end(alarm - 7200) is None
+    assert plan.alarm_end(end + 1) is None
+    plan.close()
+
+
+def test_manual_override_lasts_through_the_hold(workdir):
+    # A sunrise that is half-way through its 30 minute ramp
+    alarm = time.time() + 900
+    runtime = alarm_runtime.ControllerRuntime(gate=False)
+    runtime.plan = mapped_plan([(alarm, 30, MAX_LEVEL, 1)])
+
+    runtime.turn_off_light()
+    assert runtime.override_until == alarm + HOLD_SECONDS
+    # The hold at full brightness starts at the alarm time; it must stay overridden
+    assert runtime.plan.level_at(alarm + 0.5) == MAX_LEVEL
+    assert alarm + 0.5 < runtime.override_until
+    runtime.plan.close()
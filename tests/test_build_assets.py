@@ -0,0 +1,52 @@
+import build_assets
+
+
+def test_css_keeps_descendant_pseudo_selectors():
+    source = '/* menu */\nnav a :hover ,\n.item > span {\n    color : red;\n    margin: 0 auto;\n}\n'
+    assert build_assets.minify_css(source) == 'nav a :hover,.item>span{color :red;margin:0 auto}'
+
+
+def test_js_drops_comments_and_indentation():
+    source = ('/* header\n   comment */\n'
+              'function f() {\n'
+              '    // explain\n'
+              '    const url = "http://example.com/*";  // a line comment after code stays\n'
+              '\n'
+              '    return url;\n'
+              '}\n')
+    assert build_assets.minify_js(source) == (
+        'function f() {\n'
+        'const url = "http://example.com/*";  // a line comment after code stays\n'
+        'return url;\n'
+        '}\n')
+
+
+def test_js_keeps_multi_line_template_literals_verbatim():
+    source = ('    const html = `<ul>\n'
+              '        <li>${name}</li>  \n'
+              '\n'
+              '        // not a comment\n'
+              '    </ul>`;\n'
+              '    const tick = `\\`` + `a`;\n'
+              '    render(html);\n')
+    assert build_assets.minify_js(source) == (
+        'const html = `<ul>\n'
+        '        <li>${name}</li>  \n'
+        '\n'
+        '        // not a comment\n'
+        '    </ul>`;\n'
+        'const tick = `\\`` + `a`;\n'
+        'render(html);\n')
+
+
+def test_build_writes_fingerprinted_assets(workdir):
+    (workdir / 'static' / 'js').mkdir(parents=True)
+    (workdir / 'static' / 'style.css').write_text('body {\n    margin: 0;\n}\n')
+    (workdir / 'static' / 'js' / 'index.js').write_text('// app\nstart();\n')
+
+    sizes = build_assets.build()
+    manifest = (workdir / 'static' / 'dist' / 'manifest.json').read_text()
+    assert set(sizes) == {'style.css', 'js/index.js'}
+    for name in sizes:
+        assert name.rsplit('.', 1)[0] in manifest
+    assert sizes['js/index.js']['min'] == len('start();\n')
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+import pytest
+
+import clock
+from clock import VirtualClock
+
+pytest.importorskip('zoneinfo')
+
+
+def test_skipped_local_times_land_an_hour_later():
+    # US clocks spring forward at 02:00 on 2026-03-08
+    virtual = VirtualClock(datetime(2026, 3, 7), 'America/New_York')
+    before = virtual.timestamp(datetime(2026, 3, 8, 1, 59))
+    assert virtual.timestamp(datetime(2026, 3, 8, 2, 30)) == before + 31 * 60
+    assert virtual.timestamp(datetime(2026, 3, 8, 3, 30)) == before + 31 * 60
+
+
+def test_sleep_advances_local_time_across_the_transition():
+    virtual = VirtualClock(datetime(2026, 3, 8, 1, 30), 'America/New_York')
+    virtual.sleep(3600)
+    assert virtual.now() == datetime(2026, 3, 8, 3, 30)
+    assert virtual.perf_counter_ns() == int(virtual.time() * 1e9)
+    assert isinstance(clock.SystemClock().perf_counter_ns(), int)
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+
+import event_log
+from clock import VirtualClock
+
+
+def test_default_query_stays_in_memory(workdir, monkeypatch):
+    log = event_log.EventLog(path='events.log', buffer_size=8)
+    for level in range(20):
+        log.record(event_log.BRIGHTNESS, level=level)
+        log.flush()
+
+    def no_disk():
+        raise AssertionError('query without since read the log files')
+    monkeypatch.setattr(log, '_read_files', no_disk)
+    events = log.query(event_type=event_log.BRIGHTNESS)
+    assert [event['level'] for event in events] == list(range(12, 20))
+
+
+def test_explicit_since_reads_the_rotated_files(workdir):
+    log = event_log.EventLog(path='events.log', buffer_size=8, max_bytes=200)
+    start = time.time()
+    for level in range(20):
+        log.record(event_log.BRIGHTNESS, level=level)
+        log.flush()
+    events = log.query(since=start, event_type=event_log.BRIGHTNESS)
+    levels = [event['level'] for event in events]
+    assert levels == sorted(levels) and levels[-1] == 19
+    assert len(levels) > 8  # More than the buffer holds
+
+
+def test_events_carry_the_injected_clock(workdir):
+    clock = VirtualClock(datetime(2026, 3, 5, 6, 0))
+    log = event_log.EventLog(path='events.log', clock=clock)
+    start = clock.time()
+    log.record(event_log.ALARM_START, source='plan')
+    clock.sleep(1800)
+    log.record(event_log.ALARM_END, source='plan')
+    log.flush()
+
+    assert [event['t'] for event in log.query()] == [start, start + 1800]
+    events = log.query(since=start, until=start + 60)
+    assert [event['e'] for event in events] == [event_log.ALARM_START]
+    # An older since goes through the flushed file and finds the same events
+    assert len(log.query(since=start - 86400)) == 2
@@ -0,0 +1,151 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import alarm_runtime
+from fleet import Fleet, FleetNode, SimulatedController
+
+TIMEOUT = 0.5
+
+
+@pytest.mark.parametrize('host', ['0.0.0.0', '', '::', '192.168.1.20', 'lumenator.local'])
+def test_runtime_refuses_an_open_address_without_a_token(host):
+    with pytest.raises(ValueError, match='needs a token'):
+        alarm_runtime.ControllerRuntime(host=host, gate=False)
+    assert alarm_runtime.ControllerRuntime(host=host, gate=False, token='secret').token == 'secret'
+
+
+@pytest.mark.parametrize('host', ['127.0.0.1', 'localhost', '::1'])
+def test_runtime_listens_on_loopback_without_a_token(host):
+    assert alarm_runtime.ControllerRuntime(host=host, gate=False).token is None
+
+
+async def talk(port, token):
+    node = FleetNode('node', '127.0.0.1', port, token=token, timeout=5)
+    try:
+        return await node.request({'cmd': 'status'})
+    finally:
+        await node.close()
+
+
+def test_fleet_node_needs_the_controllers_token():
+    async def main():
+        controller = SimulatedController(token='secret')
+        port = await controller.start()
+        try:
+            return await talk(port, 'secret'), await talk(port, 'wrong'), await talk(port, None)
+        finally:
+            controller.server.close()
+            await controller.server.wait_closed()
+
+    good, wrong, missing = asyncio.run(main())
+    assert good['ok'] and good['status']['alarm_time'] == '07:00'
+    assert wrong == {'ok': False, 'error': 'Invalid token'}
+    assert missing == {'ok': False, 'error': 'Invalid token'}
+
+
+def test_runtime_answers_the_fleet_only_with_its_token(workdir):
+    runtime = alarm_runtime.ControllerRuntime(port=0, gate=False, token='secret')
+
+    async def main():
+        serving = asyncio.get_running_loop().create_task(runtime.run())
+        while runtime.server is None:
+            await asyncio.sleep(0.01)
+        port = runtime.server.sockets[0].getsockname()[1]
+        try:
+            return await talk(port, 'secret'), await talk(port, 'wrong')
+        finally:
+            runtime.stop_event.set()
+            await serving
+
+    good, wrong = asyncio.run(main())
+    assert good['ok'] and good['status']['dim_level'] == 0
+    assert wrong == {'ok': False, 'error': 'Invalid token'}
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fleet():
+    """Three fast simulated controllers, one slower than the timeout and one that is down"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    controllers = {f'fast{index}': SimulatedController(delay=0.01, token='secret') for index in range(3)}
+    controllers['slow'] = SimulatedController(delay=TIMEOUT * 3, token='secret')
+
+    async def start():
+        return {name: await controller.start() for name, controller in controllers.items()}
+
+    ports = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    nodes = [{'name': name, 'host': '127.0.0.1', 'port': port, 'token': 'secret'}
+             for name, port in ports.items()]
+    nodes.append({'name': 'offline', 'host': '127.0.0.1', 'port': unused_port()})
+    fleet = Fleet(nodes, timeout=TIMEOUT)
+    yield fleet, controllers
+    fleet.close()
+
+    async def stop():
+        for controller in controllers.values():
+            controller.server.close()
+        # The slow controller may still be sitting on an answer
+        for task in asyncio.all_tasks():
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_fan_out_answers_per_node_without_waiting_for_dead_ones(fleet):
+    fleet, controllers = fleet
+    start = time.monotonic()
+    status = fleet.status()
+    elapsed = time.monotonic() - start
+
+    nodes = status['nodes']
+    assert status['online'] == 3 and status['total'] == 5
+    for name in ('fast0', 'fast1', 'fast2'):
+        assert nodes[name]['ok'] and nodes[name]['status']['alarm_time'] == '07:00'
+        # Answered on its own time, not after the slow node's timeout
+        assert nodes[name]['latency_ms'] < TIMEOUT * 1000 / 2
+    # The slow node times out on its own...
+    assert not nodes['slow']['ok'] and nodes['slow']['offline']
+    assert nodes['slow']['latency_ms'] >= TIMEOUT * 1000 * 0.9
+    # ...the dead one is flagged offline, and together they cost one timeout
+    assert not nodes['offline']['ok'] and nodes['offline']['offline']
+    assert 'cannot connect' in nodes['offline']['error']
+    assert elapsed < TIMEOUT * 2
+
+
+def test_offline_nodes_back_off_and_commands_reach_the_rest(fleet):
+    fleet, controllers = fleet
+    fleet.status()
+    offline = fleet.nodes['offline']
+    assert offline.failures == 1 and offline.retry_at > time.monotonic()
+    assert fleet.nodes['slow'].failures == 1
+
+    # While backing off, neither node is tried again, so the call is quick
+    start = time.monotonic()
+    scene = fleet.scene(40)
+    assert time.monotonic() - start < TIMEOUT / 2
+    assert 'retrying in' in scene['offline']['error'] and scene['slow']['offline']
+    assert offline.failures == 1
+
+    schedule = fleet.set_schedule({'alarm_time': '06:45'}, names=['fast0', 'fast1'])
+    assert set(schedule) == {'fast0', 'fast1'}
+    assert all(response['ok'] for response in schedule.values())
+    assert [controller.brightness for controller in controllers.values()] == [40, 40, 40, 0]
+    assert [controller.config['alarm_time'] for controller in controllers.values()] == \
+        ['06:45', '06:45', '07:00', '07:00']
+
+    fleet.scene(0, names=['fast2'])
+    assert controllers['fast2'].brightness == 0
+    with pytest.raises(KeyError, match='nowhere'):
+        fleet.scene(10, names=['nowhere'])
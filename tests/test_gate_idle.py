@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+import alarm_controller as controller
+import event_log
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    outputs = []
+    monkeypatch.setattr(controller.GPIO, 'output', lambda pin, value: outputs.append(value))
+    monkeypatch.setattr(controller, 'running', True)
+    # Only defined when alarm_controller runs as a script
+    monkeypatch.setattr(controller, 'daemon_mode', True, raising=False)
+    controller.set_dim_level(0)
+    thread = threading.Thread(target=controller.dimmer_thread, daemon=True)
+    thread.start()
+    yield outputs
+    controller.stop_gate()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+    controller.set_dim_level(0)
+
+
+def gate_wakeups_over(seconds):
+    before = controller.wakeups['gate']
+    time.sleep(seconds)
+    return controller.wakeups['gate'] - before
+
+
+def test_gate_loop_sleeps_at_0_and_100_percent(gate):
+    assert wait_for(lambda: controller.gate_idle)
+    assert gate_wakeups_over(0.1) == 0
+    assert gate[-1] == controller.GPIO.LOW
+
+    controller.set_dim_level(controller.MAX_DIM_LEVEL)
+    assert wait_for(lambda: controller.gate_idle and gate[-1] == controller.GPIO.HIGH)
+    assert gate_wakeups_over(0.1) == 0
+
+
+def test_gate_loop_wakes_for_a_dim_level_and_for_stop(gate):
+    assert wait_for(lambda: controller.gate_idle)
+    controller.set_dim_level(controller.MAX_DIM_LEVEL // 2)
+    assert wait_for(lambda: not controller.gate_idle)
+    # Phase cutting polls for crossings again
+    assert gate_wakeups_over(0.05) > 10
+
+    controller.manual_brightness(0)
+    assert wait_for(lambda: controller.gate_idle)
+    # The fixture's stop_gate() must end the idle thread
+
+
+def test_gate_loop_tracks_the_mains_and_logs_its_loss(gate, monkeypatch):
+    # 50 Hz mains: a 1 ms zero-cross pulse every 10 ms half-cycle
+    mains = {'on': True}
+    monkeypatch.setattr(controller.GPIO, 'input', lambda pin: int(
+        mains['on'] and time.perf_counter_ns() % 10000000 < 1000000))
+    log = event_log.EventLog(path='events.log')
+    monkeypatch.setattr(controller, 'event_log', log)
+    controller.tracker.reset()
+
+    controller.set_dim_level(controller.MAX_DIM_LEVEL // 2)
+    assert wait_for(controller.mains_locked, timeout=2)
+    assert controller.tracker.nominal_hz == 50
+    assert abs(controller.tracker.period_us - 10000) < 100
+
+    mains['on'] = False
+    assert wait_for(lambda: log.query(event_type=event_log.ZERO_CROSS_LOSS))
+    mains['on'] = True
+    assert wait_for(lambda: log.query(event_type=event_log.ZERO_CROSS_RESTORED))
+    assert wait_for(controller.mains_locked, timeout=2)
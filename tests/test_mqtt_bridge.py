@@ -0,0 +1,143 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+import mqtt_bridge
+
+
+class FakeClient:
+    """Records what the bridge publishes instead of talking to a broker"""
+    def __init__(self, *args):
+        self.published = []
+        self.subscribed = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload, retain))
+
+    def subscribe(self, topic, qos=0):
+        self.subscribed.append(topic)
+
+    def username_pw_set(self, username, password):
+        pass
+
+    def will_set(self, topic, payload, qos=0, retain=False):
+        pass
+
+    def reconnect_delay_set(self, min_delay, max_delay):
+        pass
+
+    def connect_async(self, host, port, keepalive=60):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+class FakeRuntime:
+    def __init__(self, token=None):
+        self.token = token
+        self.commands = []
+        self.brightness = 0.0
+        self.enabled = True
+
+    def handle_command(self, message):
+        self.commands.append(message)
+        if message['cmd'] == 'on' and not self.enabled:
+            return {'ok': False}
+        return {'ok': True}
+
+    def status(self):
+        return {'brightness': self.brightness, 'dim_level': int(self.brightness * 10),
+                'alarm_active': False, 'next_alarm': '2026-03-05T07:00:00'}
+
+
+@pytest.fixture(autouse=True)
+def fake_paho(monkeypatch):
+    monkeypatch.setattr(mqtt_bridge, 'mqtt', types.SimpleNamespace(Client=FakeClient))
+
+
+def message(topic, payload):
+    return types.SimpleNamespace(topic=topic, payload=payload.encode())
+
+
+def test_command_topics_map_to_ipc_commands():
+    runtime = FakeRuntime(token='secret')
+    bridge = mqtt_bridge.MQTTBridge(runtime, 'broker', prefix='home/lamp/')
+
+    async def main():
+        bridge.start(asyncio.get_running_loop())
+        for topic, payload in (('home/lamp/light/set', 'ON'),
+                               ('home/lamp/light/set', 'off'),
+                               ('home/lamp/brightness/set', ' 42.5 '),
+                               ('home/lamp/brightness/set', 'bright'),  # Ignored
+                               ('home/lamp/brightness/set', 'nan'),     # Ignored
+                               ('home/lamp/brightness/set', '-inf'),    # Ignored
+                               ('home/lamp/sunrise/set', ''),
+                               ('home/lamp/unknown/set', '1')):         # Ignored
+            bridge._on_message(bridge.client, None, message(topic, payload))
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert runtime.commands == [
+        {'cmd': 'set', 'level': 100, 'token': 'secret'},
+        {'cmd': 'off', 'token': 'secret'},
+        {'cmd': 'set', 'level': 42.5, 'token': 'secret'},
+        {'cmd': 'on', 'token': 'secret'},
+    ]
+    assert bridge.metrics()['commands'] == 4
+    assert bridge.metrics()['rejected'] == 0
+    assert bridge.metrics()['command_latency_us_p99'] is not None
+
+
+def test_refused_commands_are_counted(capsys):
+    runtime = FakeRuntime()
+    runtime.enabled = False  # The runtime will not start a sunrise
+    bridge = mqtt_bridge.MQTTBridge(runtime, 'broker')
+
+    async def main():
+        bridge.start(asyncio.get_running_loop())
+        bridge._on_message(bridge.client, None, message('lumenator/sunrise/set', ''))
+        bridge._on_message(bridge.client, None, message('lumenator/light/set', 'ON'))
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert bridge.metrics()['commands'] == 2
+    assert bridge.metrics()['rejected'] == 1
+    assert 'MQTT command on rejected: not applied' in capsys.readouterr().out
+
+
+def test_state_changes_during_a_fade_are_coalesced():
+    runtime = FakeRuntime()
+    bridge = mqtt_bridge.MQTTBridge(runtime, 'broker', publish_interval=0.05)
+
+    async def main():
+        bridge.start(asyncio.get_running_loop())
+        publisher = asyncio.get_running_loop().create_task(bridge.publish_loop())
+        bridge._on_connect(bridge.client, None, {}, 0)
+        await asyncio.sleep(0.01)
+
+        # A fade: 100 level changes within one publish interval
+        for step in range(100):
+            runtime.brightness = step + 1
+            bridge.notify()
+        await asyncio.sleep(0.12)
+        publisher.cancel()
+
+    asyncio.run(main())
+    states = [json.loads(payload) for topic, payload, retain in bridge.client.published
+              if topic == 'lumenator/state']
+    assert bridge.client.subscribed == ['lumenator/+/set']
+    assert ('lumenator/availability', 'online', True) in bridge.client.published
+    # The connect publish, then one message with the final state of the fade
+    assert len(states) == 2
+    assert states[-1]['brightness'] == 100
+    assert bridge.metrics()['coalesced'] >= 98
+    assert bridge.published == 2
@@ -0,0 +1,91 @@
+import types
+
+import pytest
+
+pytest.importorskip('limits')
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+import rate_limit_storage
+from rate_limit_storage import SQLiteStorage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit_storage, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def uri(tmp_path):
+    return 'sqlite:///' + str(tmp_path / 'ratelimit.db')
+
+
+def test_scheme_is_registered(uri):
+    assert isinstance(storage_from_string(uri), SQLiteStorage)
+
+
+def test_hit_get_and_reset(uri, clock):
+    storage = SQLiteStorage(uri)
+    assert storage.check()
+    assert storage.get('login') == 0
+    assert [storage.incr('login', 60) for _ in range(3)] == [1, 2, 3]
+    assert storage.incr('login', 60, amount=2) == 5
+    assert storage.get('login') == 5
+    assert storage.get_expiry('login') == 1060.0
+    storage.incr('other', 60)
+
+    storage.clear('login')
+    assert storage.get('login') == 0
+    assert storage.get('other') == 1
+    assert storage.reset() == 1
+    assert storage.get('other') == 0
+
+
+def test_window_expires(uri, clock):
+    storage = SQLiteStorage(uri)
+    storage.incr('login', 60)
+    storage.incr('login', 60)
+    clock[0] += 30
+    # A fixed window keeps its expiry, an elastic one is pushed out
+    assert storage.incr('login', 60) == 3
+    assert storage.get_expiry('login') == 1060.0
+    assert storage.incr('login', 60, elastic_expiry=True) == 4
+    assert storage.get_expiry('login') == 1090.0
+
+    clock[0] += 60
+    assert storage.get('login') == 0
+    # The next hit starts a fresh window
+    assert storage.incr('login', 60) == 1
+    assert storage.get_expiry('login') == 1150.0
+
+
+def test_expired_rows_are_purged(uri, clock, monkeypatch):
+    monkeypatch.setattr(rate_limit_storage, 'PURGE_EVERY', 3)
+    storage = SQLiteStorage(uri)
+    storage.incr('old', 10)
+    clock[0] += 20
+    storage.incr('new', 10)
+    storage.incr('new', 10)
+    rows = storage._connection().execute('SELECT key FROM counters').fetchall()
+    assert rows == [('new',)]
+
+
+def test_limiters_share_one_database(uri, clock):
+    item = parse('3/minute')
+    first = FixedWindowRateLimiter(SQLiteStorage(uri))
+    second = FixedWindowRateLimiter(SQLiteStorage(uri))
+
+    assert first.hit(item, '10.0.0.5')
+    assert second.hit(item, '10.0.0.5')
+    assert first.hit(item, '10.0.0.5')
+    # Both workers see the same counter, so the fourth hit is refused on either
+    assert not second.hit(item, '10.0.0.5')
+    assert not first.hit(item, '10.0.0.5')
+    assert second.hit(item, '10.0.0.6')
+
+    clock[0] += 61
+    assert second.hit(item, '10.0.0.5')
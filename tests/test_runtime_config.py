@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import pytest
+
+import alarm_runtime
+from alarm_utils import load_config
+
+SOLAR = {'alarm_mode': 'solar', 'latitude': 51.5, 'longitude': -0.1, 'solar_event': 'dawn'}
+
+
+@pytest.fixture
+def runtime(workdir):
+    runtime = alarm_runtime.ControllerRuntime(gate=False)
+    runtime.reload_event = asyncio.Event()
+    return runtime
+
+
+@pytest.mark.parametrize('changes, error', [
+    ({'alarm_mode': 'lunar'}, 'alarm_mode'),
+    ({'alarm_mode': 'solar'}, 'latitude and longitude'),
+    (dict(SOLAR, latitude=91), 'latitude'),
+    (dict(SOLAR, latitude='nan'), 'latitude'),
+    (dict(SOLAR, longitude=-180.5), 'longitude'),
+    (dict(SOLAR, solar_event='noon'), 'solar_event'),
+    (dict(SOLAR, solar_offset=24 * 60), 'solar_offset'),
+    ({'alarm_time': '7am'}, 'alarm time'),
+])
+def test_update_config_rejects_settings_it_cannot_schedule(runtime, changes, error):
+    with pytest.raises(ValueError, match=error):
+        runtime.update_config(changes)
+    assert load_config().get('alarm_mode', 'fixed') == 'fixed'
+    assert not runtime.reload_event.is_set()
+
+
+def test_update_config_saves_a_complete_solar_alarm(runtime):
+    config = runtime.update_config(dict(SOLAR, solar_offset=-20))
+    assert load_config() == config
+    assert config['latitude'] == 51.5 and config['solar_event'] == 'dawn'
+    assert runtime.reload_event.is_set()
+
+
+def test_bad_config_file_keeps_the_plan_and_the_schedule_loop(runtime, workdir):
+    runtime.load_plan()
+    plan = runtime.plan
+    assert plan is not None
+
+    # Hand-edited: a solar alarm without a location
+    (workdir / 'alarm_config.json').write_text(json.dumps({'alarm_mode': 'solar'}))
+    runtime.load_plan()
+    assert runtime.plan is plan
+
+    async def main():
+        runtime.reload_event = asyncio.Event()
+        runtime.stop_event = asyncio.Event()
+        runtime.reload_event.set()
+        loop = asyncio.get_running_loop().create_task(runtime.schedule_loop())
+        await asyncio.sleep(0.05)
+        assert not loop.done()  # Survived the reload
+        runtime.stop_event.set()
+        runtime.reload_event.set()
+        await loop
+
+    asyncio.run(main())
+    assert runtime.plan is plan
+    plan.close()
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('name', ['clock.py', 'zero_cross.py'])
+def test_both_apps_carry_the_same_module(name):
+    # sunrise_alarm is deployed on its own, so it ships its own copy
+    with open(os.path.join(ROOT, name)) as ours, \
+            open(os.path.join(ROOT, 'sunrise_alarm', 'app', name)) as theirs:
+        assert ours.read() == theirs.read()
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import alarm_controller as controller
+import simulate
+
+pytest.importorskip('zoneinfo')
+
+CONFIG = {'alarm_time': '06:30', 'fade_duration': 30, 'enabled': True, 'max_brightness': 100}
+
+
+def test_runtime_starts_every_planned_sunrise_on_time_across_dst(workdir):
+    # US clocks spring forward early on Sunday 2026-03-08
+    trajectory, runs = simulate.simulate(CONFIG, datetime(2026, 3, 5), 7, 'America/New_York')
+
+    assert [run['alarm_time'][:10] for run in runs] == [f'2026-03-{day:02d}' for day in range(5, 12)]
+    assert all(run['alarm_time'][11:] == '06:30:00' for run in runs)
+    assert max(abs(run['start_error_s']) for run in runs) < 0.001
+
+    # Each sunrise ramps to full brightness and is switched off after the hold
+    levels = [level for _, level in trajectory]
+    assert levels.count(controller.MAX_DIM_LEVEL) == 7
+    assert levels[-1] == 0
+    # Nothing was written outside the simulation's scratch directory
+    assert not list(workdir.iterdir())
+
+
+def test_alarm_in_the_skipped_hour_starts_an_hour_later(workdir):
+    # 02:00-03:00 does not exist on 2026-03-08 in New York; an alarm at 02:30
+    # with its fade in that hour moves to 03:30 instead of never firing
+    config = dict(CONFIG, alarm_time='02:30')
+    trajectory, runs = simulate.simulate(config, datetime(2026, 3, 7), 3, 'America/New_York')
+
+    assert [run['alarm_time'] for run in runs] == [
+        '2026-03-07T02:30:00', '2026-03-08T03:30:00', '2026-03-09T02:30:00']
+    assert max(abs(run['start_error_s']) for run in runs) < 0.001
+    # Still a full 30 minute fade, started at 03:00 EDT (07:00 UTC)
+    assert runs[1]['planned_start'] == datetime(2026, 3, 8, 7, 0, tzinfo=timezone.utc).timestamp()
+    levels = [level for _, level in trajectory]
+    assert levels.count(controller.MAX_DIM_LEVEL) == 3
@@ -0,0 +1,76 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import solar  # noqa: E402
+from alarm_utils import alarm_time_for_date  # noqa: E402
+
+LONDON = (51.5074, -0.1278)
+LONGYEARBYEN = (78.2232, 15.6267)
+
+
+@pytest.fixture(autouse=True)
+def london_time(monkeypatch):
+    """Local time is Europe/London, so the tables include its DST change"""
+    monkeypatch.setenv('TZ', 'Europe/London')
+    time.tzset()
+    solar._tables.clear()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+    solar._tables.clear()
+
+
+def solar_config(alarm_time='07:00', **settings):
+    return dict({'alarm_time': alarm_time, 'alarm_mode': 'solar', 'latitude': LONDON[0],
+                 'longitude': LONDON[1], 'solar_event': 'sunrise', 'solar_offset': 0}, **settings)
+
+
+@pytest.mark.parametrize('day, sunrise, dawn', [
+    # Almanac times for London, local clock time (BST in summer)
+    (date(2024, 3, 20), datetime(2024, 3, 20, 6, 3), datetime(2024, 3, 20, 5, 30)),
+    (date(2024, 6, 21), datetime(2024, 6, 21, 4, 43), datetime(2024, 6, 21, 3, 56)),
+    (date(2024, 12, 21), datetime(2024, 12, 21, 8, 4), datetime(2024, 12, 21, 7, 24)),
+])
+def test_table_matches_the_almanac_within_a_few_minutes(day, sunrise, dawn):
+    assert abs((solar.solar_time(day, *LONDON, 'sunrise') - sunrise).total_seconds()) <= 180
+    assert abs((solar.solar_time(day, *LONDON, 'dawn') - dawn).total_seconds()) <= 180
+
+    table = solar.solar_table(2024, *LONDON)
+    assert table.shape == (366, 2)
+    assert (table[:, solar.CIVIL_DAWN] < table[:, solar.SUNRISE]).all()
+
+
+def test_polar_day_and_night_have_no_event():
+    table = solar.solar_table(2024, *LONGYEARBYEN)
+    midsummer = date(2024, 6, 21).timetuple().tm_yday - 1
+    midwinter = date(2024, 12, 21).timetuple().tm_yday - 1
+    assert (table[[midsummer, midwinter]] == solar.NO_EVENT).all()
+    assert solar.solar_time(date(2024, 6, 21), *LONGYEARBYEN) is None
+
+
+def test_solar_alarm_follows_the_event_and_offset():
+    day = date(2024, 6, 21)
+    sunrise = solar.solar_time(day, *LONDON)
+    assert alarm_time_for_date(solar_config(), day) == sunrise
+    assert alarm_time_for_date(solar_config(solar_offset=30), day) == sunrise + timedelta(minutes=30)
+    assert alarm_time_for_date(solar_config(solar_event='dawn'), day) == solar.solar_time(day, *LONDON, 'dawn')
+
+
+def test_solar_alarm_is_never_later_than_the_alarm_time():
+    # Winter sunrise is after 08:00, summer sunrise is before 05:00
+    assert alarm_time_for_date(solar_config(), date(2024, 12, 21)) == datetime(2024, 12, 21, 7, 0)
+    assert alarm_time_for_date(solar_config('04:30'), date(2024, 6, 21)) == datetime(2024, 6, 21, 4, 30)
+    # A late offset is clamped too
+    assert alarm_time_for_date(solar_config(solar_offset=180), date(2024, 6, 21)) == datetime(2024, 6, 21, 7, 0)
+
+
+def test_days_without_the_event_fall_back_to_the_alarm_time():
+    config = solar_config('06:15', latitude=LONGYEARBYEN[0], longitude=LONGYEARBYEN[1])
+    assert alarm_time_for_date(config, date(2024, 6, 21)) == datetime(2024, 6, 21, 6, 15)
+    assert alarm_time_for_date(config, date(2024, 12, 21)) == datetime(2024, 12, 21, 6, 15)
+    # Fixed mode never looks at the sun
+    assert alarm_time_for_date(dict(config, alarm_mode='fixed'), date(2024, 3, 20)) == datetime(2024, 3, 20, 6, 15)
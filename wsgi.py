@@ -0,0 +1,7 @@
+"""
+WSGI entry point for production servers (see gunicorn.conf.py).
+"""
+from app import app, initialize_app
+
+# Imported once per worker process, which gunicorn.conf.py limits to one
+initialize_app()
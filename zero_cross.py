@@ -0,0 +1,231 @@
+"""
+Zero-cross period tracking for the phase-cut dimmer.
+
+Measures the real mains half-cycle period from zero-cross timestamps,
+detects 50/60 Hz automatically and predicts the next crossing, so gate
+timing stays correct when the grid frequency drifts or an edge is seen late.
+
+The controller (zero_cross.py) and sunrise_alarm (app/zero_cross.py) each
+carry this module, since sunrise_alarm is deployed as a directory of its
+own; keep the two files identical (tests/test_shared_modules.py checks).
+sunrise_alarm passes its Config values in; the defaults below match them.
+"""
+
+# Nominal half-cycle periods in microseconds
+HALF_CYCLE_50HZ_US = 10000
+HALF_CYCLE_60HZ_US = 8333
+
+# Loop gains as right shifts: phase error / 2**n per edge
+PHASE_SHIFT = 4
+PERIOD_SHIFT = 6
+
+# Edges further than this from the prediction drop the lock: +/- 1/8 of a
+# half-cycle (about 1 ms), well inside the 1667 us between 50 and 60 Hz
+LOCK_WINDOW_DIVISOR = 8
+LOCK_EDGES = 8                   # Consecutive in-window edges before declaring lock
+PERIOD_TOLERANCE_DIVISOR = 20    # A locked period within 5% of 50 or 60 Hz is plausible
+MIN_PERIOD_US = 7000             # Accept 57-71 Hz ...
+MAX_PERIOD_US = 11500            # ... and 43-53 Hz as plausible mains
+
+# EdgeFilter defaults
+MIN_INTERVAL_US = 6000           # Lockout after an accepted edge
+MAJORITY_SAMPLES = 3             # Pin reads per edge, majority must be HIGH
+OUTLIER_TOLERANCE_US = 1000      # Max distance from the predicted crossing
+MAX_OUTLIER_RUN = 8              # Net outliers (minus accepted edges) before forcing a resync
+OUTLIER_ARM_EDGES = 16           # Edges the tracker must hold lock before outliers are rejected
+
+
+class ZeroCrossTracker:
+    """
+    Second-order phase-locked loop over zero-cross timestamps.
+
+    All arithmetic is on integer microseconds so the dimmer thread pays
+    only a handful of integer operations per edge.
+    """
+    def __init__(self, initial_period_us=None, phase_shift=None, period_shift=None):
+        self.initial_period_us = initial_period_us or HALF_CYCLE_60HZ_US
+        self.phase_shift = phase_shift if phase_shift is not None else PHASE_SHIFT
+        self.period_shift = period_shift if period_shift is not None else PERIOD_SHIFT
+        self.reset()
+
+    def reset(self):
+        """Forget all history and wait for new edges"""
+        self.period_us = self.initial_period_us
+        self.next_crossing_us = None
+        self.last_edge_us = None
+        self.locked = False
+        self.in_window = 0  # Consecutive edges inside the lock window
+        self.edges = 0
+        self.missed = 0
+        self.resyncs = 0
+
+    def resume(self):
+        """
+        Re-acquire phase after a pause in edge processing, keeping the
+        measured period and the counters
+        """
+        self.next_crossing_us = None
+        self.last_edge_us = None
+        self.locked = False
+        self.in_window = 0
+
+    def update(self, edge_us):
+        """
+        Feed one detected rising edge and return the estimated true crossing time.
+
+        When an edge is detected late (polling jitter, a busy CPU) the
+        returned estimate is earlier than edge_us, so callers should time
+        the gate relative to it rather than to the detection time.
+        """
+        self.edges += 1
+        last_edge_us, self.last_edge_us = self.last_edge_us, edge_us
+
+        if self.next_crossing_us is None:
+            self.next_crossing_us = edge_us + self.period_us
+            return edge_us
+
+        predicted = self.next_crossing_us
+        error = edge_us - predicted
+
+        # Skip over crossings we never saw (the edge is a whole period late)
+        if error > self.period_us // 2:
+            skipped = (error + self.period_us // 2) // self.period_us
+            self.missed += skipped
+            predicted += skipped * self.period_us
+            error = edge_us - predicted
+
+        if abs(error) > self.period_us // LOCK_WINDOW_DIVISOR:
+            # Out of the lock window: re-acquire from the raw interval
+            self.locked = False
+            self.in_window = 0
+            self.resyncs += 1
+            interval = edge_us - last_edge_us
+            if MIN_PERIOD_US <= interval <= MAX_PERIOD_US:
+                self.period_us = interval
+            self.next_crossing_us = edge_us + self.period_us
+            return edge_us
+
+        # In the window: nudge frequency and phase towards the observed edge,
+        # and only call it a lock once the error has stayed small for a while
+        self.in_window += 1
+        self.locked = self.in_window >= LOCK_EDGES
+        self.period_us += error >> self.period_shift
+        self.period_us = max(MIN_PERIOD_US, min(MAX_PERIOD_US, self.period_us))
+        crossing_us = predicted + (error >> self.phase_shift)
+        self.next_crossing_us = crossing_us + self.period_us
+        return crossing_us
+
+    @property
+    def frequency_hz(self):
+        """Measured mains frequency"""
+        return 1000000.0 / (2 * self.period_us)
+
+    @property
+    def nominal_hz(self):
+        """The mains standard (50 or 60) closest to the measured period"""
+        if abs(self.period_us - HALF_CYCLE_50HZ_US) < abs(self.period_us - HALF_CYCLE_60HZ_US):
+            return 50
+        return 60
+
+    def stats(self):
+        return {
+            'period_us': self.period_us,
+            'frequency_hz': round(self.frequency_hz, 3),
+            'nominal_hz': self.nominal_hz,
+            'locked': self.locked,
+            'edges': self.edges,
+            'missed': self.missed,
+            'resyncs': self.resyncs,
+        }
+
+
+class EdgeFilter:
+    """
+    Input conditioning in front of the tracker.
+
+    A rising edge only counts as a zero crossing if it passes three checks:
+      1. lockout: at least min_interval_us since the last accepted edge
+      2. majority: most of a short burst of pin reads are HIGH
+      3. outlier: once the tracker has held lock for arm_edges edges at a
+         plausible mains period, the edge lies within outlier_tolerance_us
+         of a predicted crossing
+    Rejected edges are counted per reason.
+    """
+    def __init__(self, tracker, min_interval_us=None, samples=None,
+                 outlier_tolerance_us=None, max_outlier_run=None, arm_edges=None):
+        self.tracker = tracker
+        self.min_interval_us = min_interval_us if min_interval_us is not None else MIN_INTERVAL_US
+        self.samples = samples if samples is not None else MAJORITY_SAMPLES
+        self.outlier_tolerance_us = (outlier_tolerance_us if outlier_tolerance_us is not None
+                                     else OUTLIER_TOLERANCE_US)
+        # Once outliers outnumber accepted edges by this many the prediction
+        # itself is assumed wrong and the next edge is let through to resync.
+        # A net count rather than a consecutive run, because edges of the
+        # other mains frequency regularly coincide with a wrong prediction
+        # (every 5th 50 Hz edge lands on a 60 Hz one)
+        self.max_outlier_run = max_outlier_run if max_outlier_run is not None else MAX_OUTLIER_RUN
+        # Outliers are only judged against a prediction that has proven itself
+        self.arm_edges = arm_edges if arm_edges is not None else OUTLIER_ARM_EDGES
+        self.reset()
+
+    def reset(self):
+        self.last_accepted_us = None
+        self.outlier_run = 0
+        self.accepted = 0
+        self.rejected_lockout = 0
+        self.rejected_majority = 0
+        self.rejected_outlier = 0
+        self.forced_resyncs = 0
+
+    def armed(self):
+        """True when the tracker's prediction is trusted enough to reject outliers"""
+        tracker = self.tracker
+        if tracker.in_window < self.arm_edges:
+            return False
+        nominal = HALF_CYCLE_50HZ_US if tracker.nominal_hz == 50 else HALF_CYCLE_60HZ_US
+        return abs(tracker.period_us - nominal) <= nominal // PERIOD_TOLERANCE_DIVISOR
+
+    def accept(self, edge_us, read_pin):
+        """Return True if the edge at edge_us is a genuine zero crossing"""
+        if self.last_accepted_us is not None and edge_us - self.last_accepted_us < self.min_interval_us:
+            self.rejected_lockout += 1
+            return False
+
+        if self.samples > 1:
+            high = 0
+            for _ in range(self.samples):
+                high += read_pin()
+            if high * 2 <= self.samples:
+                self.rejected_majority += 1
+                return False
+
+        tracker = self.tracker
+        if self.armed():
+            # Distance to the nearest predicted crossing, allowing for missed ones
+            offset = (edge_us - tracker.next_crossing_us) % tracker.period_us
+            distance = min(offset, tracker.period_us - offset)
+            if distance > self.outlier_tolerance_us:
+                if self.outlier_run < self.max_outlier_run:
+                    self.outlier_run += 1
+                    self.rejected_outlier += 1
+                    return False
+                # The prediction itself is wrong: let this edge through and
+                # have the tracker start over, so its next edge re-seeds the
+                # period from a raw interval between two consecutive edges
+                self.forced_resyncs += 1
+                self.outlier_run = 0
+                tracker.resume()
+
+        self.outlier_run = max(0, self.outlier_run - 1)
+        self.last_accepted_us = edge_us
+        self.accepted += 1
+        return True
+
+    def stats(self):
+        return {
+            'accepted': self.accepted,
+            'rejected_lockout': self.rejected_lockout,
+            'rejected_majority': self.rejected_majority,
+            'rejected_outlier': self.rejected_outlier,
+            'forced_resyncs': self.forced_resyncs,
+        }